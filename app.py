@@ -1,53 +1,30 @@
-from flask import Flask, render_template, request, redirect, url_for, flash
-import mysql.connector
-import psycopg2
-import psycopg2.extras
-from config import get_db_config, USE_PRODUCTION
-from datetime import datetime, timedelta
+from flask import Flask, Blueprint, render_template, request, redirect, url_for, flash, jsonify, Response, stream_with_context, abort
+from config import (
+    USE_PRODUCTION, CATEGORY_CACHE_MAX_ENTRIES, QUANTITY_BATCH_MAX_ITEMS,
+    IMPORT_MAX_BYTES, ADMIN_EXPORT_TOKEN, INVENTORY_PAGE_SIZE,
+    PASSWORD_MAX_ATTEMPTS, PASSWORD_LOCKOUT_SECONDS, RECEIVE_BATCH_MAX_ITEMS,
+    SEARCH_MAX_QUERY_LENGTH,
+)
+from datetime import date, datetime
+import hmac
 import pytz
-import os
-import bcrypt
-
-app = Flask(__name__)
-app.secret_key = 'your-secret-key-here-change-in-production'
-
-# デバッグ情報を出力
-print("=" * 60)
-print("🔍 デバッグ情報 - アプリ起動時")
-print("=" * 60)
-print(f"USE_PRODUCTION: {USE_PRODUCTION}")
-print(f"DATABASE_URL環境変数: {os.environ.get('DATABASE_URL', '❌ 未設定')}")
-print(f"PRODUCTION環境変数: {os.environ.get('PRODUCTION', '❌ 未設定')}")
-print(f"実際の接続先設定:")
-config = get_db_config()
-if isinstance(config, str):
-    masked_config = config.replace(config.split(':')[2].split('@')[0], '***PASSWORD***')
-    print(f"  PostgreSQL: {masked_config}")
-else:
-    print(f"  MySQL: host={config.get('host')}, database={config.get('database')}")
-print("=" * 60)
-print()
-
-# データベース接続を取得
-def get_db_connection():
-    config = get_db_config()
-    if USE_PRODUCTION:
-        print("🔗 PostgreSQLに接続しています...")
-        conn = psycopg2.connect(config)
-        cur = conn.cursor()
-        cur.execute("SET timezone = 'Asia/Tokyo'")
-        cur.close()
-        conn.commit()
-        return conn
-    else:
-        print("🔗 MySQL(XAMPP)に接続しています...")
-        conn = mysql.connector.connect(**config)
-        cur = conn.cursor()
-        cur.execute("SET time_zone = '+09:00'")
-        cur.close()
-        conn.commit()
-        return conn
+import db
+import passwords
+import events
+import metrics
+import assets
+import slowlog
+from cache import VersionedCache
+from importer import import_items_csv, CSVImportError, ITEM_COLUMNS
+from exporter import iter_export
+from reorder import add_low_stock_to_orders, REORDER_MIN_LEVEL, SQL_ON_ORDER_CONFLICT
+from search import search_store
+from sync import fetch_changes, insert_client_item, order_json, SQL_SYNC_ORDER_COLUMNS
+from conditional import page_etag, conditional_page, assets_digest
+from db import get_db
 
+# 画面・APIはすべてこのBlueprintに登録し、create_app()でアプリに組み込む
+bp = Blueprint('main', __name__)
 
 # 日本時間（JST）の現在日付を取得
 def get_japan_time():
@@ -55,49 +32,246 @@ def get_japan_time():
     jst = pytz.timezone('Asia/Tokyo')
     return datetime.now(jst).date()
 
+# カテゴリ一覧のキャッシュ（店舗IDごと、fridges.category_versionで整合性を取る）
+category_cache = VersionedCache('categories', max_entries=CATEGORY_CACHE_MAX_ENTRIES)
+
+# 店舗のカテゴリバージョンを取得（店舗が存在しなければNone）
+def get_category_version(conn, store_id):
+    cursor = conn.cursor()
+    cursor.execute("SELECT category_version FROM fridges WHERE fridge_id = %s", (store_id,))
+    row = cursor.fetchone()
+    cursor.close()
+    return row[0] if row else None
+
+# カテゴリ変更を他ワーカーに伝えるためバージョンを進める（呼び出し側でcommitする）
+def bump_category_version(cursor, store_id):
+    cursor.execute(
+        "UPDATE fridges SET category_version = category_version + 1 WHERE fridge_id = %s",
+        (store_id,)
+    )
+    category_cache.invalidate(store_id)
+
 # カテゴリ一覧を取得
-def get_categories(conn, store_id):
-    if USE_PRODUCTION:
-        cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-    else:
-        cursor = conn.cursor(dictionary=True)
+def get_categories(conn, store_id, version=None):
+    """カテゴリ一覧を取得（versionが分かっていれば渡すとバージョン確認のクエリを省略できる）"""
+    # バージョンは必ずカテゴリより先に読む（逆だと古い一覧を新しいバージョンで保存しうる）
+    if version is None:
+        version = get_category_version(conn, store_id)
+        if version is None:
+            return []
+    
+    categories = category_cache.get(store_id, version)
+    if categories is not None:
+        return categories
+    return load_categories(conn, store_id, version)
+
+# カテゴリ一覧をDBから読んでキャッシュに入れる（versionは一覧より先に読んだもの）
+def load_categories(conn, store_id, version):
+    cursor = db.dict_cursor(conn)
     
     query = "SELECT * FROM categories WHERE fridge_id = %s ORDER BY id"
     cursor.execute(query, (store_id,))
     categories = cursor.fetchall()
     cursor.close()
     
+    category_cache.set(store_id, version, categories)
     return categories
 
+# 店舗の変更バージョン (category_version, items_version, orders_version) を取得（店舗がなければNone）
+# 画面のETag用。集計テーブル（トリガーで更新）を主キーで読むだけで、在庫は読まない
+def get_store_versions(conn, store_id):
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT f.category_version, s.items_version, s.orders_version
+        FROM fridges f
+        JOIN store_summary s ON s.fridge_id = f.fridge_id
+        WHERE f.fridge_id = %s
+    """, (store_id,))
+    row = cursor.fetchone()
+    cursor.close()
+    return row
+
+# 日付計算のSQL断片（DBセッションのタイムゾーンはJSTに設定済み）
+if USE_PRODUCTION:
+    SQL_TODAY = "CURRENT_DATE"
+    SQL_WEEK_LATER = "CURRENT_DATE + INTERVAL '7 days'"
+    SQL_DAYS_SINCE_OPEN = "(CURRENT_DATE - i.opened_date)"
+else:
+    SQL_TODAY = "CURDATE()"
+    SQL_WEEK_LATER = "DATE_ADD(CURDATE(), INTERVAL 7 DAY)"
+    SQL_DAYS_SINCE_OPEN = "DATEDIFF(CURDATE(), i.opened_date)"
+
+# 賞味期限のステータス（expired / warning / normal / none）
+SQL_EXPIRY_STATUS = f"""
+    CASE
+        WHEN i.expiry_date IS NULL THEN 'none'
+        WHEN i.expiry_date < {SQL_TODAY} THEN 'expired'
+        WHEN i.expiry_date <= {SQL_WEEK_LATER} THEN 'warning'
+        ELSE 'normal'
+    END
+"""
+
+# 期限ステータスごとの表示（CSSクラス, アイコン）
+EXPIRY_DISPLAY = {
+    'expired': ('text-danger', '❌'),
+    'warning': ('text-warning', '⚠️'),
+    'normal': ('', ''),
+    'none': ('', ''),
+}
+
+# 在庫行に表示用の情報を付与（expiry_status・days_since_openはSQLで算出済み）
+def annotate_item(item):
+    item['expiry_class'], item['expiry_icon'] = EXPIRY_DISPLAY[item['expiry_status']]
+    
+    # 開封日からの経過日数
+    days = item['days_since_open']
+    if days is None:
+        item['days_since_open_class'] = ''
+    elif days >= 90:
+        item['days_since_open_class'] = 'days-open-danger'
+    elif days >= 30:
+        item['days_since_open_class'] = 'days-open-warning'
+    else:
+        item['days_since_open_class'] = 'days-open-normal'
+    
+    # 発注リストに追加ボタンを表示するか（自動発注の対象と同じ条件）
+    item['in_shopping_list'] = bool(item['in_shopping_list'])
+    item['show_add_to_list'] = item['quantity_level'] >= REORDER_MIN_LEVEL or item['expiry_status'] == 'expired'
+    return item
+
+# 在庫1件の状態（inventory_listと同じ算出方法、itemsの別名はi）
+SQL_ITEM_STATE_COLUMNS = f"""
+    i.id, i.category_id, i.quantity_level, i.expiry_date, i.updated_at,
+    {SQL_EXPIRY_STATUS} AS expiry_status,
+    {SQL_DAYS_SINCE_OPEN} AS days_since_open,
+    EXISTS (
+        SELECT 1 FROM shopping_list s
+        WHERE s.fridge_id = i.fridge_id AND s.item_id = i.id
+    ) AS in_shopping_list
+"""
+
+# JSON APIの値の確認（JSONのtrue/falseはPythonでintの一種なので除く）
+# IDはDBのINT列（PostgreSQLのint4）に収まる正の整数
+def is_json_id(value):
+    return isinstance(value, int) and not isinstance(value, bool) and 0 < value <= 2**31 - 1
+
+def is_quantity_level(value):
+    return isinstance(value, int) and not isinstance(value, bool) and value in [1, 2, 3, 4]
+
+# 残量を更新し、更新後の在庫状態を返す（見つからなければNone、commitは呼び出し側で行う）
+def set_quantity_level(conn, store_id, item_id, new_level):
+    cursor = db.dict_cursor(conn)
+    if USE_PRODUCTION:
+        query = f"""
+            UPDATE items AS i SET quantity_level = %s
+            WHERE i.id = %s AND i.fridge_id = %s
+            RETURNING {SQL_ITEM_STATE_COLUMNS}
+        """
+        cursor.execute(query, (new_level, item_id, store_id))
+    else:
+        query = "UPDATE items SET quantity_level = %s WHERE id = %s AND fridge_id = %s"
+        cursor.execute(query, (new_level, item_id, store_id))
+        query = f"SELECT {SQL_ITEM_STATE_COLUMNS} FROM items i WHERE i.id = %s AND i.fridge_id = %s"
+        cursor.execute(query, (item_id, store_id))
+    item = cursor.fetchone()
+    cursor.close()
+    
+    return annotate_item(item) if item else None
+
+# 複数在庫の残量をまとめて更新し、{item_id: 更新後の在庫状態} を返す
+# （1文のUPDATEで適用、commitは呼び出し側で行う）
+def set_quantity_levels(conn, store_id, levels):
+    if not levels:
+        return {}
+    item_ids = list(levels.keys())
+    new_levels = [levels[item_id] for item_id in item_ids]
+    
+    cursor = db.dict_cursor(conn)
+    if USE_PRODUCTION:
+        query = f"""
+            UPDATE items AS i SET quantity_level = v.new_level
+            FROM unnest(%s::int[], %s::int[]) AS v(item_id, new_level)
+            WHERE i.id = v.item_id AND i.fridge_id = %s
+            RETURNING {SQL_ITEM_STATE_COLUMNS}
+        """
+        cursor.execute(query, (item_ids, new_levels, store_id))
+    else:
+        placeholders = ', '.join(['%s'] * len(item_ids))
+        cases = ' '.join(['WHEN %s THEN %s'] * len(item_ids))
+        params = [value for pair in levels.items() for value in pair]
+        query = f"""
+            UPDATE items SET quantity_level = CASE id {cases} END
+            WHERE fridge_id = %s AND id IN ({placeholders})
+        """
+        cursor.execute(query, params + [store_id] + item_ids)
+        query = f"SELECT {SQL_ITEM_STATE_COLUMNS} FROM items i WHERE i.fridge_id = %s AND i.id IN ({placeholders})"
+        cursor.execute(query, [store_id] + item_ids)
+    rows = cursor.fetchall()
+    cursor.close()
+    
+    return {row['id']: annotate_item(row) for row in rows}
+
+# APIレスポンス用に在庫の状態を整形
+def item_state_json(item):
+    return {
+        'id': item['id'],
+        'category_id': item['category_id'],
+        'quantity_level': item['quantity_level'],
+        'expiry_status': item['expiry_status'],
+        'in_shopping_list': item['in_shopping_list'],
+        'show_add_to_list': bool(item['show_add_to_list']),
+        'updated_at': item['updated_at'].isoformat() if item['updated_at'] else None,
+    }
+
 # =============================================
 # 店舗管理
 # =============================================
 
+# 画面に出す店舗の列（password_hashなどは読まない、fridgesの別名はf）
+SQL_STORE_COLUMNS = "f.fridge_id, f.fridge_name, f.fridge_icon"
+
 # 店舗選択画面
-@app.route('/')
+@bp.route('/')
 def store_select():
-    conn = get_db_connection()
-    if USE_PRODUCTION:
-        cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-    else:
-        cursor = conn.cursor(dictionary=True)
+    conn = get_db()
+    cursor = db.dict_cursor(conn)
     
-    query = "SELECT * FROM fridges ORDER BY created_at"
+    # 件数は集計テーブル（トリガーで更新）から読み、在庫は読まない
+    # 期限切れ・7日以内は日付ごとの件数を今日の日付で合計する
+    query = f"""
+        SELECT {SQL_STORE_COLUMNS},
+               COALESCE(s.item_count, 0) AS item_count,
+               COALESCE(s.low_stock_items, 0) AS low_stock_items,
+               COALESCE(s.out_of_stock_items, 0) AS out_of_stock_items,
+               COALESCE(s.order_count, 0) AS order_count,
+               COALESCE(e.expired_items, 0) AS expired_items,
+               COALESCE(e.expiring_items, 0) AS expiring_items
+        FROM fridges f
+        LEFT JOIN store_summary s ON s.fridge_id = f.fridge_id
+        LEFT JOIN (
+            SELECT fridge_id,
+                   SUM(CASE WHEN expiry_date < {SQL_TODAY} THEN item_count ELSE 0 END) AS expired_items,
+                   SUM(CASE WHEN expiry_date >= {SQL_TODAY} THEN item_count ELSE 0 END) AS expiring_items
+            FROM store_expiry_counts
+            WHERE expiry_date <= {SQL_WEEK_LATER}
+            GROUP BY fridge_id
+        ) e ON e.fridge_id = f.fridge_id
+        ORDER BY f.created_at
+    """
     cursor.execute(query)
     stores = cursor.fetchall()
     
     cursor.close()
-    conn.close()
     
     return render_template('store_select.html', stores=stores, show_back_button=False)
 
 # 店舗作成画面
-@app.route('/create_store')
+@bp.route('/create_store')
 def create_store():
     return render_template('create_store.html', show_back_button=True)
 
 # 店舗作成処理
-@app.route('/create_store', methods=['POST'])
+@bp.route('/create_store', methods=['POST'])
 def create_store_post():
     store_name = request.form.get('store_name')
     store_icon = request.form.get('store_icon', '🏪')
@@ -107,20 +281,24 @@ def create_store_post():
     # バリデーション
     if not store_name or len(store_name) > 50:
         flash('店舗名は必須です（50文字以内）', 'error')
-        return redirect(url_for('create_store'))
+        return redirect(url_for('main.create_store'))
     
     if not password or len(password) != 4 or not password.isdigit():
         flash('パスワードは4桁の数字で入力してください', 'error')
-        return redirect(url_for('create_store'))
+        return redirect(url_for('main.create_store'))
     
     if password != password_confirm:
         flash('パスワードが一致しません', 'error')
-        return redirect(url_for('create_store'))
+        return redirect(url_for('main.create_store'))
     
-    # パスワードをハッシュ化
-    password_hash = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+    # パスワードをハッシュ化（専用スレッドで計算）
+    try:
+        password_hash = passwords.hash_password(password)
+    except passwords.PasswordBusyError:
+        flash('混み合っています。しばらくしてからもう一度お試しください', 'error')
+        return redirect(url_for('main.create_store'))
     
-    conn = get_db_connection()
+    conn = get_db()
     cursor = conn.cursor()
     
     # 店舗を作成
@@ -140,60 +318,52 @@ def create_store_post():
     query = "INSERT INTO categories (fridge_id, name) VALUES (%s, %s)"
     for cat_name in categories:
         cursor.execute(query, (store_id, cat_name))
+    bump_category_version(cursor, store_id)
     
     conn.commit()
     cursor.close()
-    conn.close()
     
     flash(f'店舗「{store_name}」を作成しました', 'success')
-    return redirect(url_for('store_select'))
+    return redirect(url_for('main.store_select'))
 
 # 店舗削除画面
-@app.route('/store/<int:store_id>/delete')
+@bp.route('/store/<int:store_id>/delete')
 def delete_store_confirm(store_id):
-    conn = get_db_connection()
-    if USE_PRODUCTION:
-        cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-    else:
-        cursor = conn.cursor(dictionary=True)
+    conn = get_db()
+    cursor = db.dict_cursor(conn)
     
-    query = "SELECT * FROM fridges WHERE fridge_id = %s"
+    query = f"SELECT {SQL_STORE_COLUMNS} FROM fridges f WHERE f.fridge_id = %s"
     cursor.execute(query, (store_id,))
     store = cursor.fetchone()
     
     cursor.close()
-    conn.close()
     
     if not store:
         flash('店舗が見つかりません', 'error')
-        return redirect(url_for('store_select'))
+        return redirect(url_for('main.store_select'))
     
     return render_template('delete_store.html', store=store, show_back_button=True)
 
 # 店舗編集画面
-@app.route('/store/<int:store_id>/edit')
+@bp.route('/store/<int:store_id>/edit')
 def edit_store(store_id):
-    conn = get_db_connection()
-    if USE_PRODUCTION:
-        cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-    else:
-        cursor = conn.cursor(dictionary=True)
+    conn = get_db()
+    cursor = db.dict_cursor(conn)
     
-    query = "SELECT * FROM fridges WHERE fridge_id = %s"
+    query = f"SELECT {SQL_STORE_COLUMNS} FROM fridges f WHERE f.fridge_id = %s"
     cursor.execute(query, (store_id,))
     store = cursor.fetchone()
     
     cursor.close()
-    conn.close()
     
     if not store:
         flash('店舗が見つかりません', 'error')
-        return redirect(url_for('store_select'))
+        return redirect(url_for('main.store_select'))
     
     return render_template('edit_store.html', store=store, show_back_button=False)
 
 # 店舗情報更新処理
-@app.route('/store/<int:store_id>/update_info', methods=['POST'])
+@bp.route('/store/<int:store_id>/update_info', methods=['POST'])
 def update_store_info(store_id):
     store_name = request.form.get('store_name')
     store_icon = request.form.get('store_icon', '🏪')
@@ -201,9 +371,9 @@ def update_store_info(store_id):
     # バリデーション
     if not store_name or len(store_name) > 50:
         flash('店舗名は必須です（50文字以内）', 'error')
-        return redirect(url_for('edit_store', store_id=store_id))
+        return redirect(url_for('main.edit_store', store_id=store_id))
     
-    conn = get_db_connection()
+    conn = get_db()
     cursor = conn.cursor()
     
     query = "UPDATE fridges SET fridge_name = %s, fridge_icon = %s WHERE fridge_id = %s"
@@ -211,13 +381,64 @@ def update_store_info(store_id):
     conn.commit()
     
     cursor.close()
-    conn.close()
     
     flash('店舗情報を更新しました', 'success')
-    return redirect(url_for('edit_store', store_id=store_id))
+    return redirect(url_for('main.edit_store', store_id=store_id))
+
+# ロック解除時刻（現在時刻 + %s秒）
+SQL_LOCKOUT_UNTIL = ("CURRENT_TIMESTAMP + %s * INTERVAL '1 second'" if USE_PRODUCTION
+                     else "CURRENT_TIMESTAMP + INTERVAL %s SECOND")
+
+# 店舗パスワードを確認し 'ok' / 'invalid' / 'locked' を返す（混み合っていればPasswordBusyError）
+# ロック中はハッシュ計算をせずに断る。間違えた回数はここでcommitし、
+# 成功時の更新（回数のリセット・コスト変更時の再ハッシュ）のcommitは呼び出し側で行う
+def check_store_password(conn, store_id, password):
+    cursor = db.dict_cursor(conn)
+    cursor.execute("""
+        SELECT password_hash, failed_password_attempts,
+               (password_locked_until IS NOT NULL AND password_locked_until > CURRENT_TIMESTAMP) AS locked
+        FROM fridges WHERE fridge_id = %s
+    """, (store_id,))
+    row = cursor.fetchone()
+    if not row:
+        cursor.close()
+        return 'invalid'
+    if row['locked']:
+        cursor.close()
+        return 'locked'
+    
+    if not passwords.verify_password(password, row['password_hash']):
+        # 代入の順序によらず同じ結果になるよう、回数は更新前の値で判定する
+        cursor.execute(f"""
+            UPDATE fridges
+            SET password_locked_until = CASE WHEN failed_password_attempts + 1 >= %s
+                                             THEN {SQL_LOCKOUT_UNTIL} ELSE password_locked_until END,
+                failed_password_attempts = failed_password_attempts + 1
+            WHERE fridge_id = %s
+        """, (PASSWORD_MAX_ATTEMPTS, PASSWORD_LOCKOUT_SECONDS, store_id))
+        conn.commit()
+        cursor.close()
+        return 'invalid'
+    
+    new_hash = None
+    if passwords.needs_rehash(row['password_hash']):
+        try:
+            new_hash = passwords.hash_password(password)
+        except passwords.PasswordBusyError:
+            # 再ハッシュは次回の確認時でよい
+            pass
+    if new_hash or row['failed_password_attempts']:
+        cursor.execute("""
+            UPDATE fridges
+            SET failed_password_attempts = 0, password_locked_until = NULL,
+                password_hash = COALESCE(%s, password_hash)
+            WHERE fridge_id = %s
+        """, (new_hash, store_id))
+    cursor.close()
+    return 'ok'
 
 # 店舗削除処理
-@app.route('/store/<int:store_id>/delete', methods=['POST'])
+@bp.route('/store/<int:store_id>/delete', methods=['POST'])
 def delete_store_post(store_id):
     password = request.form.get('password')
     confirm_text = request.form.get('confirm_text')
@@ -225,207 +446,314 @@ def delete_store_post(store_id):
     # 確認テキストチェック
     if confirm_text != '削除':
         flash('確認テキストが正しくありません', 'error')
-        return redirect(url_for('delete_store_confirm', store_id=store_id))
+        return redirect(url_for('main.delete_store_confirm', store_id=store_id))
     
-    conn = get_db_connection()
-    if USE_PRODUCTION:
-        cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-    else:
-        cursor = conn.cursor(dictionary=True)
+    conn = get_db()
+    cursor = db.dict_cursor(conn)
     
     # 店舗情報を取得
-    query = "SELECT * FROM fridges WHERE fridge_id = %s"
+    query = f"SELECT {SQL_STORE_COLUMNS} FROM fridges f WHERE f.fridge_id = %s"
     cursor.execute(query, (store_id,))
     store = cursor.fetchone()
     
     if not store:
         flash('店舗が見つかりません', 'error')
-        conn.close()
-        return redirect(url_for('store_select'))
+        return redirect(url_for('main.store_select'))
     
     # パスワード確認
-    if not bcrypt.checkpw(password.encode('utf-8'), store['password_hash'].encode('utf-8')):
+    try:
+        result = check_store_password(conn, store_id, password)
+    except passwords.PasswordBusyError:
+        flash('混み合っています。しばらくしてからもう一度お試しください', 'error')
+        return redirect(url_for('main.delete_store_confirm', store_id=store_id))
+    if result == 'locked':
+        flash(f'パスワードを{PASSWORD_MAX_ATTEMPTS}回続けて間違えたため、しばらく入力できません', 'error')
+        return redirect(url_for('main.delete_store_confirm', store_id=store_id))
+    if result != 'ok':
         flash('パスワードが正しくありません', 'error')
-        conn.close()
-        return redirect(url_for('delete_store_confirm', store_id=store_id))
+        return redirect(url_for('main.delete_store_confirm', store_id=store_id))
     
     # 店舗を削除（CASCADE削除により関連データも削除）
     cursor = conn.cursor()
     query = "DELETE FROM fridges WHERE fridge_id = %s"
     cursor.execute(query, (store_id,))
     conn.commit()
+    category_cache.invalidate(store_id)
     
     cursor.close()
-    conn.close()
     
     flash(f'店舗「{store["fridge_name"]}」を削除しました', 'success')
-    return redirect(url_for('store_select'))
+    return redirect(url_for('main.store_select'))
 
 # =============================================
 # 在庫管理
 # =============================================
 
-# 在庫一覧画面
-@app.route('/store/<int:store_id>/inventory')
-def inventory_list(store_id):
-    conn = get_db_connection()
-    if USE_PRODUCTION:
-        cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-    else:
-        cursor = conn.cursor(dictionary=True)
-    
-    # カテゴリ一覧を取得
-    categories = get_categories(conn, store_id)
-    
-    # カテゴリIDを取得
-    category_id = request.args.get('category', None, type=int)
-    if category_id is None and categories:
-        category_id = categories[0]['id']
-    
-    # ソートパラメータを取得
-    sort_by = request.args.get('sort', 'expiry')
-    
-    # ソート条件を構築
+# 在庫一覧のソート順（expiry_sortは期限なしを9999-12-31とした生成列）
+# 期限順は「期限切れ → 7日以内 → それ以降・期限なし」の順になり、
+# 日付の計算をせずにインデックス順で読める
+INVENTORY_ORDER = {
+    'expiry': "i.expiry_sort, i.id",
+    'quantity': "i.quantity_level DESC, i.expiry_sort, i.id",
+}
+
+# 期限ステータスでの絞り込み（SQL_EXPIRY_STATUS と同じ境界を expiry_sort の範囲で書き、
+# 期限順ではインデックスの範囲をそのまま読む。今日の日付はクエリごとに1回だけ評価される）
+INVENTORY_EXPIRY_FILTERS = {
+    'expired': f"AND i.expiry_sort < {SQL_TODAY}",
+    'warning': f"AND i.expiry_sort >= {SQL_TODAY} AND i.expiry_sort <= {SQL_WEEK_LATER}",
+}
+
+# キーセットページングのカーソル（前ページ最後の行のソートキー）
+def encode_page_cursor(item, sort_by):
     if sort_by == 'quantity':
-        order_clause = "ORDER BY quantity_level DESC, expiry_date"
-    else:
-        if USE_PRODUCTION:
-            order_clause = """
-                ORDER BY 
-                    CASE 
-                        WHEN expiry_date IS NULL THEN 2
-                        WHEN expiry_date < CURRENT_DATE THEN 0
-                        WHEN expiry_date <= CURRENT_DATE + INTERVAL '7 days' THEN 1
-                        ELSE 2
-                    END,
-                    expiry_date
+        return f"{item['quantity_level']}_{item['expiry_sort'].isoformat()}_{item['id']}"
+    return f"{item['expiry_sort'].isoformat()}_{item['id']}"
+
+def decode_page_cursor(cursor_value, sort_by):
+    try:
+        parts = cursor_value.split('_')
+        if sort_by == 'quantity':
+            quantity_level, expiry_sort, item_id = parts
+            return int(quantity_level), date.fromisoformat(expiry_sort), int(item_id)
+        expiry_sort, item_id = parts
+        return date.fromisoformat(expiry_sort), int(item_id)
+    except ValueError:
+        abort(400)
+
+# 在庫一覧の1ページ分を取得
+# 戻り値: (在庫のリスト, カテゴリバージョン（在庫が0件ならNone）, 次ページのカーソル)
+def fetch_inventory_page(conn, store_id, category_id, sort_by, after=None, expiry_filter=None):
+    cursor = db.dict_cursor(conn)
+    
+    # 前ページの続きから読む条件（ソート順と同じ並びのインデックスでシークできる形）
+    seek_clause = ''
+    seek_params = ()
+    if after:
+        if sort_by == 'quantity':
+            quantity_level, expiry_sort, item_id = decode_page_cursor(after, sort_by)
+            # 先頭の「quantity_level <= %s」はインデックスの範囲条件として使わせるための冗長な条件
+            seek_clause = """
+                AND i.quantity_level <= %s
+                AND (i.quantity_level < %s
+                     OR (i.quantity_level = %s AND (i.expiry_sort > %s
+                         OR (i.expiry_sort = %s AND i.id > %s))))
             """
+            seek_params = (quantity_level, quantity_level, quantity_level, expiry_sort, expiry_sort, item_id)
         else:
-            order_clause = """
-                ORDER BY 
-                    CASE 
-                        WHEN expiry_date IS NULL THEN 2
-                        WHEN expiry_date < CURDATE() THEN 0
-                        WHEN expiry_date <= DATE_ADD(CURDATE(), INTERVAL 7 DAY) THEN 1
-                        ELSE 2
-                    END,
-                    expiry_date
+            expiry_sort, item_id = decode_page_cursor(after, sort_by)
+            # 先頭の「expiry_sort >= %s」はインデックスの範囲条件として使わせるための冗長な条件
+            seek_clause = """
+                AND i.expiry_sort >= %s
+                AND (i.expiry_sort > %s OR (i.expiry_sort = %s AND i.id > %s))
             """
+            seek_params = (expiry_sort, expiry_sort, expiry_sort, item_id)
     
-    # 在庫を取得
+    # 選択中カテゴリの在庫とカテゴリバージョンを1回のクエリで取得
+    # （発注リスト登録済みかどうか・期限ステータス・開封経過日数もSQLで算出）
+    # カテゴリ一覧はバージョンが一致すればキャッシュから返すので追加の往復はない
     query = f"""
-        SELECT id, name, quantity_level, opened_date, expiry_date, memo, created_at
-        FROM items
-        WHERE fridge_id = %s AND category_id = %s
-        {order_clause}
+        SELECT (SELECT category_version FROM fridges WHERE fridge_id = %s) AS category_version,
+               i.id, i.category_id, i.name, i.quantity_level, i.opened_date, i.expiry_date,
+               i.expiry_sort, i.memo, i.created_at, i.updated_at,
+               {SQL_EXPIRY_STATUS} AS expiry_status,
+               {SQL_DAYS_SINCE_OPEN} AS days_since_open,
+               EXISTS (
+                   SELECT 1 FROM shopping_list s
+                   WHERE s.fridge_id = i.fridge_id AND s.item_id = i.id
+               ) AS in_shopping_list
+        FROM items i
+        WHERE i.fridge_id = %s
+          AND i.category_id = COALESCE(%s, (SELECT MIN(id) FROM categories WHERE fridge_id = %s))
+          {INVENTORY_EXPIRY_FILTERS.get(expiry_filter, '')}
+          {seek_clause}
+        ORDER BY {INVENTORY_ORDER[sort_by]}
+        LIMIT %s
     """
-    cursor.execute(query, (store_id, category_id))
-    items = cursor.fetchall()
+    params = (store_id, store_id, category_id, store_id) + seek_params + (INVENTORY_PAGE_SIZE + 1,)
+    cursor.execute(query, params)
+    rows = cursor.fetchall()
+    cursor.close()
     
-    # 各在庫に追加情報を付与
-    today = get_japan_time()
-    for item in items:
-        # 賞味期限のステータス
-        if item['expiry_date']:
-            if item['expiry_date'] < today:
-                item['expiry_status'] = 'expired'
-                item['expiry_class'] = 'text-danger'
-                item['expiry_icon'] = '❌'
-            elif item['expiry_date'] <= today + timedelta(days=7):
-                item['expiry_status'] = 'warning'
-                item['expiry_class'] = 'text-warning'
-                item['expiry_icon'] = '⚠️'
-            else:
-                item['expiry_status'] = 'normal'
-                item['expiry_class'] = ''
-                item['expiry_icon'] = ''
-        else:
-            item['expiry_status'] = 'none'
-            item['expiry_class'] = ''
-            item['expiry_icon'] = ''
-
-        # 開封日からの経過日数
-        if item.get('opened_date'):
-            days = (today - item['opened_date']).days
-            item['days_since_open'] = days
-            if days >= 90:
-                item['days_since_open_class'] = 'days-open-danger'
-            elif days >= 30:
-                item['days_since_open_class'] = 'days-open-warning'
-            else:
-                item['days_since_open_class'] = 'days-open-normal'
-        else:
-            item['days_since_open'] = None
-            item['days_since_open_class'] = ''
-        
-        # 発注リストに追加ボタンを表示するか
-        item['show_add_to_list'] = (
-            item['quantity_level'] >= 3 or 
-            (item['expiry_date'] and item['expiry_date'] < today)
-        )
-    
-    # 発注リストに登録済みのitem_idを取得
-    query_shopping = "SELECT item_id FROM shopping_list WHERE fridge_id = %s AND item_id IS NOT NULL"
-    cursor.execute(query_shopping, (store_id,))
-    shopping_items = cursor.fetchall()
-    shopping_item_ids = [item['item_id'] for item in shopping_items]
-    
-    # 各アイテムが発注リストに登録済みかチェック
-    for item in items:
-        item['in_shopping_list'] = item['id'] in shopping_item_ids
+    version = rows[0]['category_version'] if rows else None
+    next_after = None
+    if len(rows) > INVENTORY_PAGE_SIZE:
+        rows = rows[:INVENTORY_PAGE_SIZE]
+        next_after = encode_page_cursor(rows[-1], sort_by)
     
-    cursor.close()
-    conn.close()
+    return [annotate_item(row) for row in rows], version, next_after
+
+# 在庫一覧画面
+@bp.route('/store/<int:store_id>/inventory')
+def inventory_list(store_id):
+    conn = get_db()
     
-    return render_template('inventory_list.html', 
-                         items=items, 
-                         categories=categories,
-                         current_category=category_id,
-                         current_sort=sort_by,
-                         store_id=store_id,
-                         show_back_button=True)
+    # カテゴリIDを取得（未指定ならSQL側で先頭カテゴリを選ぶ）
+    category_id = request.args.get('category', None, type=int)
+    
+    # ソートパラメータを取得
+    sort_by = request.args.get('sort', 'expiry')
+    if sort_by not in INVENTORY_ORDER:
+        sort_by = 'expiry'
+    
+    # 期限ステータスでの絞り込み（expired / warning、未指定ならすべて）
+    expiry_filter = request.args.get('expiry')
+    if expiry_filter not in INVENTORY_EXPIRY_FILTERS:
+        expiry_filter = None
+    
+    # 続きのページ（JSが無効な場合の「次へ」リンク用）
+    after = request.args.get('after')
+    
+    # 前回表示から在庫・発注リスト・カテゴリ・日付（期限ステータス）が変わっていなければ304
+    versions = get_store_versions(conn, store_id)
+    etag = page_etag('inventory', *versions, get_japan_time()) if versions else None
+    
+    def render():
+        nonlocal category_id
+        # カテゴリ一覧がキャッシュになければ、在庫と同時に別の接続で読む
+        # （バージョンは get_store_versions で読み済みなので、在庫の結果を待つ必要がない）
+        categories = category_cache.get(store_id, versions[0]) if versions else None
+        if versions and categories is None:
+            (items, _, next_after), categories = db.fetch_concurrently(
+                lambda c: fetch_inventory_page(c, store_id, category_id, sort_by, after, expiry_filter),
+                lambda c: load_categories(c, store_id, versions[0]),
+            )
+        else:
+            items, version, next_after = fetch_inventory_page(conn, store_id, category_id, sort_by, after, expiry_filter)
+            if categories is None:
+                categories = get_categories(conn, store_id, version)
+        
+        if category_id is None and categories:
+            category_id = categories[0]['id']
+        
+        return render_template('inventory_list.html', 
+                             items=items, 
+                             categories=categories,
+                             current_category=category_id,
+                             current_sort=sort_by,
+                             current_expiry=expiry_filter,
+                             next_after=next_after,
+                             store_id=store_id,
+                             show_back_button=True)
+    
+    return conditional_page(etag, render)
+
+# 在庫一覧の続きを取得（無限スクロール用、カードのHTMLと次ページのURLを返す）
+@bp.route('/store/<int:store_id>/inventory/items')
+def inventory_items_page(store_id):
+    category_id = request.args.get('category', type=int)
+    sort_by = request.args.get('sort', 'expiry')
+    expiry_filter = request.args.get('expiry')
+    if category_id is None or sort_by not in INVENTORY_ORDER:
+        abort(400)
+    if expiry_filter is not None and expiry_filter not in INVENTORY_EXPIRY_FILTERS:
+        abort(400)
+    
+    conn = get_db()
+    items, _, next_after = fetch_inventory_page(conn, store_id, category_id, sort_by, request.args.get('after'), expiry_filter)
+    
+    html = render_template('inventory_item_cards.html',
+                           items=items,
+                           current_sort=sort_by,
+                           store_id=store_id)
+    next_url = None
+    if next_after:
+        next_url = url_for('main.inventory_items_page', store_id=store_id, category=category_id, sort=sort_by,
+                           expiry=expiry_filter, after=next_after)
+    return jsonify({'html': html, 'next_url': next_url})
 
 # 残量をワンタップで更新
-@app.route('/store/<int:store_id>/update_quantity/<int:item_id>/<int:new_level>', methods=['POST'])
+@bp.route('/store/<int:store_id>/update_quantity/<int:item_id>/<int:new_level>', methods=['POST'])
 def update_quantity(store_id, item_id, new_level):
     if new_level not in [1, 2, 3, 4]:
         flash('無効な残量レベルです', 'error')
-        return redirect(url_for('inventory_list', store_id=store_id))
-    
-    conn = get_db_connection()
-    if USE_PRODUCTION:
-        cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-    else:
-        cursor = conn.cursor(dictionary=True)
+        return redirect(url_for('main.inventory_list', store_id=store_id))
     
-    # アイテムのcategory_idを取得
-    query = "SELECT category_id FROM items WHERE id = %s AND fridge_id = %s"
-    cursor.execute(query, (item_id, store_id))
-    item = cursor.fetchone()
-    category_id = item['category_id'] if item else 1
+    conn = get_db()
     
-    # 残量を更新
-    query = "UPDATE items SET quantity_level = %s WHERE id = %s AND fridge_id = %s"
-    cursor.execute(query, (new_level, item_id, store_id))
+    # 残量を更新（更新後のcategory_idも同時に取得）
+    item = set_quantity_level(conn, store_id, item_id, new_level)
+    if item:
+        events.publish(conn, store_id, 'item', item_state_json(item))
     conn.commit()
-    
-    cursor.close()
-    conn.close()
+    category_id = item['category_id'] if item else 1
     
     # 現在のソート順を取得
     current_sort = request.args.get('sort', 'expiry')
     
     flash('残量を更新しました', 'success')
-    return redirect(url_for('inventory_list', store_id=store_id, category=category_id, sort=current_sort))
+    return redirect(url_for('main.inventory_list', store_id=store_id, category=category_id, sort=current_sort))
+
+# 残量をワンタップで更新（JSON API、在庫一覧のJSから呼ばれる）
+@bp.route('/api/store/<int:store_id>/items/<int:item_id>/quantity', methods=['PATCH', 'POST'])
+def api_update_quantity(store_id, item_id):
+    data = request.get_json(silent=True) or {}
+    new_level = data.get('quantity_level')
+    if not is_quantity_level(new_level):
+        return jsonify({'error': '無効な残量レベルです'}), 400
+    
+    conn = get_db()
+    item = set_quantity_level(conn, store_id, item_id, new_level)
+    if item:
+        events.publish(conn, store_id, 'item', item_state_json(item))
+    conn.commit()
+    
+    if not item:
+        return jsonify({'error': '在庫が見つかりません'}), 404
+    
+    return jsonify(item_state_json(item))
+
+# 残量の一括更新（棚卸しモード用JSON API）
+# リクエスト: {"updates": [{"item_id": 1, "quantity_level": 2}, ...]}
+@bp.route('/api/store/<int:store_id>/items/quantity', methods=['PATCH', 'POST'])
+def api_update_quantities(store_id):
+    data = request.get_json(silent=True) or {}
+    updates = data.get('updates')
+    if not isinstance(updates, list) or not updates:
+        return jsonify({'error': '更新内容がありません'}), 400
+    if len(updates) > QUANTITY_BATCH_MAX_ITEMS:
+        return jsonify({'error': f'一度に更新できるのは{QUANTITY_BATCH_MAX_ITEMS}件までです'}), 400
+    
+    # 入力チェック（同じ在庫が複数回あれば後のものを優先）
+    levels = {}
+    results = []
+    for update in updates:
+        item_id = update.get('item_id') if isinstance(update, dict) else None
+        new_level = update.get('quantity_level') if isinstance(update, dict) else None
+        if not is_json_id(item_id):
+            results.append({'item_id': item_id, 'ok': False, 'error': '在庫IDが不正です'})
+            continue
+        if not is_quantity_level(new_level):
+            results.append({'item_id': item_id, 'ok': False, 'error': '無効な残量レベルです'})
+            continue
+        levels[item_id] = new_level
+        results.append({'item_id': item_id})
+    
+    # 1トランザクション・1文で適用
+    conn = get_db()
+    updated = set_quantity_levels(conn, store_id, levels)
+    events.publish_many(conn, store_id, [('item', item_state_json(item)) for item in updated.values()])
+    conn.commit()
+    
+    for result in results:
+        if 'ok' in result:
+            continue
+        item = updated.get(result['item_id'])
+        if item:
+            result.update(item_state_json(item), ok=True)
+        else:
+            result.update(ok=False, error='在庫が見つかりません')
+    
+    return jsonify({
+        'updated': len(updated),
+        'results': results,
+    })
 
 # 在庫削除
-@app.route('/store/<int:store_id>/delete_item/<int:item_id>', methods=['POST'])
+@bp.route('/store/<int:store_id>/delete_item/<int:item_id>', methods=['POST'])
 def delete_item(store_id, item_id):
-    conn = get_db_connection()
-    if USE_PRODUCTION:
-        cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-    else:
-        cursor = conn.cursor(dictionary=True)
+    conn = get_db()
+    cursor = db.dict_cursor(conn)
     
     # アイテムのcategory_idを取得
     query = "SELECT category_id FROM items WHERE id = %s AND fridge_id = %s"
@@ -437,21 +765,23 @@ def delete_item(store_id, item_id):
     cursor = conn.cursor()
     query = "DELETE FROM items WHERE id = %s AND fridge_id = %s"
     cursor.execute(query, (item_id, store_id))
+    # 削除した場合だけ通知する（他店舗の在庫・存在しないIDでは何も消えていない）
+    if cursor.rowcount > 0:
+        events.publish(conn, store_id, 'item_removed', {'id': item_id})
     conn.commit()
     
     cursor.close()
-    conn.close()
     
     # 現在のソート順を取得
     current_sort = request.args.get('sort', 'expiry')
     
     flash('在庫を削除しました', 'success')
-    return redirect(url_for('inventory_list', store_id=store_id, category=category_id, sort=current_sort))
+    return redirect(url_for('main.inventory_list', store_id=store_id, category=category_id, sort=current_sort))
 
 # 在庫登録画面
-@app.route('/store/<int:store_id>/add_item')
+@bp.route('/store/<int:store_id>/add_item')
 def add_item(store_id):
-    conn = get_db_connection()
+    conn = get_db()
     categories = get_categories(conn, store_id)
     
     # 現在選択中のカテゴリIDを取得
@@ -466,7 +796,6 @@ def add_item(store_id):
             category_name = cat['name']
             break
     
-    conn.close()
     
     return render_template('add_item.html', 
                          categories=categories, 
@@ -476,7 +805,7 @@ def add_item(store_id):
                          show_back_button=True)
 
 # 在庫登録処理
-@app.route('/store/<int:store_id>/add_item', methods=['POST'])
+@bp.route('/store/<int:store_id>/add_item', methods=['POST'])
 def add_item_post(store_id):
     name = request.form.get('name')
     category_id = request.form.get('category_id', 1, type=int)
@@ -488,9 +817,9 @@ def add_item_post(store_id):
     # バリデーション
     if not name or len(name) > 50:
         flash('商品名は必須です(50文字以内)', 'error')
-        return redirect(url_for('add_item', store_id=store_id))
+        return redirect(url_for('main.add_item', store_id=store_id))
     
-    conn = get_db_connection()
+    conn = get_db()
     cursor = conn.cursor()
     
     query = """
@@ -498,35 +827,138 @@ def add_item_post(store_id):
         VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
     """
     cursor.execute(query, (store_id, category_id, name, 1, quantity_level, opened_date, expiry_date, memo))
+    events.publish(conn, store_id, *events.changed('inventory'))
     conn.commit()
     
     cursor.close()
-    conn.close()
     
     flash('在庫を登録しました', 'success')
-    return redirect(url_for('inventory_list', store_id=store_id, category=category_id))
+    return redirect(url_for('main.inventory_list', store_id=store_id, category=category_id))
+
+# 在庫登録（JSON API、オフライン中に端末で追加した在庫の送信用）
+# リクエスト: {"client_id": "端末で採番したUUID", "name": ..., "category_id": ..., "quantity_level": ...,
+#              "opened_date": "YYYY-MM-DD", "expiry_date": "YYYY-MM-DD", "memo": ...}
+# 同じclient_idで再送されても二重に登録しない（登録済みの在庫を200で返す）
+@bp.route('/api/store/<int:store_id>/items', methods=['POST'])
+def api_add_item(store_id):
+    data = request.get_json(silent=True) or {}
+    client_id = data.get('client_id')
+    name = data.get('name')
+    category_id = data.get('category_id')
+    quantity_level = data.get('quantity_level', 1)
+    memo = data.get('memo') or None
+    
+    # バリデーション
+    if not isinstance(client_id, str) or not 0 < len(client_id) <= 36:
+        return jsonify({'error': 'client_idが不正です'}), 400
+    if not isinstance(name, str) or not name or len(name) > 50:
+        return jsonify({'error': '商品名は必須です(50文字以内)'}), 400
+    if not is_quantity_level(quantity_level):
+        return jsonify({'error': '無効な残量レベルです'}), 400
+    if memo is not None and not isinstance(memo, str):
+        return jsonify({'error': 'メモが不正です'}), 400
+    dates = {}
+    for key in ('opened_date', 'expiry_date'):
+        try:
+            dates[key] = date.fromisoformat(data[key]) if data.get(key) else None
+        except (TypeError, ValueError):
+            return jsonify({'error': '日付が不正です'}), 400
+    
+    if not is_json_id(category_id):
+        return jsonify({'error': 'カテゴリが見つかりません'}), 400
+    
+    conn = get_db()
+    if category_id not in {cat['id'] for cat in get_categories(conn, store_id)}:
+        return jsonify({'error': 'カテゴリが見つかりません'}), 400
+    
+    item, created = insert_client_item(conn, store_id, client_id, {
+        'name': name,
+        'category_id': category_id,
+        'quantity_level': quantity_level,
+        'memo': memo,
+        **dates,
+    })
+    if created:
+        events.publish(conn, store_id, *events.changed('inventory'))
+    conn.commit()
+    
+    return jsonify(item), 201 if created else 200
+
+# CSV一括登録画面
+@bp.route('/store/<int:store_id>/import_items')
+def import_items(store_id):
+    return render_template('import_items.html', store_id=store_id, result=None, show_back_button=True)
+
+# CSV一括登録処理
+@bp.route('/store/<int:store_id>/import_items', methods=['POST'])
+def import_items_post(store_id):
+    upload = request.files.get('csv_file')
+    encoding = request.form.get('encoding', 'utf-8-sig')
+    if encoding not in ('utf-8-sig', 'cp932'):
+        encoding = 'utf-8-sig'
+    
+    # バリデーション
+    if not upload or not upload.filename:
+        flash('CSVファイルを選択してください', 'error')
+        return redirect(url_for('main.import_items', store_id=store_id))
+    
+    conn = get_db()
+    version = get_category_version(conn, store_id)
+    if version is None:
+        flash('店舗が見つかりません', 'error')
+        return redirect(url_for('main.store_select'))
+    categories = get_categories(conn, store_id, version)
+    
+    cursor = conn.cursor()
+    
+    # CSVに未登録のカテゴリがあれば作成する
+    def create_category(name):
+        if USE_PRODUCTION:
+            cursor.execute("INSERT INTO categories (fridge_id, name) VALUES (%s, %s) RETURNING id", (store_id, name))
+            return cursor.fetchone()[0]
+        cursor.execute("INSERT INTO categories (fridge_id, name) VALUES (%s, %s)", (store_id, name))
+        return cursor.lastrowid
+    
+    # 全行を1トランザクションで登録（途中で失敗したら何も登録しない）
+    try:
+        result = import_items_csv(conn, store_id, upload.stream, categories, create_category, encoding)
+    except CSVImportError as e:
+        conn.rollback()
+        cursor.close()
+        flash(str(e), 'error')
+        return redirect(url_for('main.import_items', store_id=store_id))
+    
+    if result['created_categories']:
+        bump_category_version(cursor, store_id)
+    events.publish(conn, store_id, *events.changed('inventory'))
+    conn.commit()
+    cursor.close()
+    
+    flash(f'{result["imported"]}件の在庫を登録しました', 'success')
+    return render_template('import_items.html', store_id=store_id, result=result, show_back_button=True)
 
 # 在庫編集画面
-@app.route('/store/<int:store_id>/edit_item/<int:item_id>')
+@bp.route('/store/<int:store_id>/edit_item/<int:item_id>')
 def edit_item(store_id, item_id):
-    conn = get_db_connection()
-    if USE_PRODUCTION:
-        cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-    else:
-        cursor = conn.cursor(dictionary=True)
+    conn = get_db()
+    cursor = db.dict_cursor(conn)
     
-    query = "SELECT * FROM items WHERE id = %s AND fridge_id = %s"
+    query = """
+        SELECT i.*, f.category_version
+        FROM items i
+        JOIN fridges f ON f.fridge_id = i.fridge_id
+        WHERE i.id = %s AND i.fridge_id = %s
+    """
     cursor.execute(query, (item_id, store_id))
     item = cursor.fetchone()
     
     cursor.close()
     
     if not item:
-        conn.close()
         flash('在庫が見つかりません', 'error')
-        return redirect(url_for('inventory_list', store_id=store_id))
+        return redirect(url_for('main.inventory_list', store_id=store_id))
     
-    categories = get_categories(conn, store_id)
+    categories = get_categories(conn, store_id, item['category_version'])
     
     # カテゴリ名を取得
     category_name = '在庫'
@@ -535,7 +967,6 @@ def edit_item(store_id, item_id):
             category_name = cat['name']
             break
     
-    conn.close()
     
     return render_template('edit_item.html', 
                          item=item, 
@@ -545,7 +976,7 @@ def edit_item(store_id, item_id):
                          show_back_button=True)
 
 # 在庫更新処理
-@app.route('/store/<int:store_id>/edit_item/<int:item_id>', methods=['POST'])
+@bp.route('/store/<int:store_id>/edit_item/<int:item_id>', methods=['POST'])
 def edit_item_post(store_id, item_id):
     name = request.form.get('name')
     category_id = request.form.get('category_id', type=int)
@@ -557,9 +988,9 @@ def edit_item_post(store_id, item_id):
     # バリデーション
     if not name or len(name) > 50:
         flash('商品名は必須です(50文字以内)', 'error')
-        return redirect(url_for('edit_item', store_id=store_id, item_id=item_id))
+        return redirect(url_for('main.edit_item', store_id=store_id, item_id=item_id))
     
-    conn = get_db_connection()
+    conn = get_db()
     cursor = conn.cursor()
     
     query = """
@@ -568,47 +999,48 @@ def edit_item_post(store_id, item_id):
         WHERE id = %s AND fridge_id = %s
     """
     cursor.execute(query, (category_id, name, 1, quantity_level, opened_date, expiry_date, memo, item_id, store_id))
+    events.publish(conn, store_id, *events.changed('inventory'))
     conn.commit()
     
     cursor.close()
-    conn.close()
     
     # 現在のソート順を取得
     current_sort = request.args.get('sort', 'expiry')
     
     flash('在庫を更新しました', 'success')
-    return redirect(url_for('inventory_list', store_id=store_id, category=category_id, sort=current_sort))
+    return redirect(url_for('main.inventory_list', store_id=store_id, category=category_id, sort=current_sort))
 
 # =============================================
 # 発注リスト機能
 # =============================================
 
 # 発注リスト画面
-@app.route('/store/<int:store_id>/orders')
+@bp.route('/store/<int:store_id>/orders')
 def order_list(store_id):
-    conn = get_db_connection()
-    if USE_PRODUCTION:
-        cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-    else:
-        cursor = conn.cursor(dictionary=True)
+    conn = get_db()
     
-    query = "SELECT * FROM shopping_list WHERE fridge_id = %s ORDER BY created_at"
-    cursor.execute(query, (store_id,))
-    items = cursor.fetchall()
+    # 前回表示から発注リストが変わっていなければ304
+    versions = get_store_versions(conn, store_id)
+    etag = page_etag('orders', versions[2]) if versions else None
     
-    cursor.close()
-    conn.close()
+    def render():
+        cursor = db.dict_cursor(conn)
+        
+        query = "SELECT * FROM shopping_list WHERE fridge_id = %s ORDER BY created_at"
+        cursor.execute(query, (store_id,))
+        items = cursor.fetchall()
+        
+        cursor.close()
+        
+        return render_template('order_list.html', items=items, store_id=store_id, show_back_button=True)
     
-    return render_template('order_list.html', items=items, store_id=store_id, show_back_button=True)
+    return conditional_page(etag, render)
 
 # 発注リストに追加
-@app.route('/store/<int:store_id>/add_to_order/<int:item_id>', methods=['POST'])
+@bp.route('/store/<int:store_id>/add_to_order/<int:item_id>', methods=['POST'])
 def add_to_order(store_id, item_id):
-    conn = get_db_connection()
-    if USE_PRODUCTION:
-        cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-    else:
-        cursor = conn.cursor(dictionary=True)
+    conn = get_db()
+    cursor = db.dict_cursor(conn)
     
     # 在庫情報を取得
     query = "SELECT name, memo, category_id FROM items WHERE id = %s AND fridge_id = %s"
@@ -616,31 +1048,52 @@ def add_to_order(store_id, item_id):
     item = cursor.fetchone()
     
     if item:
-        # 発注リストに追加
+        # 発注リストに追加（同じ在庫がすでに入っていれば一意制約に任せて何もしない）
         cursor = conn.cursor()
-        query = "INSERT INTO shopping_list (fridge_id, item_id, item_name, memo) VALUES (%s, %s, %s, %s)"
+        query = f"""
+            INSERT INTO shopping_list (fridge_id, item_id, item_name, memo) VALUES (%s, %s, %s, %s)
+            {SQL_ON_ORDER_CONFLICT}
+        """
         cursor.execute(query, (store_id, item_id, item['name'], item['memo']))
+        if cursor.rowcount > 0:
+            events.publish(conn, store_id, *events.changed('orders'))
+            flash(f'{item["name"]}を発注リストに追加しました', 'success')
+        else:
+            flash(f'{item["name"]}はすでに発注リストにあります', 'success')
         conn.commit()
-        flash(f'{item["name"]}を発注リストに追加しました', 'success')
         category_id = item['category_id']
     else:
         category_id = 1
     
     cursor.close()
-    conn.close()
     
     # 現在のソート順を取得
     current_sort = request.args.get('sort', 'expiry')
     
-    return redirect(url_for('inventory_list', store_id=store_id, category=category_id, sort=current_sort))
+    return redirect(url_for('main.inventory_list', store_id=store_id, category=category_id, sort=current_sort))
+
+# 残量が少ない・期限切れの在庫をまとめて発注リストに追加
+@bp.route('/store/<int:store_id>/reorder', methods=['POST'])
+def reorder_low_stock(store_id):
+    conn = get_db()
+    added = add_low_stock_to_orders(conn, store_id)
+    if added:
+        events.publish(conn, store_id, *events.changed('orders'))
+    conn.commit()
+    
+    if added:
+        flash(f'残量が少ない・期限切れの在庫{added}件を発注リストに追加しました', 'success')
+    else:
+        flash('追加が必要な在庫はありませんでした', 'success')
+    return redirect(url_for('main.order_list', store_id=store_id))
 
 # 発注リスト手動登録画面
-@app.route('/store/<int:store_id>/add_order')
+@bp.route('/store/<int:store_id>/add_order')
 def add_order_manual(store_id):
     return render_template('add_order_manual.html', store_id=store_id, show_back_button=True)
 
 # 発注リスト手動登録処理
-@app.route('/store/<int:store_id>/add_order', methods=['POST'])
+@bp.route('/store/<int:store_id>/add_order', methods=['POST'])
 def add_order_manual_post(store_id):
     item_name = request.form.get('item_name')
     memo = request.form.get('memo') or None
@@ -648,77 +1101,114 @@ def add_order_manual_post(store_id):
     # バリデーション
     if not item_name or len(item_name) > 50:
         flash('商品名は必須です(50文字以内)', 'error')
-        return redirect(url_for('add_order_manual', store_id=store_id))
+        return redirect(url_for('main.add_order_manual', store_id=store_id))
     
-    conn = get_db_connection()
+    conn = get_db()
     cursor = conn.cursor()
     
     query = "INSERT INTO shopping_list (fridge_id, item_name, memo) VALUES (%s, %s, %s)"
     cursor.execute(query, (store_id, item_name, memo))
+    events.publish(conn, store_id, *events.changed('orders'))
     conn.commit()
     
     cursor.close()
-    conn.close()
     
     flash(f'{item_name}を発注リストに追加しました', 'success')
-    return redirect(url_for('order_list', store_id=store_id))
+    return redirect(url_for('main.order_list', store_id=store_id))
 
 # 発注リストのチェック状態を切り替え
-@app.route('/store/<int:store_id>/toggle_order_check/<int:order_id>', methods=['POST'])
+@bp.route('/store/<int:store_id>/toggle_order_check/<int:order_id>', methods=['POST'])
 def toggle_order_check(store_id, order_id):
-    conn = get_db_connection()
+    conn = get_db()
     cursor = conn.cursor()
     
     query = "UPDATE shopping_list SET is_checked = NOT is_checked WHERE id = %s AND fridge_id = %s"
     cursor.execute(query, (order_id, store_id))
+    
+    # 他の端末に新しいチェック状態を通知
+    cursor.execute("SELECT is_checked FROM shopping_list WHERE id = %s AND fridge_id = %s", (order_id, store_id))
+    row = cursor.fetchone()
+    if row:
+        events.publish(conn, store_id, 'order', {'id': order_id, 'is_checked': bool(row[0])})
     conn.commit()
     
     cursor.close()
-    conn.close()
     
-    return redirect(url_for('order_list', store_id=store_id))
+    return redirect(url_for('main.order_list', store_id=store_id))
+
+# 発注リストのチェック状態を設定（JSON API、発注リスト画面のJSから呼ばれる）
+# 切り替えではなく値を指定するので、オフライン中の操作を後から再送しても結果は変わらない
+@bp.route('/api/store/<int:store_id>/orders/<int:order_id>', methods=['PATCH'])
+def api_update_order(store_id, order_id):
+    data = request.get_json(silent=True) or {}
+    is_checked = data.get('is_checked')
+    if not isinstance(is_checked, bool):
+        return jsonify({'error': 'is_checkedを指定してください'}), 400
+    
+    conn = get_db()
+    cursor = db.dict_cursor(conn)
+    cursor.execute("UPDATE shopping_list SET is_checked = %s WHERE id = %s AND fridge_id = %s",
+                   (is_checked, order_id, store_id))
+    query = f"SELECT {SQL_SYNC_ORDER_COLUMNS} FROM shopping_list s WHERE s.id = %s AND s.fridge_id = %s"
+    cursor.execute(query, (order_id, store_id))
+    order = cursor.fetchone()
+    if order:
+        events.publish(conn, store_id, 'order', {'id': order_id, 'is_checked': bool(order['is_checked'])})
+    conn.commit()
+    cursor.close()
+    
+    if not order:
+        return jsonify({'error': '発注が見つかりません'}), 404
+    
+    return jsonify(order_json(order))
 
 # 発注完了（チェック済みアイテム削除）
-@app.route('/store/<int:store_id>/finish_order', methods=['POST'])
+@bp.route('/store/<int:store_id>/finish_order', methods=['POST'])
 def finish_order(store_id):
-    conn = get_db_connection()
+    conn = get_db()
     cursor = conn.cursor()
     
     query = "DELETE FROM shopping_list WHERE fridge_id = %s AND is_checked = TRUE"
-    cursor.execute(query, (store_id,))
+    if USE_PRODUCTION:
+        # 削除したIDを他の端末に通知する（MySQLは件数の変化をポーリングで拾う）
+        cursor.execute(query + " RETURNING id", (store_id,))
+        deleted_ids = [row[0] for row in cursor.fetchall()]
+        if deleted_ids:
+            events.publish(conn, store_id, 'orders_removed', {'ids': deleted_ids})
+    else:
+        cursor.execute(query, (store_id,))
     deleted_count = cursor.rowcount
     conn.commit()
     
     cursor.close()
-    conn.close()
     
     flash(f'チェック済みの{deleted_count}件を削除しました', 'success')
-    return redirect(url_for('order_list', store_id=store_id))
+    return redirect(url_for('main.order_list', store_id=store_id))
 
 # 発注品入荷画面
-@app.route('/store/<int:store_id>/receive_from_order/<int:order_id>')
+@bp.route('/store/<int:store_id>/receive_from_order/<int:order_id>')
 def receive_from_order(store_id, order_id):
-    conn = get_db_connection()
-    if USE_PRODUCTION:
-        cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-    else:
-        cursor = conn.cursor(dictionary=True)
+    conn = get_db()
+    cursor = db.dict_cursor(conn)
     
-    query = "SELECT * FROM shopping_list WHERE id = %s AND fridge_id = %s"
+    query = """
+        SELECT s.*, f.category_version
+        FROM shopping_list s
+        JOIN fridges f ON f.fridge_id = s.fridge_id
+        WHERE s.id = %s AND s.fridge_id = %s
+    """
     cursor.execute(query, (order_id, store_id))
     order_item = cursor.fetchone()
     
     if not order_item:
         cursor.close()
-        conn.close()
         flash('発注リストに見つかりません', 'error')
-        return redirect(url_for('order_list', store_id=store_id))
+        return redirect(url_for('main.order_list', store_id=store_id))
     
     # カテゴリ一覧を取得
-    categories = get_categories(conn, store_id)
+    categories = get_categories(conn, store_id, order_item['category_version'])
     
     cursor.close()
-    conn.close()
     
     return render_template('receive_from_order.html', 
                          order_item=order_item, 
@@ -727,7 +1217,7 @@ def receive_from_order(store_id, order_id):
                          show_back_button=True)
 
 # 発注品入荷登録処理
-@app.route('/store/<int:store_id>/receive_from_order/<int:order_id>', methods=['POST'])
+@bp.route('/store/<int:store_id>/receive_from_order/<int:order_id>', methods=['POST'])
 def receive_from_order_post(store_id, order_id):
     name = request.form.get('name')
     category_id = request.form.get('category_id', type=int)
@@ -739,24 +1229,20 @@ def receive_from_order_post(store_id, order_id):
     # バリデーション
     if not name or len(name) > 50:
         flash('商品名は必須です(50文字以内)', 'error')
-        return redirect(url_for('receive_from_order', store_id=store_id, order_id=order_id))
+        return redirect(url_for('main.receive_from_order', store_id=store_id, order_id=order_id))
+    
+    conn = get_db()
     
     # category_idが指定されていない場合、この店舗の最初のカテゴリを取得
     if not category_id:
-        conn = get_db_connection()
-        if USE_PRODUCTION:
-            cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-        else:
-            cursor = conn.cursor(dictionary=True)
+        cursor = db.dict_cursor(conn)
         
         query = "SELECT id FROM categories WHERE fridge_id = %s ORDER BY id LIMIT 1"
         cursor.execute(query, (store_id,))
         result = cursor.fetchone()
         category_id = result['id'] if result else 1
         cursor.close()
-        conn.close()
     
-    conn = get_db_connection()
     cursor = conn.cursor()
     
     # 在庫を登録（category_idを含める）
@@ -770,49 +1256,167 @@ def receive_from_order_post(store_id, order_id):
     query = "DELETE FROM shopping_list WHERE id = %s AND fridge_id = %s"
     cursor.execute(query, (order_id, store_id))
     
+    events.publish_many(conn, store_id, [('orders_removed', {'ids': [order_id]}), events.changed('inventory')])
     conn.commit()
     cursor.close()
-    conn.close()
     
     flash('在庫を登録しました', 'success')
-    return redirect(url_for('order_list', store_id=store_id))
+    return redirect(url_for('main.order_list', store_id=store_id))
+
+# 一括入荷フォームの1件分を検証し、在庫の列（fridge_id以外）の値を返す（不正ならValueError）
+def parse_receive_row(form, order_id, category_ids):
+    name = (form.get(f'name_{order_id}') or '').strip()
+    if not name or len(name) > 50:
+        raise ValueError('商品名は必須です(50文字以内)')
+    
+    category_id = form.get(f'category_id_{order_id}', type=int)
+    if category_id not in category_ids:
+        raise ValueError('カテゴリを選択してください')
+    
+    quantity_level = form.get(f'quantity_level_{order_id}', 1, type=int)
+    if quantity_level not in [1, 2, 3, 4]:
+        raise ValueError('無効な残量レベルです')
+    
+    expiry_date = form.get(f'expiry_date_{order_id}') or None
+    if expiry_date:
+        try:
+            expiry_date = date.fromisoformat(expiry_date)
+        except ValueError:
+            raise ValueError('賞味期限の形式が正しくありません（YYYY-MM-DD）')
+    
+    memo = (form.get(f'memo_{order_id}') or '').strip() or None
+    if memo and len(memo) > 200:
+        raise ValueError('メモは200文字以内で入力してください')
+    
+    # 入荷したばかりなので開封日は空
+    return (category_id, name, 1, quantity_level, None, expiry_date, memo)
+
+# 発注をまとめて在庫に登録し、発注リストから削除する（登録した発注IDを返す、commitは呼び出し側で行う）
+# rows は {order_id: parse_receive_row() の戻り値}
+def receive_orders_to_items(conn, store_id, rows):
+    order_ids = list(rows)
+    placeholders = ', '.join(['%s'] * len(order_ids))
+    cursor = conn.cursor()
+    
+    # 同じ発注を同時に入荷して二重に登録しないよう、発注行をロックしてから処理する
+    query = f"SELECT id FROM shopping_list WHERE fridge_id = %s AND id IN ({placeholders}) FOR UPDATE"
+    cursor.execute(query, [store_id] + order_ids)
+    found = {row[0] for row in cursor.fetchall()}
+    order_ids = [order_id for order_id in order_ids if order_id in found]
+    
+    if order_ids:
+        # 複数行INSERT 1回 + DELETE 1回
+        row_placeholders = '(' + ', '.join(['%s'] * len(ITEM_COLUMNS)) + ')'
+        query = (f"INSERT INTO items ({', '.join(ITEM_COLUMNS)}) VALUES "
+                 + ', '.join([row_placeholders] * len(order_ids)))
+        cursor.execute(query, [value for order_id in order_ids for value in (store_id,) + rows[order_id]])
+        
+        placeholders = ', '.join(['%s'] * len(order_ids))
+        query = f"DELETE FROM shopping_list WHERE fridge_id = %s AND id IN ({placeholders})"
+        cursor.execute(query, [store_id] + order_ids)
+    
+    cursor.close()
+    return order_ids
+
+# 発注品の一括入荷画面（チェック済みの発注を選択した状態で表示）
+@bp.route('/store/<int:store_id>/receive_orders')
+def receive_orders(store_id):
+    conn = get_db()
+    cursor = db.dict_cursor(conn)
+    
+    # 在庫から追加した発注は、その在庫のカテゴリを初期値にする
+    query = """
+        SELECT s.id, s.item_name, s.memo, s.is_checked, i.category_id
+        FROM shopping_list s
+        LEFT JOIN items i ON i.id = s.item_id AND i.fridge_id = s.fridge_id
+        WHERE s.fridge_id = %s
+        ORDER BY s.created_at, s.id
+    """
+    cursor.execute(query, (store_id,))
+    orders = cursor.fetchall()
+    cursor.close()
+    
+    if not orders:
+        flash('発注リストは空です', 'error')
+        return redirect(url_for('main.order_list', store_id=store_id))
+    
+    categories = get_categories(conn, store_id)
+    
+    return render_template('receive_orders.html',
+                         orders=orders,
+                         categories=categories,
+                         max_items=RECEIVE_BATCH_MAX_ITEMS,
+                         store_id=store_id,
+                         show_back_button=True)
+
+# 発注品の一括入荷処理（1トランザクションで登録と削除を行う）
+@bp.route('/store/<int:store_id>/receive_orders', methods=['POST'])
+def receive_orders_post(store_id):
+    order_ids = list(dict.fromkeys(request.form.getlist('order_id', type=int)))
+    if not order_ids:
+        flash('入荷する発注を選択してください', 'error')
+        return redirect(url_for('main.receive_orders', store_id=store_id))
+    if len(order_ids) > RECEIVE_BATCH_MAX_ITEMS:
+        flash(f'一度に入荷できるのは{RECEIVE_BATCH_MAX_ITEMS}件までです', 'error')
+        return redirect(url_for('main.receive_orders', store_id=store_id))
+    
+    conn = get_db()
+    category_ids = {category['id'] for category in get_categories(conn, store_id)}
+    
+    # 1件でも不正なら何も登録しない
+    rows = {}
+    for order_id in order_ids:
+        try:
+            rows[order_id] = parse_receive_row(request.form, order_id, category_ids)
+        except ValueError as e:
+            name = request.form.get(f'name_{order_id}') or ''
+            flash(f'{name}: {e}' if name else str(e), 'error')
+            return redirect(url_for('main.receive_orders', store_id=store_id))
+    
+    received_ids = receive_orders_to_items(conn, store_id, rows)
+    if received_ids:
+        events.publish_many(conn, store_id, [('orders_removed', {'ids': received_ids}), events.changed('inventory')])
+    conn.commit()
+    
+    received = len(received_ids)
+    flash(f'{received}件を在庫に登録しました', 'success')
+    if received < len(rows):
+        flash(f'{len(rows) - received}件は発注リストから削除済みのため登録しませんでした', 'error')
+    return redirect(url_for('main.order_list', store_id=store_id))
 
 # =============================================
 # カテゴリ管理
 # =============================================
 
 # カテゴリ新規作成API
-@app.route('/store/<int:store_id>/add_category', methods=['POST'])
+@bp.route('/store/<int:store_id>/add_category', methods=['POST'])
 def add_category(store_id):
     name = request.form.get('name')
     
     if not name or len(name) > 50:
         flash('カテゴリ名は必須です（50文字以内）', 'error')
-        return redirect(url_for('inventory_list', store_id=store_id))
+        return redirect(url_for('main.inventory_list', store_id=store_id))
     
-    conn = get_db_connection()
+    conn = get_db()
     cursor = conn.cursor()
     
     query = "INSERT INTO categories (fridge_id, name) VALUES (%s, %s)"
     cursor.execute(query, (store_id, name))
+    bump_category_version(cursor, store_id)
     conn.commit()
     
     cursor.close()
-    conn.close()
     
     flash(f'カテゴリ「{name}」を作成しました', 'success')
-    return redirect(url_for('inventory_list', store_id=store_id))
+    return redirect(url_for('main.inventory_list', store_id=store_id))
 
 # カテゴリ削除API
-@app.route('/store/<int:store_id>/delete_category', methods=['POST'])
+@bp.route('/store/<int:store_id>/delete_category', methods=['POST'])
 def delete_category(store_id):
     category_id = request.form.get('category_id', type=int)
     
-    conn = get_db_connection()
-    if USE_PRODUCTION:
-        cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-    else:
-        cursor = conn.cursor(dictionary=True)
+    conn = get_db()
+    cursor = db.dict_cursor(conn)
     
     # カテゴリ名を取得
     query = "SELECT name FROM categories WHERE id = %s AND fridge_id = %s"
@@ -821,8 +1425,7 @@ def delete_category(store_id):
     
     if not category:
         flash('カテゴリが見つかりません', 'error')
-        conn.close()
-        return redirect(url_for('inventory_list', store_id=store_id))
+        return redirect(url_for('main.inventory_list', store_id=store_id))
     
     category_name = category['name']
     
@@ -833,8 +1436,7 @@ def delete_category(store_id):
     
     if result['count'] <= 1:
         flash('最後のカテゴリは削除できません', 'error')
-        conn.close()
-        return redirect(url_for('inventory_list', store_id=store_id))
+        return redirect(url_for('main.inventory_list', store_id=store_id))
     
     # このカテゴリのアイテムを全て削除
     cursor = conn.cursor()
@@ -845,45 +1447,213 @@ def delete_category(store_id):
     # カテゴリを削除
     query = "DELETE FROM categories WHERE id = %s AND fridge_id = %s"
     cursor.execute(query, (category_id, store_id))
+    bump_category_version(cursor, store_id)
     conn.commit()
     
     cursor.close()
-    conn.close()
     
     flash(f'カテゴリ「{category_name}」と{deleted_items}件のアイテムを削除しました', 'success')
-    return redirect(url_for('inventory_list', store_id=store_id))
+    return redirect(url_for('main.inventory_list', store_id=store_id))
 
 # カテゴリ名変更API
-@app.route('/store/<int:store_id>/rename_category', methods=['POST'])
+@bp.route('/store/<int:store_id>/rename_category', methods=['POST'])
 def rename_category(store_id):
     category_id = request.form.get('category_id', type=int)
     new_name = request.form.get('name', '').strip()
 
     if not new_name or len(new_name) > 50:
         flash('カテゴリ名は必須です（50文字以内）', 'error')
-        return redirect(url_for('inventory_list', store_id=store_id))
+        return redirect(url_for('main.inventory_list', store_id=store_id))
 
-    conn = get_db_connection()
+    conn = get_db()
     cursor = conn.cursor()
 
     query = "UPDATE categories SET name = %s WHERE id = %s AND fridge_id = %s"
     cursor.execute(query, (new_name, category_id, store_id))
+    bump_category_version(cursor, store_id)
     conn.commit()
 
     cursor.close()
-    conn.close()
 
     flash(f'カテゴリ名を「{new_name}」に変更しました', 'success')
-    return redirect(url_for('inventory_list', store_id=store_id))
+    return redirect(url_for('main.inventory_list', store_id=store_id))
+
+# =============================================
+# データ書き出し
+# =============================================
+
+EXPORT_MIMETYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson; charset=utf-8',
+}
+
+# 書き出しをストリーミングで返す（全件をメモリに載せない）
+def export_response(kind, fmt, store_id=None):
+    conn = get_db()
+    scope = f'store{store_id}' if store_id is not None else 'all'
+    filename = f'{kind}_{scope}_{get_japan_time():%Y%m%d}.{fmt}'
+    return Response(
+        stream_with_context(iter_export(conn, kind, fmt, store_id)),
+        mimetype=EXPORT_MIMETYPES[fmt],
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'},
+    )
+
+# 店舗ごとの書き出し（在庫 / 発注リスト）
+@bp.route('/store/<int:store_id>/export/<any(items, orders):kind>.<any(csv, ndjson):fmt>')
+def export_store(store_id, kind, fmt):
+    return export_response(kind, fmt, store_id)
+
+# 全店舗分の書き出し（管理者用、X-Admin-TokenヘッダーにADMIN_EXPORT_TOKENが必要）
+# URLに載せるとアクセスログ・履歴に残るので、クエリ文字列では受け付けない
+@bp.route('/admin/export/<any(items, orders):kind>.<any(csv, ndjson):fmt>')
+def export_all_stores(kind, fmt):
+    token = request.headers.get('X-Admin-Token', '')
+    if not ADMIN_EXPORT_TOKEN or not hmac.compare_digest(token.encode('utf-8'), ADMIN_EXPORT_TOKEN.encode('utf-8')):
+        abort(403)
+    return export_response(kind, fmt)
+
+# =============================================
+# 検索
+# =============================================
+
+# 在庫（商品名・メモ）と発注リスト（商品名）をカテゴリをまたいで検索（入力中の候補表示用JSON API）
+@bp.route('/api/store/<int:store_id>/search')
+def api_search(store_id):
+    text = request.args.get('q', '').strip()[:SEARCH_MAX_QUERY_LENGTH]
+    if not text:
+        return jsonify({'items': [], 'orders': []})
+    
+    conn = get_db()
+    items, orders = search_store(conn, store_id, text)
+    
+    for item in items:
+        item['url'] = url_for('main.edit_item', store_id=store_id, item_id=item['id'])
+    for order in orders:
+        order['url'] = url_for('main.order_list', store_id=store_id, _anchor=f"order-{order['id']}")
+    return jsonify({'items': items, 'orders': orders})
+
+# =============================================
+# オフライン同期
+# =============================================
+
+# 前回の同期（since、前回のレスポンスのcursor）以降に変わった在庫・発注と、削除されたIDを返す
+# sinceがない・古すぎるときは全件を返す（reset=true、端末は写しを作り直す）
+@bp.route('/api/store/<int:store_id>/sync')
+def api_sync(store_id):
+    conn = get_db()
+    return jsonify(fetch_changes(conn, store_id, request.args.get('since')))
+
+# service worker（スコープを / にするためルートから配信する）
+# キャッシュ名にテンプレート・静的ファイルのハッシュを入れ、デプロイごとに古いキャッシュを入れ替える
+@bp.route('/sw.js')
+def service_worker():
+    body = render_template('sw.js', cache_version=assets_digest()[:12], precache_urls=assets.bundle_urls())
+    response = Response(body, mimetype='text/javascript')
+    # 更新をすぐ拾えるよう、ブラウザのキャッシュは毎回確認させる
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+# =============================================
+# 変更通知（Server-Sent Events）
+# =============================================
+
+# 店舗の在庫・発注リストの変更を配信する（在庫一覧・発注リスト画面のJSが購読する）
+@bp.route('/store/<int:store_id>/events')
+def store_events(store_id):
+    return events.stream_response(store_id)
+
+# MySQL用: 前回の確認以降に更新された在庫・発注を updated_at で拾い、(次回用の状態, イベント一覧) を返す
+# 行の追加・削除は updated_at では分からないので、件数が変わったら画面に再読み込みを促す
+def poll_store_changes(conn, store_id, state):
+    cursor = db.dict_cursor(conn)
+    cursor.execute("""
+        SELECT CURRENT_TIMESTAMP AS checked_at,
+               (SELECT COUNT(*) FROM items WHERE fridge_id = %s) AS item_count,
+               (SELECT COUNT(*) FROM shopping_list WHERE fridge_id = %s) AS order_count
+    """, (store_id, store_id))
+    current = cursor.fetchone()
+    messages = []
+    
+    # 初回は基準を記録するだけ
+    if state is not None:
+        # updated_atは秒単位なので同じ秒の更新を落とさないよう >= で比べる（重複して送っても害はない）
+        since = state['checked_at']
+        if current['item_count'] != state['item_count']:
+            messages.append(events.changed('inventory'))
+        else:
+            query = f"SELECT {SQL_ITEM_STATE_COLUMNS} FROM items i WHERE i.fridge_id = %s AND i.updated_at >= %s"
+            cursor.execute(query, (store_id, since))
+            messages.extend(('item', item_state_json(annotate_item(row))) for row in cursor.fetchall())
+        if current['order_count'] != state['order_count']:
+            messages.append(events.changed('orders'))
+        else:
+            query = "SELECT id, is_checked FROM shopping_list WHERE fridge_id = %s AND updated_at >= %s"
+            cursor.execute(query, (store_id, since))
+            messages.extend(('order', {'id': row['id'], 'is_checked': bool(row['is_checked'])})
+                            for row in cursor.fetchall())
+    
+    cursor.close()
+    return current, messages
 
 # =============================================
 # その他
 # =============================================
 
 # 店舗設定画面(ハリボテ)
-@app.route('/store/<int:store_id>/settings')
+@bp.route('/store/<int:store_id>/settings')
 def store_settings(store_id):
     return render_template('store_settings.html', store_id=store_id, show_back_button=True)
 
+# DBコネクションプールの統計（ワーカープロセス単位、レプリカがあればその分も）
+@bp.route('/stats/db_pool')
+def db_pool_stats():
+    stats = db.get_pool().stats()
+    replicas = db.get_replicas()
+    if replicas is not None:
+        stats['replicas'] = replicas.stats()
+    return jsonify(stats)
+
+# カテゴリキャッシュのヒット率（ワーカープロセス単位）
+@bp.route('/stats/category_cache')
+def category_cache_stats():
+    return jsonify(category_cache.stats())
+
+# =============================================
+# アプリの作成
+# =============================================
+
+def create_app():
+    """アプリを作成する（DBへの接続は最初のリクエストまで行わない）"""
+    app = Flask(__name__)
+    app.secret_key = 'your-secret-key-here-change-in-production'
+    app.config['MAX_CONTENT_LENGTH'] = IMPORT_MAX_BYTES
+    db.init_app(app)
+    # /assets/（ハッシュ付きファイル名のCSS・JS）とHTML・JSONの圧縮。
+    # after_requestは登録の逆順に動くので、計測などより先に登録して最後に圧縮する
+    assets.init_app(app)
+    # /metrics（画面・クエリ・接続取得・テンプレート描画の時間）
+    metrics.init_app(app, caches=(category_cache,))
+    # 閾値を超えたクエリを logs/slow_query.log に記録（一部は実行計画も）
+    slowlog.init_app(app)
+    # 在庫・発注リストの変更通知（MySQLではpoll_store_changesで拾う）
+    events.init_app(app, poll_store_changes)
+    app.register_blueprint(bp)
+    app.logger.info('DB: %s', 'PostgreSQL' if USE_PRODUCTION else 'MySQL')
+    return app
+
+
+# `gunicorn app:app` 用。importしただけではアプリを作らず、最初に参照されたときに作る
+_app = None
+
+
+def __getattr__(name):
+    global _app
+    if name == 'app':
+        if _app is None:
+            _app = create_app()
+        return _app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
 if __name__ == '__main__':
-    app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
+    create_app().run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
@@ -0,0 +1,284 @@
+"""静的ファイル（CSS/JS）のバンドル・フィンガープリント・圧縮
+
+画面ごとに読み込むCSS（base.css + 画面のCSS）とJSを1ファイルにまとめて最小化し、
+内容のハッシュを付けたファイル名で /assets/ から配信する（1年キャッシュ、immutable）。
+gzip / brotli の圧縮済みデータを用意しておき、Accept-Encoding に合わせて返す。
+
+  # デプロイ時に static/dist/ へ書き出す（なければ最初のリクエストでメモリ上に作る）
+  python scripts/build_assets.py
+
+あわせて、描画したHTML・JSONが一定サイズ以上ならその場で圧縮して返す。
+"""
+import gzip
+import hashlib
+import json
+import os
+import re
+import threading
+
+from flask import Response, abort, request, url_for
+
+from config import COMPRESS_MIN_BYTES, COMPRESS_LEVEL, ASSET_MAX_AGE
+
+try:
+    import brotli
+except ImportError:
+    try:
+        import brotlicffi as brotli
+    except ImportError:
+        brotli = None
+
+_STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+DIST_DIR = os.path.join(_STATIC_DIR, 'dist')
+MANIFEST_PATH = os.path.join(DIST_DIR, 'manifest.json')
+
+# バンドル名 -> 元のファイル（static/ からの相対パス、この順に連結）
+BUNDLES = {
+    'base.css': ['css/base.css'],
+    'form.css': ['css/base.css', 'css/form.css'],
+    'inventory.css': ['css/base.css', 'css/inventory.css'],
+    'order_list.css': ['css/base.css', 'css/order_list.css'],
+    'store_select.css': ['css/base.css', 'css/store_select.css'],
+    'app.js': ['js/script.js'],
+}
+
+MIMETYPES = {
+    '.css': 'text/css',
+    '.js': 'text/javascript',
+}
+
+# その場で圧縮するレスポンス
+_COMPRESSIBLE_MIMETYPES = {'text/html', 'application/json'}
+# その場で圧縮するときのbrotliの品質（0〜11、大きいほど遅い）
+_BROTLI_DYNAMIC_QUALITY = 5
+
+
+# =============================================
+# 最小化
+# =============================================
+
+# 文字列とコメントを先に取り出し、それ以外の部分だけ空白を詰める
+_CSS_TOKENS = re.compile(r'("(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\')|/\*.*?\*/', re.S)
+
+
+def minify_css(text):
+    """コメントを消し、空白を詰める（セレクタの意味が変わる詰め方はしない）"""
+    parts = []
+    code = ''
+    last = 0
+    for match in _CSS_TOKENS.finditer(text):
+        code += text[last:match.start()]
+        if match.group(1):
+            parts.append(_squeeze_css(code))
+            parts.append(match.group(1))
+            code = ''
+        else:
+            # コメントは空白として前後のコードとまとめて詰める
+            code += ' '
+        last = match.end()
+    parts.append(_squeeze_css(code + text[last:]))
+    return ''.join(parts).strip()
+
+
+def _squeeze_css(chunk):
+    chunk = re.sub(r'\s+', ' ', chunk)
+    # 「a :hover」と「a:hover」は意味が違うので、コロンは後ろの空白だけ詰める
+    chunk = re.sub(r'\s*([{};,>])\s*', r'\1', chunk)
+    chunk = re.sub(r':\s+', ':', chunk)
+    return chunk.replace(';}', '}')
+
+
+def minify_js(text):
+    """行頭・行末の空白、空行、行全体のコメントを消す
+
+    改行は残すので、セミコロンの自動挿入に頼った書き方でも動きは変わらない。
+    """
+    lines = []
+    for line in text.splitlines():
+        line = line.strip()
+        if not line or line.startswith('//'):
+            continue
+        lines.append(line)
+    return '\n'.join(lines) + '\n'
+
+
+_MINIFIERS = {'.css': minify_css, '.js': minify_js}
+
+
+# =============================================
+# ビルド
+# =============================================
+
+def build_bundle(name):
+    """バンドルを連結・最小化した内容（bytes）"""
+    minify = _MINIFIERS[os.path.splitext(name)[1]]
+    sources = []
+    for path in BUNDLES[name]:
+        with open(os.path.join(_STATIC_DIR, path), encoding='utf-8') as f:
+            sources.append(minify(f.read()))
+    return '\n'.join(sources).encode('utf-8')
+
+
+def hashed_filename(name, content):
+    """inventory.css -> inventory.<内容のハッシュ>.css"""
+    stem, ext = os.path.splitext(name)
+    return f'{stem}.{hashlib.sha256(content).hexdigest()[:12]}{ext}'
+
+
+def compress_variants(content):
+    """{'gzip': ..., 'br': ...}（brotliがなければgzipのみ）。mtime=0で毎回同じ内容にする"""
+    variants = {'gzip': gzip.compress(content, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants['br'] = brotli.compress(content, quality=11)
+    return variants
+
+
+def build_all():
+    """全バンドルを作る。戻り値: {バンドル名: (ファイル名, {エンコーディング: 内容})}"""
+    built = {}
+    for name in BUNDLES:
+        content = build_bundle(name)
+        encodings = {'identity': content}
+        encodings.update(compress_variants(content))
+        built[name] = (hashed_filename(name, content), encodings)
+    return built
+
+
+_SUFFIXES = {'identity': '', 'gzip': '.gz', 'br': '.br'}
+
+
+def write_dist():
+    """static/dist/ にバンドル・圧縮版・manifest.json を書き出す（古いファイルは消す）"""
+    built = build_all()
+    os.makedirs(DIST_DIR, exist_ok=True)
+    keep = {'manifest.json'}
+    for filename, encodings in built.values():
+        for encoding, content in encodings.items():
+            path_name = filename + _SUFFIXES[encoding]
+            keep.add(path_name)
+            with open(os.path.join(DIST_DIR, path_name), 'wb') as f:
+                f.write(content)
+    for path_name in os.listdir(DIST_DIR):
+        if path_name not in keep:
+            os.remove(os.path.join(DIST_DIR, path_name))
+    manifest = {name: filename for name, (filename, _) in built.items()}
+    with open(MANIFEST_PATH, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return built
+
+
+def _load_dist():
+    """書き出し済みの static/dist/ を読む
+
+    manifest.jsonがない、または元のファイルの方が新しい（ビルド後に編集した）ときはNone。
+    """
+    try:
+        built_at = os.path.getmtime(MANIFEST_PATH)
+        with open(MANIFEST_PATH, encoding='utf-8') as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        return None
+    sources = {path for paths in BUNDLES.values() for path in paths}
+    if any(os.path.getmtime(os.path.join(_STATIC_DIR, path)) > built_at for path in sources):
+        return None
+    built = {}
+    for name, filename in manifest.items():
+        encodings = {}
+        for encoding, suffix in _SUFFIXES.items():
+            path = os.path.join(DIST_DIR, filename + suffix)
+            if os.path.exists(path):
+                with open(path, 'rb') as f:
+                    encodings[encoding] = f.read()
+        built[name] = (filename, encodings)
+    return built
+
+
+# =============================================
+# 配信
+# =============================================
+
+_bundles = None  # バンドル名 -> ファイル名
+_files = None    # ファイル名 -> {エンコーディング: 内容}
+_lock = threading.Lock()
+
+
+def _load():
+    global _bundles, _files
+    if _files is None:
+        with _lock:
+            if _files is None:
+                built = _load_dist() or build_all()
+                _bundles = {name: filename for name, (filename, _) in built.items()}
+                _files = {filename: encodings for filename, encodings in built.values()}
+
+
+def asset_url(name):
+    """バンドルのURL（テンプレートから {{ asset_url('inventory.css') }} で使う）"""
+    _load()
+    return url_for('asset', filename=_bundles[name])
+
+
+def bundle_urls():
+    """全バンドルのURL（service workerが先にキャッシュしておく）"""
+    _load()
+    return [url_for('asset', filename=filename) for filename in _bundles.values()]
+
+
+def _preferred_encoding(available):
+    accepted = request.accept_encodings
+    for encoding in ('br', 'gzip'):
+        if encoding in available and accepted[encoding]:
+            return encoding
+    return 'identity'
+
+
+def _asset_view(filename):
+    _load()
+    encodings = _files.get(filename)
+    if encodings is None:
+        abort(404)
+    encoding = _preferred_encoding(encodings)
+    response = Response(encodings[encoding], mimetype=MIMETYPES[os.path.splitext(filename)[1]])
+    if encoding != 'identity':
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    # ファイル名に内容のハッシュが入っているので、再検証せずに使い続けてよい
+    response.headers['Cache-Control'] = f'public, max-age={ASSET_MAX_AGE}, immutable'
+    return response
+
+
+def _compress_response(response):
+    """HTML・JSONが COMPRESS_MIN_BYTES 以上なら gzip / brotli で圧縮する"""
+    if (COMPRESS_MIN_BYTES <= 0
+            or response.status_code != 200
+            or response.mimetype not in _COMPRESSIBLE_MIMETYPES
+            or response.direct_passthrough
+            or response.is_streamed
+            or 'Content-Encoding' in response.headers):
+        return response
+    response.vary.add('Accept-Encoding')
+    available = ('br', 'gzip') if brotli is not None else ('gzip',)
+    encoding = _preferred_encoding(available)
+    if encoding == 'identity':
+        return response
+    content = response.get_data()
+    if len(content) < COMPRESS_MIN_BYTES:
+        return response
+    if encoding == 'br':
+        content = brotli.compress(content, quality=_BROTLI_DYNAMIC_QUALITY)
+    else:
+        content = gzip.compress(content, compresslevel=COMPRESS_LEVEL)
+    response.set_data(content)
+    response.headers['Content-Encoding'] = encoding
+    # 圧縮後の本文は元と同じバイト列ではないので、ETagは弱いものにする
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
+
+
+def init_app(app):
+    """/assets/<filename> と asset_url()、レスポンスの圧縮を登録する"""
+    app.add_url_rule('/assets/<filename>', 'asset', _asset_view)
+    app.add_template_global(asset_url)
+    app.after_request(_compress_response)
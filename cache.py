@@ -0,0 +1,58 @@
+import threading
+from collections import OrderedDict
+
+
+class VersionedCache:
+    """バージョン番号付きのプロセス内キャッシュ
+
+    値はDB側のバージョンカウンタと一緒に保存し、読み出し時に呼び出し元が
+    渡した最新バージョンと一致した場合だけヒットとする。
+    他のワーカーで更新があってもバージョンが変わるので古い値は返らない。
+    """
+
+    def __init__(self, name, max_entries=1024):
+        self.name = name
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (version, value)
+        self._hits = 0
+        self._misses = 0
+        self._invalidations = 0
+
+    def get(self, key, version):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(key)
+                self._hits += 1
+                return entry[1]
+            self._misses += 1
+            return None
+
+    def set(self, key, version, value):
+        with self._lock:
+            self._entries[key] = (version, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key):
+        with self._lock:
+            if self._entries.pop(key, None) is not None:
+                self._invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            total = self._hits + self._misses
+            return {
+                'name': self.name,
+                'entries': len(self._entries),
+                'hits': self._hits,
+                'misses': self._misses,
+                'invalidations': self._invalidations,
+                'hit_ratio': round(self._hits / total, 4) if total else None,
+            }
@@ -0,0 +1,59 @@
+"""画面の条件付きGET（ETag / 304 Not Modified）
+
+在庫一覧・発注リストは、店舗の変更バージョン（store_summary の items_version / orders_version、
+fridges.category_version）と日本時間の日付からETagを作る。ブラウザの If-None-Match と
+一致すれば、在庫を読まずテンプレートも描画せずに304を返す。
+"""
+import hashlib
+import os
+
+from flask import make_response, request, session
+
+_BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+_ASSET_DIRS = ('templates', 'static')
+
+_assets_digest = None
+
+
+def assets_digest():
+    """テンプレート・静的ファイルの内容のハッシュ
+
+    デプロイで画面が変わったら別のETagにする。内容から作るので、どのワーカーでも同じ値になる。
+    """
+    global _assets_digest
+    if _assets_digest is None:
+        digest = hashlib.sha1()
+        for name in _ASSET_DIRS:
+            for root, dirs, files in os.walk(os.path.join(_BASE_DIR, name)):
+                dirs.sort()
+                for filename in sorted(files):
+                    path = os.path.join(root, filename)
+                    digest.update(os.path.relpath(path, _BASE_DIR).encode('utf-8'))
+                    with open(path, 'rb') as f:
+                        digest.update(f.read())
+        _assets_digest = digest.hexdigest()
+    return _assets_digest
+
+
+def page_etag(*parts):
+    """画面のETag（parts・URL・テンプレートから作る）"""
+    key = '|'.join(str(part) for part in parts + (request.full_path, assets_digest()))
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+
+def conditional_page(etag, render):
+    """ETagが一致すれば304、そうでなければ render() で描画してETagを付ける
+
+    フラッシュメッセージを表示する画面（更新後のリダイレクト先）は、その回限りの内容なので
+    304にもせず、ETagも付けない。etagがNone（店舗が見つからないなど）のときも同様。
+    """
+    if etag is None or '_flashes' in session:
+        return render()
+    if request.if_none_match.contains_weak(etag):
+        response = make_response('', 304)
+    else:
+        response = make_response(render())
+    response.set_etag(etag)
+    # 表示のたびに再検証させる（変更がなければ304で本文は送らない）
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
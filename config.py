@@ -23,4 +23,133 @@ def get_db_config():
     if USE_PRODUCTION:
         return DATABASE_URL
     else:
-        return DB_CONFIG_LOCAL
\ No newline at end of file
+        return DB_CONFIG_LOCAL
+
+# 読み取り用レプリカ（カンマ区切りで複数指定可、未設定ならすべてプライマリで読み書きする）
+# PostgreSQL: DATABASE_URLと同じ形式の接続URL / MySQL: ホスト名（ユーザー・DB名はDB_CONFIG_LOCALと同じ）
+# レプリカごとにプライマリと同じ大きさのプール（DB_POOL_MAX_SIZE）を持つ。
+# 止まったレプリカで待ち続けないよう、URLには connect_timeout を付けておく（例: ?connect_timeout=3）
+DATABASE_REPLICAS = [dsn.strip() for dsn in os.environ.get('DATABASE_REPLICAS', '').split(',') if dsn.strip()]
+
+def get_replica_configs():
+    if USE_PRODUCTION:
+        return list(DATABASE_REPLICAS)
+    else:
+        return [dict(DB_CONFIG_LOCAL, host=host) for host in DATABASE_REPLICAS]
+
+# =============================================
+# コネクションプール設定（gunicornワーカー1プロセスあたり）
+# =============================================
+# 同期ワーカーは同時に1リクエストしか処理しないため小さめで十分。
+# gthreadワーカー（--threads）ではスレッド数より少し多めにする（在庫一覧はカテゴリを別の接続で
+# 同時に読むことがある。空きがなければ同じ接続で順に読むので、足りなくても待ちはしない）。
+# 「ワーカー数 × DB_POOL_MAX_SIZE」がSupabaseプーラーの上限を超えないようにする。
+DB_POOL_MIN_SIZE = int(os.environ.get('DB_POOL_MIN_SIZE', '1'))
+DB_POOL_MAX_SIZE = int(os.environ.get('DB_POOL_MAX_SIZE', '4'))
+# 接続待ちのタイムアウト（秒）
+DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', '10'))
+# 物理接続の最大寿命（秒）。超えたら返却時に作り直す
+DB_POOL_MAX_LIFETIME = float(os.environ.get('DB_POOL_MAX_LIFETIME', '1800'))
+# この秒数以上アイドルだった接続は貸し出し前に疎通確認する
+DB_POOL_HEALTH_CHECK_INTERVAL = float(os.environ.get('DB_POOL_HEALTH_CHECK_INTERVAL', '30'))
+
+# =============================================
+# 読み取り用レプリカ（DATABASE_REPLICAS）
+# =============================================
+# 更新（GET以外のリクエスト）の後、この秒数はそのブラウザの読み取りもプライマリで行う。
+# 更新後のリダイレクト先で、レプリカの遅延のために自分の更新が見えないことがないようにする
+DB_REPLICA_PIN_SECONDS = float(os.environ.get('DB_REPLICA_PIN_SECONDS', '5'))
+# 接続できなかったレプリカを外しておく秒数（過ぎたら次の読み取りで再び試す）
+DB_REPLICA_RETRY_SECONDS = float(os.environ.get('DB_REPLICA_RETRY_SECONDS', '30'))
+
+# カテゴリキャッシュに保持する店舗数の上限（ワーカープロセス単位）
+CATEGORY_CACHE_MAX_ENTRIES = int(os.environ.get('CATEGORY_CACHE_MAX_ENTRIES', '1024'))
+
+# 残量一括更新（棚卸し）で一度に受け付ける件数の上限
+QUANTITY_BATCH_MAX_ITEMS = int(os.environ.get('QUANTITY_BATCH_MAX_ITEMS', '500'))
+
+# 発注品の一括入荷で一度に受け付ける件数の上限
+RECEIVE_BATCH_MAX_ITEMS = int(os.environ.get('RECEIVE_BATCH_MAX_ITEMS', '200'))
+
+# CSV一括登録
+IMPORT_MAX_BYTES = int(os.environ.get('IMPORT_MAX_BYTES', str(32 * 1024 * 1024)))
+# 1回の書き込み（COPY / 複数行INSERT）あたりの行数
+IMPORT_BATCH_SIZE = int(os.environ.get('IMPORT_BATCH_SIZE', '1000'))
+# 結果画面に表示するエラー行の上限
+IMPORT_MAX_REJECTED_DETAILS = int(os.environ.get('IMPORT_MAX_REJECTED_DETAILS', '100'))
+
+# データ書き出し
+# fetchmanyで一度に読む行数
+EXPORT_FETCH_SIZE = int(os.environ.get('EXPORT_FETCH_SIZE', '1000'))
+# 全店舗分の書き出しに必要なトークン（X-Admin-Tokenヘッダーで送る。未設定なら全店舗書き出しは無効）
+ADMIN_EXPORT_TOKEN = os.environ.get('ADMIN_EXPORT_TOKEN')
+
+# 在庫一覧の1ページあたりの件数（続きは無限スクロールで読み込む）
+INVENTORY_PAGE_SIZE = int(os.environ.get('INVENTORY_PAGE_SIZE', '50'))
+
+# 在庫・発注リストの検索（入力中の候補表示）
+# 在庫・発注リストそれぞれの最大件数
+SEARCH_MAX_RESULTS = int(os.environ.get('SEARCH_MAX_RESULTS', '20'))
+# 検索語の最大文字数（これより長い分は切り捨てる）
+SEARCH_MAX_QUERY_LENGTH = int(os.environ.get('SEARCH_MAX_QUERY_LENGTH', '50'))
+
+# オフライン同期（/api/store/<id>/sync の差分取得）
+# 前回の同期時刻からさかのぼって読み直す秒数。同期中にコミットされた更新や
+# レプリカの遅延で取りこぼさないための重なり（重複して届いた行は端末側で上書きするだけ）
+SYNC_OVERLAP_SECONDS = float(os.environ.get('SYNC_OVERLAP_SECONDS', '30'))
+# 削除記録（sync_tombstones）を残す日数。これより前から同期していない端末には全件を返し直す
+SYNC_TOMBSTONE_RETENTION_DAYS = int(os.environ.get('SYNC_TOMBSTONE_RETENTION_DAYS', '30'))
+
+# =============================================
+# スロークエリログ
+# =============================================
+# この時間（ミリ秒）以上かかったクエリを記録する（0以下で無効）
+SLOW_QUERY_THRESHOLD_MS = float(os.environ.get('SLOW_QUERY_THRESHOLD_MS', '200'))
+SLOW_QUERY_LOG_PATH = os.environ.get('SLOW_QUERY_LOG_PATH', 'logs/slow_query.log')
+SLOW_QUERY_LOG_MAX_BYTES = int(os.environ.get('SLOW_QUERY_LOG_MAX_BYTES', str(10 * 1024 * 1024)))
+SLOW_QUERY_LOG_BACKUP_COUNT = int(os.environ.get('SLOW_QUERY_LOG_BACKUP_COUNT', '5'))
+# スロークエリのうち実行計画（EXPLAIN）も取る割合
+SLOW_QUERY_EXPLAIN_SAMPLE_RATE = float(os.environ.get('SLOW_QUERY_EXPLAIN_SAMPLE_RATE', '0.1'))
+# 同じクエリの実行計画を取り直すまでの間隔（秒）
+SLOW_QUERY_EXPLAIN_MIN_INTERVAL = float(os.environ.get('SLOW_QUERY_EXPLAIN_MIN_INTERVAL', '300'))
+# EXPLAIN ANALYZE（SELECTを実際に再実行する）のタイムアウト（ミリ秒）
+SLOW_QUERY_EXPLAIN_TIMEOUT_MS = int(os.environ.get('SLOW_QUERY_EXPLAIN_TIMEOUT_MS', '5000'))
+
+# =============================================
+# 店舗パスワード（bcrypt）
+# =============================================
+# bcryptのコスト。4桁のPINは総当たりの候補が1万通りしかないため、
+# 安全性は下の試行回数制限で確保し、コストは応答時間とのバランスで決める
+PASSWORD_HASH_ROUNDS = int(os.environ.get('PASSWORD_HASH_ROUNDS', '10'))
+# ハッシュ計算を行うスレッド数と、それ以上に待たせる件数の上限（ワーカープロセス単位）
+PASSWORD_HASH_MAX_WORKERS = int(os.environ.get('PASSWORD_HASH_MAX_WORKERS', '2'))
+PASSWORD_HASH_MAX_PENDING = int(os.environ.get('PASSWORD_HASH_MAX_PENDING', '4'))
+# ハッシュ計算の結果を待つ上限（秒）
+PASSWORD_HASH_TIMEOUT = float(os.environ.get('PASSWORD_HASH_TIMEOUT', '5'))
+# 店舗ごとに連続してこの回数間違えたらロックする
+PASSWORD_MAX_ATTEMPTS = int(os.environ.get('PASSWORD_MAX_ATTEMPTS', '5'))
+# ロックする時間（秒）。ロック解除後も1回間違えるたびに再ロックする
+PASSWORD_LOCKOUT_SECONDS = int(os.environ.get('PASSWORD_LOCKOUT_SECONDS', '300'))
+
+# =============================================
+# 変更通知（Server-Sent Events）
+# =============================================
+# 1ワーカープロセスあたりの同時接続数の上限（0で無効）。
+# 接続中はスレッドを1つ使い続けるので、gunicornは gthread ワーカー（--threads）で起動する
+EVENTS_MAX_CLIENTS = int(os.environ.get('EVENTS_MAX_CLIENTS', '50'))
+# 接続維持のコメントを送る間隔（秒）
+EVENTS_HEARTBEAT_SECONDS = float(os.environ.get('EVENTS_HEARTBEAT_SECONDS', '15'))
+# 1回の接続の最長時間（秒）。過ぎたら切断してブラウザに再接続させる
+EVENTS_MAX_STREAM_SECONDS = float(os.environ.get('EVENTS_MAX_STREAM_SECONDS', '300'))
+# MySQL: updated_at を確認する間隔（秒）
+EVENTS_POLL_INTERVAL = float(os.environ.get('EVENTS_POLL_INTERVAL', '2'))
+
+# =============================================
+# 静的ファイル・レスポンスの圧縮
+# =============================================
+# HTML・JSONをその場で圧縮する最小サイズ（バイト、0で圧縮しない）。小さい応答は圧縮しても得にならない
+COMPRESS_MIN_BYTES = int(os.environ.get('COMPRESS_MIN_BYTES', '1024'))
+# その場で圧縮するときのgzipの圧縮レベル（1〜9、大きいほど遅い）
+COMPRESS_LEVEL = int(os.environ.get('COMPRESS_LEVEL', '6'))
+# /assets/ のファイルをブラウザにキャッシュさせる期間（秒）。ファイル名に内容のハッシュが入るので長くしてよい
+ASSET_MAX_AGE = int(os.environ.get('ASSET_MAX_AGE', '31536000'))
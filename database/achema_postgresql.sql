@@ -5,7 +5,13 @@
 -- 更新日: 2026-02-26 (店舗在庫管理システムに変更)
 -- =============================================
 
+-- 部分一致検索（トライグラム）
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
 -- 既存のテーブルを削除(開発時のリセット用)
+DROP TABLE IF EXISTS sync_tombstones CASCADE;
+DROP TABLE IF EXISTS store_expiry_counts CASCADE;
+DROP TABLE IF EXISTS store_summary CASCADE;
 DROP TABLE IF EXISTS items CASCADE;
 DROP TABLE IF EXISTS shopping_list CASCADE;
 DROP TABLE IF EXISTS categories CASCADE;
@@ -22,6 +28,9 @@ CREATE TABLE fridges (
     fridge_icon VARCHAR(10) DEFAULT '🏪',
     password_hash VARCHAR(255) NOT NULL,
     owner_user_id INT NULL,
+    category_version INT NOT NULL DEFAULT 0,
+    failed_password_attempts INT NOT NULL DEFAULT 0,
+    password_locked_until TIMESTAMP NULL,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
@@ -32,6 +41,9 @@ COMMENT ON COLUMN fridges.fridge_name IS '店舗名';
 COMMENT ON COLUMN fridges.fridge_icon IS '絵文字アイコン';
 COMMENT ON COLUMN fridges.password_hash IS '4桁パスワードのハッシュ';
 COMMENT ON COLUMN fridges.owner_user_id IS '作成者ID（Phase2実装予定）';
+COMMENT ON COLUMN fridges.category_version IS 'カテゴリ変更のたびに加算（カテゴリキャッシュの整合性確認用）';
+COMMENT ON COLUMN fridges.failed_password_attempts IS 'パスワードを連続で間違えた回数（成功で0に戻す）';
+COMMENT ON COLUMN fridges.password_locked_until IS 'この時刻までパスワード入力を受け付けない';
 
 -- =============================================
 -- 2. usersテーブル(ユーザー情報) ※Phase2で実装
@@ -70,7 +82,8 @@ CREATE TABLE categories (
     FOREIGN KEY (fridge_id) REFERENCES fridges(fridge_id) ON DELETE CASCADE
 );
 
-CREATE INDEX idx_categories_fridge ON categories(fridge_id);
+-- 店舗のカテゴリ一覧（ORDER BY id）・先頭カテゴリ（MIN(id)）用
+CREATE INDEX idx_categories_fridge_id ON categories(fridge_id, id);
 
 COMMENT ON TABLE categories IS '在庫カテゴリ';
 
@@ -86,17 +99,29 @@ CREATE TABLE items (
     quantity_level INT NOT NULL DEFAULT 1,
     opened_date DATE NULL,
     expiry_date DATE NULL,
+    expiry_sort DATE GENERATED ALWAYS AS (COALESCE(expiry_date, DATE '9999-12-31')) STORED,
     memo TEXT NULL,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    client_id VARCHAR(36) NULL,
     FOREIGN KEY (fridge_id) REFERENCES fridges(fridge_id) ON DELETE CASCADE,
     FOREIGN KEY (category_id) REFERENCES categories(id) ON DELETE CASCADE
 );
 
-CREATE INDEX idx_items_fridge ON items(fridge_id);
+-- 店舗単位の一括取得・書き出し（ORDER BY id）用
+CREATE INDEX idx_items_fridge_id ON items(fridge_id, id);
+-- カテゴリ削除時の連鎖削除用
 CREATE INDEX idx_items_category ON items(category_id);
-CREATE INDEX idx_items_expiry ON items(expiry_date);
-CREATE INDEX idx_items_quantity ON items(quantity_level);
+-- 在庫一覧のソート順（期限順・残量順）と同じ並びの複合インデックス（キーセットページング用）
+CREATE INDEX idx_items_page_expiry ON items(fridge_id, category_id, expiry_sort, id);
+CREATE INDEX idx_items_page_quantity ON items(fridge_id, category_id, quantity_level DESC, expiry_sort, id);
+-- 検索（ILIKE '%語%'）用のトライグラムインデックス
+CREATE INDEX idx_items_name_trgm ON items USING gin (name gin_trgm_ops);
+CREATE INDEX idx_items_memo_trgm ON items USING gin (memo gin_trgm_ops);
+-- 差分同期（店舗の updated_at 以降の行）用
+CREATE INDEX idx_items_fridge_updated ON items(fridge_id, updated_at);
+-- オフライン中に追加した在庫の再送で二重に登録しないための一意制約
+CREATE UNIQUE INDEX uq_items_fridge_client ON items(fridge_id, client_id) WHERE client_id IS NOT NULL;
 
 COMMENT ON TABLE items IS '在庫情報';
 COMMENT ON COLUMN items.name IS '商品名';
@@ -104,7 +129,9 @@ COMMENT ON COLUMN items.container_type IS '容器タイプ';
 COMMENT ON COLUMN items.quantity_level IS '残量レベル';
 COMMENT ON COLUMN items.opened_date IS '開封日';
 COMMENT ON COLUMN items.expiry_date IS '賞味期限';
+COMMENT ON COLUMN items.expiry_sort IS '並び替え用の賞味期限（未設定は9999-12-31）';
 COMMENT ON COLUMN items.memo IS 'メモ（発注先、ロット番号など）';
+COMMENT ON COLUMN items.client_id IS 'オフライン中に端末で採番したID（再送時の重複登録防止）';
 
 -- updated_atの自動更新トリガー
 CREATE OR REPLACE FUNCTION update_updated_at_column()
@@ -129,12 +156,23 @@ CREATE TABLE shopping_list (
     memo TEXT NULL,
     is_checked BOOLEAN DEFAULT FALSE,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     FOREIGN KEY (fridge_id) REFERENCES fridges(fridge_id) ON DELETE CASCADE,
     FOREIGN KEY (item_id) REFERENCES items(id) ON DELETE SET NULL
 );
 
-CREATE INDEX idx_shopping_fridge ON shopping_list(fridge_id);
+-- 発注リスト画面（ORDER BY created_at）・書き出し用
+CREATE INDEX idx_shopping_fridge_created ON shopping_list(fridge_id, created_at, id);
+-- 同じ在庫を二重に発注しないための一意制約（在庫一覧の「発注リストに追加済みか」の判定にも使う）
+CREATE UNIQUE INDEX uq_shopping_fridge_item ON shopping_list(fridge_id, item_id) WHERE item_id IS NOT NULL;
+-- 発注完了（チェック済みの削除）用
+CREATE INDEX idx_shopping_fridge_checked ON shopping_list(fridge_id) WHERE is_checked;
+-- 在庫削除時の item_id = NULL 更新用
 CREATE INDEX idx_shopping_item ON shopping_list(item_id);
+-- 検索（ILIKE '%語%'）用のトライグラムインデックス
+CREATE INDEX idx_shopping_item_name_trgm ON shopping_list USING gin (item_name gin_trgm_ops);
+-- 差分同期（店舗の updated_at 以降の行）用
+CREATE INDEX idx_shopping_fridge_updated ON shopping_list(fridge_id, updated_at);
 
 COMMENT ON TABLE shopping_list IS '発注リスト';
 COMMENT ON COLUMN shopping_list.item_id IS '元在庫ID（自動追加時のみ）';
@@ -142,6 +180,194 @@ COMMENT ON COLUMN shopping_list.item_name IS '商品名';
 COMMENT ON COLUMN shopping_list.memo IS 'メモ（発注先、納期など）';
 COMMENT ON COLUMN shopping_list.is_checked IS '発注済みフラグ';
 
+CREATE TRIGGER update_shopping_list_updated_at BEFORE UPDATE ON shopping_list
+    FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
+
+-- =============================================
+-- 7. store_summaryテーブル(店舗ごとの集計)
+-- =============================================
+CREATE TABLE store_summary (
+    fridge_id INT PRIMARY KEY,
+    item_count INT NOT NULL DEFAULT 0,
+    low_stock_items INT NOT NULL DEFAULT 0,
+    out_of_stock_items INT NOT NULL DEFAULT 0,
+    order_count INT NOT NULL DEFAULT 0,
+    items_version BIGINT NOT NULL DEFAULT 0,
+    orders_version BIGINT NOT NULL DEFAULT 0,
+    FOREIGN KEY (fridge_id) REFERENCES fridges(fridge_id) ON DELETE CASCADE
+);
+
+COMMENT ON TABLE store_summary IS '店舗ごとの集計（トリガーで更新）';
+COMMENT ON COLUMN store_summary.low_stock_items IS '残量レベル3（少ない）の在庫数';
+COMMENT ON COLUMN store_summary.out_of_stock_items IS '残量レベル4（なし）の在庫数';
+COMMENT ON COLUMN store_summary.order_count IS '発注リストの件数';
+COMMENT ON COLUMN store_summary.items_version IS '在庫を変更するたびに加算（画面のETag用）';
+COMMENT ON COLUMN store_summary.orders_version IS '発注リストを変更するたびに加算（画面のETag用）';
+
+-- =============================================
+-- 8. store_expiry_countsテーブル(賞味期限の日付ごとの在庫数)
+-- =============================================
+CREATE TABLE store_expiry_counts (
+    fridge_id INT NOT NULL,
+    expiry_date DATE NOT NULL,
+    item_count INT NOT NULL,
+    PRIMARY KEY (fridge_id, expiry_date),
+    FOREIGN KEY (fridge_id) REFERENCES fridges(fridge_id) ON DELETE CASCADE
+);
+
+COMMENT ON TABLE store_expiry_counts IS '店舗・賞味期限の日付ごとの在庫数（トリガーで更新、0件の行は削除）';
+
+-- =============================================
+-- 9. sync_tombstonesテーブル(削除した在庫・発注のID)
+-- =============================================
+CREATE TABLE sync_tombstones (
+    id BIGSERIAL PRIMARY KEY,
+    fridge_id INT NOT NULL,
+    kind VARCHAR(10) NOT NULL,
+    row_id INT NOT NULL,
+    deleted_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (fridge_id) REFERENCES fridges(fridge_id) ON DELETE CASCADE
+);
+
+CREATE INDEX idx_sync_tombstones_fridge ON sync_tombstones(fridge_id, deleted_at);
+-- 保持期間を過ぎた記録の削除用
+CREATE INDEX idx_sync_tombstones_deleted ON sync_tombstones(deleted_at);
+
+COMMENT ON TABLE sync_tombstones IS '削除した在庫・発注のID（差分同期用、トリガーで記録）';
+COMMENT ON COLUMN sync_tombstones.kind IS '''item''（在庫） / ''order''（発注リスト）';
+COMMENT ON COLUMN sync_tombstones.row_id IS '削除した行のID';
+
+-- 集計テーブルを更新するトリガー（文単位・遷移テーブルで差分だけ反映する）
+-- 店舗作成時に集計行を作る
+CREATE OR REPLACE FUNCTION store_summary_fridge_inserted()
+RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO store_summary (fridge_id) VALUES (NEW.fridge_id) ON CONFLICT DO NOTHING;
+    RETURN NULL;
+END;
+$$ language 'plpgsql';
+
+CREATE TRIGGER store_summary_fridge_insert AFTER INSERT ON fridges
+    FOR EACH ROW EXECUTE FUNCTION store_summary_fridge_inserted();
+
+-- 在庫の差分（+1: 追加・更新後、-1: 削除・更新前）を集計に反映する
+-- 件数が変わらない更新（メモの編集など）でもバージョン（items_version）は上げる。
+-- 店舗削除の連鎖削除では店舗の行がすでにないので、fridgesと結合して対象外にする
+CREATE OR REPLACE FUNCTION store_summary_apply_items(fridge_ids INT[], levels INT[], expiry_dates DATE[], deltas INT[])
+RETURNS VOID AS $$
+    UPDATE store_summary t
+    SET item_count = t.item_count + d.item_count,
+        low_stock_items = t.low_stock_items + d.low_stock_items,
+        out_of_stock_items = t.out_of_stock_items + d.out_of_stock_items,
+        items_version = t.items_version + 1
+    FROM (
+        SELECT fridge_id,
+               SUM(n) AS item_count,
+               COALESCE(SUM(n) FILTER (WHERE quantity_level = 3), 0) AS low_stock_items,
+               COALESCE(SUM(n) FILTER (WHERE quantity_level = 4), 0) AS out_of_stock_items
+        FROM unnest(fridge_ids, levels, deltas) AS d(fridge_id, quantity_level, n)
+        GROUP BY fridge_id
+    ) d
+    WHERE t.fridge_id = d.fridge_id;
+
+    INSERT INTO store_expiry_counts AS t (fridge_id, expiry_date, item_count)
+    SELECT d.fridge_id, d.expiry_date, SUM(d.n)
+    FROM unnest(fridge_ids, expiry_dates, deltas) AS d(fridge_id, expiry_date, n)
+    JOIN fridges f ON f.fridge_id = d.fridge_id
+    WHERE d.expiry_date IS NOT NULL
+    GROUP BY d.fridge_id, d.expiry_date
+    HAVING SUM(d.n) <> 0
+    ON CONFLICT (fridge_id, expiry_date) DO UPDATE SET item_count = t.item_count + EXCLUDED.item_count;
+
+    DELETE FROM store_expiry_counts t
+    USING (SELECT DISTINCT fridge_id, expiry_date FROM unnest(fridge_ids, expiry_dates) AS d(fridge_id, expiry_date)) d
+    WHERE t.fridge_id = d.fridge_id AND t.expiry_date = d.expiry_date AND t.item_count <= 0;
+$$ LANGUAGE sql;
+
+CREATE OR REPLACE FUNCTION store_summary_items_changed()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM store_summary_apply_items(array_agg(fridge_id), array_agg(quantity_level),
+                                          array_agg(expiry_date), array_agg(1))
+        FROM new_rows;
+    ELSIF TG_OP = 'DELETE' THEN
+        PERFORM store_summary_apply_items(array_agg(fridge_id), array_agg(quantity_level),
+                                          array_agg(expiry_date), array_agg(-1))
+        FROM old_rows;
+    ELSE
+        PERFORM store_summary_apply_items(array_agg(fridge_id), array_agg(quantity_level),
+                                          array_agg(expiry_date), array_agg(n))
+        FROM (
+            SELECT fridge_id, quantity_level, expiry_date, 1 AS n FROM new_rows
+            UNION ALL
+            SELECT fridge_id, quantity_level, expiry_date, -1 AS n FROM old_rows
+        ) changes;
+    END IF;
+    RETURN NULL;
+END;
+$$ language 'plpgsql';
+
+-- 遷移テーブルを使うトリガーは操作ごとに分ける必要がある
+CREATE TRIGGER store_summary_items_insert AFTER INSERT ON items
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION store_summary_items_changed();
+CREATE TRIGGER store_summary_items_update AFTER UPDATE ON items
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION store_summary_items_changed();
+CREATE TRIGGER store_summary_items_delete AFTER DELETE ON items
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION store_summary_items_changed();
+
+-- 発注リストの件数とバージョン（チェック状態の更新はバージョンだけ上げる）
+CREATE OR REPLACE FUNCTION store_summary_orders_changed()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        UPDATE store_summary t SET order_count = t.order_count + d.n, orders_version = t.orders_version + 1
+        FROM (SELECT fridge_id, COUNT(*) AS n FROM new_rows GROUP BY fridge_id) d
+        WHERE t.fridge_id = d.fridge_id;
+    ELSIF TG_OP = 'DELETE' THEN
+        UPDATE store_summary t SET order_count = t.order_count - d.n, orders_version = t.orders_version + 1
+        FROM (SELECT fridge_id, COUNT(*) AS n FROM old_rows GROUP BY fridge_id) d
+        WHERE t.fridge_id = d.fridge_id;
+    ELSE
+        UPDATE store_summary t SET orders_version = t.orders_version + 1
+        WHERE t.fridge_id IN (SELECT fridge_id FROM new_rows);
+    END IF;
+    RETURN NULL;
+END;
+$$ language 'plpgsql';
+
+CREATE TRIGGER store_summary_orders_insert AFTER INSERT ON shopping_list
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION store_summary_orders_changed();
+CREATE TRIGGER store_summary_orders_delete AFTER DELETE ON shopping_list
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION store_summary_orders_changed();
+CREATE TRIGGER store_summary_orders_update AFTER UPDATE ON shopping_list
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION store_summary_orders_changed();
+
+-- 削除した行を差分同期用に記録する（店舗削除の連鎖削除では記録しない）
+CREATE OR REPLACE FUNCTION sync_tombstones_record()
+RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO sync_tombstones (fridge_id, kind, row_id)
+    SELECT o.fridge_id, TG_ARGV[0], o.id
+    FROM old_rows o
+    JOIN fridges f ON f.fridge_id = o.fridge_id;
+    RETURN NULL;
+END;
+$$ language 'plpgsql';
+
+CREATE TRIGGER sync_tombstones_items_delete AFTER DELETE ON items
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION sync_tombstones_record('item');
+CREATE TRIGGER sync_tombstones_orders_delete AFTER DELETE ON shopping_list
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION sync_tombstones_record('order');
+
 -- =============================================
 -- 初期データ
 -- =============================================
@@ -0,0 +1,12 @@
+-- =============================================
+-- 001: カテゴリキャッシュ用のバージョンカウンタ (MySQL)
+-- =============================================
+-- 作成日: 2026-10-18
+-- カテゴリの追加・削除・名前変更のたびにアプリが加算する。
+-- 各ワーカーはこの値が変わった時だけカテゴリ一覧を読み直す。
+-- =============================================
+
+ALTER TABLE fridges
+    ADD COLUMN category_version INT NOT NULL DEFAULT 0
+    COMMENT 'カテゴリ変更のたびに加算（カテゴリキャッシュの整合性確認用）'
+    AFTER owner_user_id;
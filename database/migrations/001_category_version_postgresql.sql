@@ -0,0 +1,11 @@
+-- =============================================
+-- 001: カテゴリキャッシュ用のバージョンカウンタ (PostgreSQL/Supabase)
+-- =============================================
+-- 作成日: 2026-10-18
+-- カテゴリの追加・削除・名前変更のたびにアプリが加算する。
+-- 各ワーカーはこの値が変わった時だけカテゴリ一覧を読み直す。
+-- =============================================
+
+ALTER TABLE fridges ADD COLUMN IF NOT EXISTS category_version INT NOT NULL DEFAULT 0;
+
+COMMENT ON COLUMN fridges.category_version IS 'カテゴリ変更のたびに加算（カテゴリキャッシュの整合性確認用）';
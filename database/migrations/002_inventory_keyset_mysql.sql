@@ -0,0 +1,14 @@
+-- =============================================
+-- 002: 在庫一覧のキーセットページング用の列とインデックス (MySQL)
+-- =============================================
+-- 作成日: 2026-10-18
+-- expiry_sort: 賞味期限（未設定は9999-12-31）。期限順の並びがこの列の昇順と一致する。
+-- 在庫一覧の ORDER BY と同じ並びの複合インデックスでシークする。
+-- =============================================
+
+ALTER TABLE items
+    ADD COLUMN expiry_sort DATE AS (COALESCE(expiry_date, '9999-12-31')) STORED
+    COMMENT '並び替え用の賞味期限（未設定は9999-12-31）'
+    AFTER expiry_date,
+    ADD INDEX idx_page_expiry (fridge_id, category_id, expiry_sort, id),
+    ADD INDEX idx_page_quantity (fridge_id, category_id, quantity_level DESC, expiry_sort, id);
@@ -0,0 +1,15 @@
+-- =============================================
+-- 002: 在庫一覧のキーセットページング用の列とインデックス (PostgreSQL/Supabase)
+-- =============================================
+-- 作成日: 2026-10-18
+-- expiry_sort: 賞味期限（未設定は9999-12-31）。期限順の並びがこの列の昇順と一致する。
+-- 在庫一覧の ORDER BY と同じ並びの複合インデックスでシークする。
+-- =============================================
+
+ALTER TABLE items ADD COLUMN IF NOT EXISTS expiry_sort DATE
+    GENERATED ALWAYS AS (COALESCE(expiry_date, DATE '9999-12-31')) STORED;
+
+COMMENT ON COLUMN items.expiry_sort IS '並び替え用の賞味期限（未設定は9999-12-31）';
+
+CREATE INDEX IF NOT EXISTS idx_items_page_expiry ON items(fridge_id, category_id, expiry_sort, id);
+CREATE INDEX IF NOT EXISTS idx_items_page_quantity ON items(fridge_id, category_id, quantity_level DESC, expiry_sort, id);
@@ -0,0 +1,25 @@
+-- =============================================
+-- 003: 実際のクエリの形に合わせた複合インデックス (MySQL)
+-- =============================================
+-- 作成日: 2026-10-18
+-- InnoDBのセカンダリインデックスは末尾に主キーを含むため、
+-- categories.idx_fridge / items.idx_fridge はそのまま (fridge_id, id) として使える。
+-- MySQLには部分インデックスがないので shopping_list は通常の複合インデックスにする。
+-- どのクエリも使っていない idx_expiry / idx_quantity は更新コストだけなので削除する。
+-- 適用後は scripts/explain_check.py で全クエリの実行計画を確認する。
+-- =============================================
+
+ALTER TABLE items
+    DROP INDEX idx_expiry,
+    DROP INDEX idx_quantity;
+
+-- 外部キー用のインデックス（idx_fridge）は、先頭列が同じ複合インデックスを追加してから削除する
+ALTER TABLE shopping_list
+    ADD INDEX idx_fridge_created (fridge_id, created_at),
+    ADD INDEX idx_fridge_item (fridge_id, item_id),
+    ADD INDEX idx_fridge_checked (fridge_id, is_checked);
+
+ALTER TABLE shopping_list
+    DROP INDEX idx_fridge;
+
+ANALYZE TABLE categories, items, shopping_list;
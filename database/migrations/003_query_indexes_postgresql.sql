@@ -0,0 +1,32 @@
+-- =============================================
+-- 003: 実際のクエリの形に合わせた複合・部分インデックス (PostgreSQL/Supabase)
+-- =============================================
+-- 作成日: 2026-10-18
+-- 単一列のインデックスを、WHERE + ORDER BY をまとめて満たす複合インデックスに置き換える。
+-- どのクエリも使っていない idx_items_expiry / idx_items_quantity は更新コストだけなので削除する。
+-- 適用後は scripts/explain_check.py で全クエリの実行計画を確認する。
+-- =============================================
+
+-- categories: WHERE fridge_id = ? ORDER BY id / MIN(id)
+CREATE INDEX IF NOT EXISTS idx_categories_fridge_id ON categories(fridge_id, id);
+DROP INDEX IF EXISTS idx_categories_fridge;
+
+-- items: 店舗単位の一括取得・書き出し（WHERE fridge_id = ? ORDER BY id）
+-- 在庫一覧は 002 の idx_items_page_expiry / idx_items_page_quantity を使う
+CREATE INDEX IF NOT EXISTS idx_items_fridge_id ON items(fridge_id, id);
+DROP INDEX IF EXISTS idx_items_fridge;
+DROP INDEX IF EXISTS idx_items_expiry;
+DROP INDEX IF EXISTS idx_items_quantity;
+
+-- shopping_list
+-- 発注リスト画面: WHERE fridge_id = ? ORDER BY created_at
+CREATE INDEX IF NOT EXISTS idx_shopping_fridge_created ON shopping_list(fridge_id, created_at, id);
+-- 在庫一覧の追加済み判定: EXISTS (... WHERE fridge_id = ? AND item_id = ?)
+CREATE INDEX IF NOT EXISTS idx_shopping_fridge_item ON shopping_list(fridge_id, item_id) WHERE item_id IS NOT NULL;
+-- 発注完了: DELETE ... WHERE fridge_id = ? AND is_checked = TRUE
+CREATE INDEX IF NOT EXISTS idx_shopping_fridge_checked ON shopping_list(fridge_id) WHERE is_checked;
+DROP INDEX IF EXISTS idx_shopping_fridge;
+
+ANALYZE categories;
+ANALYZE items;
+ANALYZE shopping_list;
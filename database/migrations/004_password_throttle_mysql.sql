@@ -0,0 +1,15 @@
+-- =============================================
+-- 004: 店舗パスワードの試行回数制限 (MySQL)
+-- =============================================
+-- 作成日: 2026-10-18
+-- 連続して間違えた回数と、ロックが解除される時刻を店舗ごとに持つ。
+-- ワーカープロセスをまたいで制限するためDBに置く。
+-- =============================================
+
+ALTER TABLE fridges
+    ADD COLUMN failed_password_attempts INT NOT NULL DEFAULT 0
+    COMMENT 'パスワードを連続で間違えた回数（成功で0に戻す）'
+    AFTER category_version,
+    ADD COLUMN password_locked_until DATETIME NULL
+    COMMENT 'この時刻までパスワード入力を受け付けない'
+    AFTER failed_password_attempts;
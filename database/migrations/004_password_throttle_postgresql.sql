@@ -0,0 +1,13 @@
+-- =============================================
+-- 004: 店舗パスワードの試行回数制限 (PostgreSQL/Supabase)
+-- =============================================
+-- 作成日: 2026-10-18
+-- 連続して間違えた回数と、ロックが解除される時刻を店舗ごとに持つ。
+-- ワーカープロセスをまたいで制限するためDBに置く。
+-- =============================================
+
+ALTER TABLE fridges ADD COLUMN IF NOT EXISTS failed_password_attempts INT NOT NULL DEFAULT 0;
+ALTER TABLE fridges ADD COLUMN IF NOT EXISTS password_locked_until TIMESTAMP NULL;
+
+COMMENT ON COLUMN fridges.failed_password_attempts IS 'パスワードを連続で間違えた回数（成功で0に戻す）';
+COMMENT ON COLUMN fridges.password_locked_until IS 'この時刻までパスワード入力を受け付けない';
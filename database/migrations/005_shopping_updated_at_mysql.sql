@@ -0,0 +1,13 @@
+-- =============================================
+-- 005: 発注リストの更新日時 (MySQL)
+-- =============================================
+-- 作成日: 2026-10-18
+-- 変更通知（Server-Sent Events）で、チェック状態の変更を
+-- updated_at のポーリングで拾うために追加する。
+-- =============================================
+
+ALTER TABLE shopping_list
+    ADD COLUMN updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+    AFTER created_at;
+
+UPDATE shopping_list SET updated_at = created_at WHERE created_at IS NOT NULL;
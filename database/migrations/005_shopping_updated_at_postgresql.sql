@@ -0,0 +1,14 @@
+-- =============================================
+-- 005: 発注リストの更新日時 (PostgreSQL/Supabase)
+-- =============================================
+-- 作成日: 2026-10-18
+-- 変更通知（Server-Sent Events）でMySQLが更新を拾うために追加した列。
+-- PostgreSQLはLISTEN/NOTIFYで通知するが、スキーマは両方で揃えておく。
+-- =============================================
+
+ALTER TABLE shopping_list ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP;
+UPDATE shopping_list SET updated_at = created_at WHERE created_at IS NOT NULL;
+
+DROP TRIGGER IF EXISTS update_shopping_list_updated_at ON shopping_list;
+CREATE TRIGGER update_shopping_list_updated_at BEFORE UPDATE ON shopping_list
+    FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
@@ -0,0 +1,22 @@
+-- =============================================
+-- 006: 発注リストの在庫の重複防止 (MySQL)
+-- =============================================
+-- 作成日: 2026-10-18
+-- 同じ在庫（item_id）を同じ店舗の発注リストに二重に入れないよう一意にする。
+-- 自動発注（reorder.py）の INSERT ... SELECT ... WHERE NOT EXISTS と
+-- 同時に実行された追加が重なっても、ここで重複を防ぐ。
+-- UNIQUEはNULLを重複とみなさないので、手動登録（item_id が NULL）は何件でも入る。
+-- =============================================
+
+-- 既存の重複は古い方（idが小さい方）を残して削除する
+DELETE a FROM shopping_list a
+JOIN shopping_list b
+  ON a.fridge_id = b.fridge_id
+ AND a.item_id = b.item_id
+ AND a.id > b.id;
+
+ALTER TABLE shopping_list
+    ADD UNIQUE KEY uq_fridge_item (fridge_id, item_id);
+
+ALTER TABLE shopping_list
+    DROP INDEX idx_fridge_item;
@@ -0,0 +1,22 @@
+-- =============================================
+-- 006: 発注リストの在庫の重複防止 (PostgreSQL/Supabase)
+-- =============================================
+-- 作成日: 2026-10-18
+-- 同じ在庫（item_id）を同じ店舗の発注リストに二重に入れないよう一意にする。
+-- 自動発注（reorder.py）の INSERT ... SELECT ... WHERE NOT EXISTS と
+-- 同時に実行された追加が重なっても、ここで重複を防ぐ。
+-- 手動登録（item_id が NULL）は対象外。
+-- =============================================
+
+-- 既存の重複は古い方（idが小さい方）を残して削除する
+DELETE FROM shopping_list a
+USING shopping_list b
+WHERE a.fridge_id = b.fridge_id
+  AND a.item_id = b.item_id
+  AND a.id > b.id;
+
+-- 在庫一覧の「発注リストに追加済みか」の判定にもそのまま使える
+CREATE UNIQUE INDEX IF NOT EXISTS uq_shopping_fridge_item
+    ON shopping_list(fridge_id, item_id) WHERE item_id IS NOT NULL;
+
+DROP INDEX IF EXISTS idx_shopping_fridge_item;
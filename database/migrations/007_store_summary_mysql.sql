@@ -0,0 +1,153 @@
+-- =============================================
+-- 007: 店舗ごとの集計テーブル (MySQL)
+-- =============================================
+-- 作成日: 2026-10-18
+-- 店舗選択画面に、在庫を読まずに店舗ごとの件数を出すための集計。
+--   store_summary       : 在庫数・残量「少ない」「なし」の件数・発注リストの件数
+--   store_expiry_counts : 賞味期限の日付ごとの在庫数（期限切れ・7日以内は表示時に日付で合計する）
+-- items / shopping_list の変更はトリガーで差分だけ反映する（MySQLは行単位のトリガーのみ）。
+-- 注意: MySQLでは外部キーの連鎖削除（ON DELETE CASCADE）でトリガーが動かない。
+--   店舗削除では集計テーブルも連鎖削除されるので問題なく、
+--   カテゴリ削除ではアプリが先に在庫を DELETE するので集計に反映される。
+-- mysqlクライアントで実行する（DELIMITER を使うため）。
+-- =============================================
+
+CREATE TABLE IF NOT EXISTS store_summary (
+    fridge_id INT PRIMARY KEY,
+    item_count INT NOT NULL DEFAULT 0 COMMENT '在庫数',
+    low_stock_items INT NOT NULL DEFAULT 0 COMMENT '残量レベル3（少ない）の在庫数',
+    out_of_stock_items INT NOT NULL DEFAULT 0 COMMENT '残量レベル4（なし）の在庫数',
+    order_count INT NOT NULL DEFAULT 0 COMMENT '発注リストの件数',
+    FOREIGN KEY (fridge_id) REFERENCES fridges(fridge_id) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci COMMENT='店舗ごとの集計（トリガーで更新）';
+
+CREATE TABLE IF NOT EXISTS store_expiry_counts (
+    fridge_id INT NOT NULL,
+    expiry_date DATE NOT NULL,
+    item_count INT NOT NULL,
+    PRIMARY KEY (fridge_id, expiry_date),
+    FOREIGN KEY (fridge_id) REFERENCES fridges(fridge_id) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci COMMENT='店舗・賞味期限の日付ごとの在庫数（0件の行は削除）';
+
+-- 既存データから作り直す
+DELETE FROM store_summary;
+DELETE FROM store_expiry_counts;
+
+INSERT INTO store_summary (fridge_id, item_count, low_stock_items, out_of_stock_items, order_count)
+SELECT f.fridge_id,
+       COALESCE(i.item_count, 0), COALESCE(i.low_stock_items, 0), COALESCE(i.out_of_stock_items, 0),
+       COALESCE(s.order_count, 0)
+FROM fridges f
+LEFT JOIN (
+    SELECT fridge_id,
+           COUNT(*) AS item_count,
+           SUM(quantity_level = 3) AS low_stock_items,
+           SUM(quantity_level = 4) AS out_of_stock_items
+    FROM items GROUP BY fridge_id
+) i ON i.fridge_id = f.fridge_id
+LEFT JOIN (
+    SELECT fridge_id, COUNT(*) AS order_count FROM shopping_list GROUP BY fridge_id
+) s ON s.fridge_id = f.fridge_id;
+
+INSERT INTO store_expiry_counts (fridge_id, expiry_date, item_count)
+SELECT fridge_id, expiry_date, COUNT(*)
+FROM items
+WHERE expiry_date IS NOT NULL
+GROUP BY fridge_id, expiry_date;
+
+-- =============================================
+-- トリガー
+-- =============================================
+
+DROP TRIGGER IF EXISTS store_summary_fridge_insert;
+DROP TRIGGER IF EXISTS store_summary_items_insert;
+DROP TRIGGER IF EXISTS store_summary_items_update;
+DROP TRIGGER IF EXISTS store_summary_items_delete;
+DROP TRIGGER IF EXISTS store_summary_orders_insert;
+DROP TRIGGER IF EXISTS store_summary_orders_delete;
+
+DELIMITER //
+
+-- 店舗作成時に集計行を作る
+CREATE TRIGGER store_summary_fridge_insert AFTER INSERT ON fridges
+FOR EACH ROW
+BEGIN
+    INSERT IGNORE INTO store_summary (fridge_id) VALUES (NEW.fridge_id);
+END//
+
+CREATE TRIGGER store_summary_items_insert AFTER INSERT ON items
+FOR EACH ROW
+BEGIN
+    UPDATE store_summary
+    SET item_count = item_count + 1,
+        low_stock_items = low_stock_items + (NEW.quantity_level = 3),
+        out_of_stock_items = out_of_stock_items + (NEW.quantity_level = 4)
+    WHERE fridge_id = NEW.fridge_id;
+    IF NEW.expiry_date IS NOT NULL THEN
+        INSERT INTO store_expiry_counts (fridge_id, expiry_date, item_count)
+        VALUES (NEW.fridge_id, NEW.expiry_date, 1)
+        ON DUPLICATE KEY UPDATE item_count = item_count + 1;
+    END IF;
+END//
+
+-- 残量・賞味期限・店舗が変わったときだけ反映する（メモや商品名の編集では何もしない）
+CREATE TRIGGER store_summary_items_update AFTER UPDATE ON items
+FOR EACH ROW
+BEGIN
+    IF NOT (OLD.fridge_id <=> NEW.fridge_id AND OLD.quantity_level <=> NEW.quantity_level) THEN
+        UPDATE store_summary
+        SET item_count = item_count - 1,
+            low_stock_items = low_stock_items - (OLD.quantity_level = 3),
+            out_of_stock_items = out_of_stock_items - (OLD.quantity_level = 4)
+        WHERE fridge_id = OLD.fridge_id;
+        UPDATE store_summary
+        SET item_count = item_count + 1,
+            low_stock_items = low_stock_items + (NEW.quantity_level = 3),
+            out_of_stock_items = out_of_stock_items + (NEW.quantity_level = 4)
+        WHERE fridge_id = NEW.fridge_id;
+    END IF;
+    IF NOT (OLD.fridge_id <=> NEW.fridge_id AND OLD.expiry_date <=> NEW.expiry_date) THEN
+        IF OLD.expiry_date IS NOT NULL THEN
+            UPDATE store_expiry_counts SET item_count = item_count - 1
+            WHERE fridge_id = OLD.fridge_id AND expiry_date = OLD.expiry_date;
+            DELETE FROM store_expiry_counts
+            WHERE fridge_id = OLD.fridge_id AND expiry_date = OLD.expiry_date AND item_count <= 0;
+        END IF;
+        IF NEW.expiry_date IS NOT NULL THEN
+            INSERT INTO store_expiry_counts (fridge_id, expiry_date, item_count)
+            VALUES (NEW.fridge_id, NEW.expiry_date, 1)
+            ON DUPLICATE KEY UPDATE item_count = item_count + 1;
+        END IF;
+    END IF;
+END//
+
+CREATE TRIGGER store_summary_items_delete AFTER DELETE ON items
+FOR EACH ROW
+BEGIN
+    UPDATE store_summary
+    SET item_count = item_count - 1,
+        low_stock_items = low_stock_items - (OLD.quantity_level = 3),
+        out_of_stock_items = out_of_stock_items - (OLD.quantity_level = 4)
+    WHERE fridge_id = OLD.fridge_id;
+    IF OLD.expiry_date IS NOT NULL THEN
+        UPDATE store_expiry_counts SET item_count = item_count - 1
+        WHERE fridge_id = OLD.fridge_id AND expiry_date = OLD.expiry_date;
+        DELETE FROM store_expiry_counts
+        WHERE fridge_id = OLD.fridge_id AND expiry_date = OLD.expiry_date AND item_count <= 0;
+    END IF;
+END//
+
+-- 発注リストの件数（チェック状態の更新では変わらないので、追加と削除だけ）
+CREATE TRIGGER store_summary_orders_insert AFTER INSERT ON shopping_list
+FOR EACH ROW
+BEGIN
+    UPDATE store_summary SET order_count = order_count + 1 WHERE fridge_id = NEW.fridge_id;
+END//
+
+CREATE TRIGGER store_summary_orders_delete AFTER DELETE ON shopping_list
+FOR EACH ROW
+BEGIN
+    UPDATE store_summary SET order_count = order_count - 1 WHERE fridge_id = OLD.fridge_id;
+END//
+
+DELIMITER ;
@@ -0,0 +1,175 @@
+-- =============================================
+-- 007: 店舗ごとの集計テーブル (PostgreSQL/Supabase)
+-- =============================================
+-- 作成日: 2026-10-18
+-- 店舗選択画面に、在庫を読まずに店舗ごとの件数を出すための集計。
+--   store_summary       : 在庫数・残量「少ない」「なし」の件数・発注リストの件数
+--   store_expiry_counts : 賞味期限の日付ごとの在庫数（期限切れ・7日以内は表示時に日付で合計する）
+-- items / shopping_list の変更はトリガーで差分だけ反映する。
+-- CSV一括登録などの大量INSERTでも1文につき1回で済むよう、文単位のトリガー（遷移テーブル）にする。
+-- =============================================
+
+CREATE TABLE IF NOT EXISTS store_summary (
+    fridge_id INT PRIMARY KEY,
+    item_count INT NOT NULL DEFAULT 0,
+    low_stock_items INT NOT NULL DEFAULT 0,
+    out_of_stock_items INT NOT NULL DEFAULT 0,
+    order_count INT NOT NULL DEFAULT 0,
+    FOREIGN KEY (fridge_id) REFERENCES fridges(fridge_id) ON DELETE CASCADE
+);
+
+COMMENT ON TABLE store_summary IS '店舗ごとの集計（トリガーで更新）';
+COMMENT ON COLUMN store_summary.low_stock_items IS '残量レベル3（少ない）の在庫数';
+COMMENT ON COLUMN store_summary.out_of_stock_items IS '残量レベル4（なし）の在庫数';
+COMMENT ON COLUMN store_summary.order_count IS '発注リストの件数';
+
+CREATE TABLE IF NOT EXISTS store_expiry_counts (
+    fridge_id INT NOT NULL,
+    expiry_date DATE NOT NULL,
+    item_count INT NOT NULL,
+    PRIMARY KEY (fridge_id, expiry_date),
+    FOREIGN KEY (fridge_id) REFERENCES fridges(fridge_id) ON DELETE CASCADE
+);
+
+COMMENT ON TABLE store_expiry_counts IS '店舗・賞味期限の日付ごとの在庫数（トリガーで更新、0件の行は削除）';
+
+-- 既存データから作り直す
+DELETE FROM store_summary;
+DELETE FROM store_expiry_counts;
+
+INSERT INTO store_summary (fridge_id, item_count, low_stock_items, out_of_stock_items, order_count)
+SELECT f.fridge_id,
+       COALESCE(i.item_count, 0), COALESCE(i.low_stock_items, 0), COALESCE(i.out_of_stock_items, 0),
+       COALESCE(s.order_count, 0)
+FROM fridges f
+LEFT JOIN (
+    SELECT fridge_id,
+           COUNT(*) AS item_count,
+           COUNT(*) FILTER (WHERE quantity_level = 3) AS low_stock_items,
+           COUNT(*) FILTER (WHERE quantity_level = 4) AS out_of_stock_items
+    FROM items GROUP BY fridge_id
+) i ON i.fridge_id = f.fridge_id
+LEFT JOIN (
+    SELECT fridge_id, COUNT(*) AS order_count FROM shopping_list GROUP BY fridge_id
+) s ON s.fridge_id = f.fridge_id;
+
+INSERT INTO store_expiry_counts (fridge_id, expiry_date, item_count)
+SELECT fridge_id, expiry_date, COUNT(*)
+FROM items
+WHERE expiry_date IS NOT NULL
+GROUP BY fridge_id, expiry_date;
+
+-- =============================================
+-- トリガー
+-- =============================================
+
+-- 店舗作成時に集計行を作る
+CREATE OR REPLACE FUNCTION store_summary_fridge_inserted()
+RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO store_summary (fridge_id) VALUES (NEW.fridge_id) ON CONFLICT DO NOTHING;
+    RETURN NULL;
+END;
+$$ language 'plpgsql';
+
+DROP TRIGGER IF EXISTS store_summary_fridge_insert ON fridges;
+CREATE TRIGGER store_summary_fridge_insert AFTER INSERT ON fridges
+    FOR EACH ROW EXECUTE FUNCTION store_summary_fridge_inserted();
+
+-- 在庫の差分（+1: 追加・更新後、-1: 削除・更新前）を集計に反映する
+-- 更新で件数が変わらない行は打ち消し合うので、残量・期限が変わらなければ何も書き込まない。
+-- 店舗削除の連鎖削除では店舗の行がすでにないので、fridgesと結合して対象外にする
+CREATE OR REPLACE FUNCTION store_summary_apply_items(fridge_ids INT[], levels INT[], expiry_dates DATE[], deltas INT[])
+RETURNS VOID AS $$
+    UPDATE store_summary t
+    SET item_count = t.item_count + d.item_count,
+        low_stock_items = t.low_stock_items + d.low_stock_items,
+        out_of_stock_items = t.out_of_stock_items + d.out_of_stock_items
+    FROM (
+        SELECT fridge_id,
+               SUM(n) AS item_count,
+               COALESCE(SUM(n) FILTER (WHERE quantity_level = 3), 0) AS low_stock_items,
+               COALESCE(SUM(n) FILTER (WHERE quantity_level = 4), 0) AS out_of_stock_items
+        FROM unnest(fridge_ids, levels, deltas) AS d(fridge_id, quantity_level, n)
+        GROUP BY fridge_id
+    ) d
+    WHERE t.fridge_id = d.fridge_id
+      AND (d.item_count <> 0 OR d.low_stock_items <> 0 OR d.out_of_stock_items <> 0);
+
+    INSERT INTO store_expiry_counts AS t (fridge_id, expiry_date, item_count)
+    SELECT d.fridge_id, d.expiry_date, SUM(d.n)
+    FROM unnest(fridge_ids, expiry_dates, deltas) AS d(fridge_id, expiry_date, n)
+    JOIN fridges f ON f.fridge_id = d.fridge_id
+    WHERE d.expiry_date IS NOT NULL
+    GROUP BY d.fridge_id, d.expiry_date
+    HAVING SUM(d.n) <> 0
+    ON CONFLICT (fridge_id, expiry_date) DO UPDATE SET item_count = t.item_count + EXCLUDED.item_count;
+
+    DELETE FROM store_expiry_counts t
+    USING (SELECT DISTINCT fridge_id, expiry_date FROM unnest(fridge_ids, expiry_dates) AS d(fridge_id, expiry_date)) d
+    WHERE t.fridge_id = d.fridge_id AND t.expiry_date = d.expiry_date AND t.item_count <= 0;
+$$ LANGUAGE sql;
+
+CREATE OR REPLACE FUNCTION store_summary_items_changed()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM store_summary_apply_items(array_agg(fridge_id), array_agg(quantity_level),
+                                          array_agg(expiry_date), array_agg(1))
+        FROM new_rows;
+    ELSIF TG_OP = 'DELETE' THEN
+        PERFORM store_summary_apply_items(array_agg(fridge_id), array_agg(quantity_level),
+                                          array_agg(expiry_date), array_agg(-1))
+        FROM old_rows;
+    ELSE
+        PERFORM store_summary_apply_items(array_agg(fridge_id), array_agg(quantity_level),
+                                          array_agg(expiry_date), array_agg(n))
+        FROM (
+            SELECT fridge_id, quantity_level, expiry_date, 1 AS n FROM new_rows
+            UNION ALL
+            SELECT fridge_id, quantity_level, expiry_date, -1 AS n FROM old_rows
+        ) changes;
+    END IF;
+    RETURN NULL;
+END;
+$$ language 'plpgsql';
+
+-- 遷移テーブルを使うトリガーは操作ごとに分ける必要がある
+DROP TRIGGER IF EXISTS store_summary_items_insert ON items;
+DROP TRIGGER IF EXISTS store_summary_items_update ON items;
+DROP TRIGGER IF EXISTS store_summary_items_delete ON items;
+CREATE TRIGGER store_summary_items_insert AFTER INSERT ON items
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION store_summary_items_changed();
+CREATE TRIGGER store_summary_items_update AFTER UPDATE ON items
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION store_summary_items_changed();
+CREATE TRIGGER store_summary_items_delete AFTER DELETE ON items
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION store_summary_items_changed();
+
+-- 発注リストの件数（チェック状態の更新では変わらないので、追加と削除だけ）
+CREATE OR REPLACE FUNCTION store_summary_orders_changed()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        UPDATE store_summary t SET order_count = t.order_count + d.n
+        FROM (SELECT fridge_id, COUNT(*) AS n FROM new_rows GROUP BY fridge_id) d
+        WHERE t.fridge_id = d.fridge_id;
+    ELSE
+        UPDATE store_summary t SET order_count = t.order_count - d.n
+        FROM (SELECT fridge_id, COUNT(*) AS n FROM old_rows GROUP BY fridge_id) d
+        WHERE t.fridge_id = d.fridge_id;
+    END IF;
+    RETURN NULL;
+END;
+$$ language 'plpgsql';
+
+DROP TRIGGER IF EXISTS store_summary_orders_insert ON shopping_list;
+DROP TRIGGER IF EXISTS store_summary_orders_delete ON shopping_list;
+CREATE TRIGGER store_summary_orders_insert AFTER INSERT ON shopping_list
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION store_summary_orders_changed();
+CREATE TRIGGER store_summary_orders_delete AFTER DELETE ON shopping_list
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION store_summary_orders_changed();
@@ -0,0 +1,18 @@
+-- =============================================
+-- 008: 在庫・発注リストの部分一致検索用インデックス (MySQL)
+-- =============================================
+-- 作成日: 2026-10-18
+-- 検索API（/api/store/<id>/search）用に、ngramパーサーのFULLTEXTインデックスを追加する。
+-- 日本語は単語の区切りがないため、ngram（既定の ngram_token_size=2、2文字単位）で分割し、
+-- 検索語をフレーズ検索（MATCH ... AGAINST ('"語"' IN BOOLEAN MODE)）して部分一致にする。
+-- 1文字の語は ngram で引けないので、店舗の在庫を idx_fridge で読んで LIKE で絞り込む。
+-- FULLTEXTインデックスの追加はテーブルを作り直すため、在庫が多い場合は時間帯に注意する。
+-- =============================================
+
+ALTER TABLE items
+    ADD FULLTEXT INDEX ft_name_memo (name, memo) WITH PARSER ngram;
+
+ALTER TABLE shopping_list
+    ADD FULLTEXT INDEX ft_item_name (item_name) WITH PARSER ngram;
+
+ANALYZE TABLE items, shopping_list;
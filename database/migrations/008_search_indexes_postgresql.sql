@@ -0,0 +1,22 @@
+-- =============================================
+-- 008: 在庫・発注リストの部分一致検索用インデックス (PostgreSQL/Supabase)
+-- =============================================
+-- 作成日: 2026-10-18
+-- 検索API（/api/store/<id>/search）の ILIKE '%語%' を pg_trgm のGINインデックスで引く。
+-- 日本語もそのまま3文字単位（トライグラム）に分割される（DBのLC_CTYPEが C.UTF-8 / ja_JP.UTF-8 など
+-- UTF-8のロケールであること）。2文字以下の語はトライグラムが取れないため、
+-- 店舗の在庫を idx_items_fridge_id で読んで絞り込む。
+-- Supabaseでは pg_trgm は extensions スキーマに入る（search_path に含まれているのでそのまま使える）。
+-- =============================================
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+-- items: WHERE fridge_id = ? AND (name ILIKE ? OR memo ILIKE ?)
+CREATE INDEX IF NOT EXISTS idx_items_name_trgm ON items USING gin (name gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_items_memo_trgm ON items USING gin (memo gin_trgm_ops);
+
+-- shopping_list: WHERE fridge_id = ? AND item_name ILIKE ?
+CREATE INDEX IF NOT EXISTS idx_shopping_item_name_trgm ON shopping_list USING gin (item_name gin_trgm_ops);
+
+ANALYZE items;
+ANALYZE shopping_list;
@@ -0,0 +1,118 @@
+-- =============================================
+-- 009: 店舗ごとの変更バージョン (MySQL)
+-- =============================================
+-- 作成日: 2026-10-18
+-- 在庫一覧・発注リスト画面のETag（条件付きGETで304を返す）に使う。
+--   items_version  : 店舗の在庫を変更するたびに増える（MySQLは行単位のトリガーなので1行ごと）
+--   orders_version : 店舗の発注リストを変更するたびに増える
+-- 007 の集計トリガーを作り直し、件数と一緒に更新する。
+-- mysqlクライアントで実行する（DELIMITER を使うため）。
+-- =============================================
+
+ALTER TABLE store_summary
+    ADD COLUMN items_version BIGINT NOT NULL DEFAULT 0 COMMENT '在庫を変更するたびに加算（画面のETag用）',
+    ADD COLUMN orders_version BIGINT NOT NULL DEFAULT 0 COMMENT '発注リストを変更するたびに加算（画面のETag用）';
+
+DROP TRIGGER IF EXISTS store_summary_items_insert;
+DROP TRIGGER IF EXISTS store_summary_items_update;
+DROP TRIGGER IF EXISTS store_summary_items_delete;
+DROP TRIGGER IF EXISTS store_summary_orders_insert;
+DROP TRIGGER IF EXISTS store_summary_orders_update;
+DROP TRIGGER IF EXISTS store_summary_orders_delete;
+
+DELIMITER //
+
+CREATE TRIGGER store_summary_items_insert AFTER INSERT ON items
+FOR EACH ROW
+BEGIN
+    UPDATE store_summary
+    SET item_count = item_count + 1,
+        low_stock_items = low_stock_items + (NEW.quantity_level = 3),
+        out_of_stock_items = out_of_stock_items + (NEW.quantity_level = 4),
+        items_version = items_version + 1
+    WHERE fridge_id = NEW.fridge_id;
+    IF NEW.expiry_date IS NOT NULL THEN
+        INSERT INTO store_expiry_counts (fridge_id, expiry_date, item_count)
+        VALUES (NEW.fridge_id, NEW.expiry_date, 1)
+        ON DUPLICATE KEY UPDATE item_count = item_count + 1;
+    END IF;
+END//
+
+-- 件数が変わらない更新（メモの編集など）でもバージョンは上げる
+CREATE TRIGGER store_summary_items_update AFTER UPDATE ON items
+FOR EACH ROW
+BEGIN
+    IF OLD.fridge_id <=> NEW.fridge_id THEN
+        UPDATE store_summary
+        SET low_stock_items = low_stock_items - (OLD.quantity_level = 3) + (NEW.quantity_level = 3),
+            out_of_stock_items = out_of_stock_items - (OLD.quantity_level = 4) + (NEW.quantity_level = 4),
+            items_version = items_version + 1
+        WHERE fridge_id = NEW.fridge_id;
+    ELSE
+        UPDATE store_summary
+        SET item_count = item_count - 1,
+            low_stock_items = low_stock_items - (OLD.quantity_level = 3),
+            out_of_stock_items = out_of_stock_items - (OLD.quantity_level = 4),
+            items_version = items_version + 1
+        WHERE fridge_id = OLD.fridge_id;
+        UPDATE store_summary
+        SET item_count = item_count + 1,
+            low_stock_items = low_stock_items + (NEW.quantity_level = 3),
+            out_of_stock_items = out_of_stock_items + (NEW.quantity_level = 4),
+            items_version = items_version + 1
+        WHERE fridge_id = NEW.fridge_id;
+    END IF;
+    IF NOT (OLD.fridge_id <=> NEW.fridge_id AND OLD.expiry_date <=> NEW.expiry_date) THEN
+        IF OLD.expiry_date IS NOT NULL THEN
+            UPDATE store_expiry_counts SET item_count = item_count - 1
+            WHERE fridge_id = OLD.fridge_id AND expiry_date = OLD.expiry_date;
+            DELETE FROM store_expiry_counts
+            WHERE fridge_id = OLD.fridge_id AND expiry_date = OLD.expiry_date AND item_count <= 0;
+        END IF;
+        IF NEW.expiry_date IS NOT NULL THEN
+            INSERT INTO store_expiry_counts (fridge_id, expiry_date, item_count)
+            VALUES (NEW.fridge_id, NEW.expiry_date, 1)
+            ON DUPLICATE KEY UPDATE item_count = item_count + 1;
+        END IF;
+    END IF;
+END//
+
+CREATE TRIGGER store_summary_items_delete AFTER DELETE ON items
+FOR EACH ROW
+BEGIN
+    UPDATE store_summary
+    SET item_count = item_count - 1,
+        low_stock_items = low_stock_items - (OLD.quantity_level = 3),
+        out_of_stock_items = out_of_stock_items - (OLD.quantity_level = 4),
+        items_version = items_version + 1
+    WHERE fridge_id = OLD.fridge_id;
+    IF OLD.expiry_date IS NOT NULL THEN
+        UPDATE store_expiry_counts SET item_count = item_count - 1
+        WHERE fridge_id = OLD.fridge_id AND expiry_date = OLD.expiry_date;
+        DELETE FROM store_expiry_counts
+        WHERE fridge_id = OLD.fridge_id AND expiry_date = OLD.expiry_date AND item_count <= 0;
+    END IF;
+END//
+
+-- 発注リストの件数とバージョン（チェック状態の更新はバージョンだけ上げる）
+CREATE TRIGGER store_summary_orders_insert AFTER INSERT ON shopping_list
+FOR EACH ROW
+BEGIN
+    UPDATE store_summary SET order_count = order_count + 1, orders_version = orders_version + 1
+    WHERE fridge_id = NEW.fridge_id;
+END//
+
+CREATE TRIGGER store_summary_orders_update AFTER UPDATE ON shopping_list
+FOR EACH ROW
+BEGIN
+    UPDATE store_summary SET orders_version = orders_version + 1 WHERE fridge_id = NEW.fridge_id;
+END//
+
+CREATE TRIGGER store_summary_orders_delete AFTER DELETE ON shopping_list
+FOR EACH ROW
+BEGIN
+    UPDATE store_summary SET order_count = order_count - 1, orders_version = orders_version + 1
+    WHERE fridge_id = OLD.fridge_id;
+END//
+
+DELIMITER ;
@@ -0,0 +1,73 @@
+-- =============================================
+-- 009: 店舗ごとの変更バージョン (PostgreSQL/Supabase)
+-- =============================================
+-- 作成日: 2026-10-18
+-- 在庫一覧・発注リスト画面のETag（条件付きGETで304を返す）に使う。
+--   items_version  : 店舗の在庫を変更する文ごとに1つ増える
+--   orders_version : 店舗の発注リストを変更する文ごとに1つ増える
+-- 007 の集計トリガーで一緒に更新するので、画面は在庫を読まずに変更の有無が分かる。
+-- =============================================
+
+ALTER TABLE store_summary
+    ADD COLUMN IF NOT EXISTS items_version BIGINT NOT NULL DEFAULT 0,
+    ADD COLUMN IF NOT EXISTS orders_version BIGINT NOT NULL DEFAULT 0;
+
+COMMENT ON COLUMN store_summary.items_version IS '在庫を変更するたびに加算（画面のETag用）';
+COMMENT ON COLUMN store_summary.orders_version IS '発注リストを変更するたびに加算（画面のETag用）';
+
+-- 件数が変わらない更新（メモの編集など）でもバージョンは上げる
+CREATE OR REPLACE FUNCTION store_summary_apply_items(fridge_ids INT[], levels INT[], expiry_dates DATE[], deltas INT[])
+RETURNS VOID AS $$
+    UPDATE store_summary t
+    SET item_count = t.item_count + d.item_count,
+        low_stock_items = t.low_stock_items + d.low_stock_items,
+        out_of_stock_items = t.out_of_stock_items + d.out_of_stock_items,
+        items_version = t.items_version + 1
+    FROM (
+        SELECT fridge_id,
+               SUM(n) AS item_count,
+               COALESCE(SUM(n) FILTER (WHERE quantity_level = 3), 0) AS low_stock_items,
+               COALESCE(SUM(n) FILTER (WHERE quantity_level = 4), 0) AS out_of_stock_items
+        FROM unnest(fridge_ids, levels, deltas) AS d(fridge_id, quantity_level, n)
+        GROUP BY fridge_id
+    ) d
+    WHERE t.fridge_id = d.fridge_id;
+
+    INSERT INTO store_expiry_counts AS t (fridge_id, expiry_date, item_count)
+    SELECT d.fridge_id, d.expiry_date, SUM(d.n)
+    FROM unnest(fridge_ids, expiry_dates, deltas) AS d(fridge_id, expiry_date, n)
+    JOIN fridges f ON f.fridge_id = d.fridge_id
+    WHERE d.expiry_date IS NOT NULL
+    GROUP BY d.fridge_id, d.expiry_date
+    HAVING SUM(d.n) <> 0
+    ON CONFLICT (fridge_id, expiry_date) DO UPDATE SET item_count = t.item_count + EXCLUDED.item_count;
+
+    DELETE FROM store_expiry_counts t
+    USING (SELECT DISTINCT fridge_id, expiry_date FROM unnest(fridge_ids, expiry_dates) AS d(fridge_id, expiry_date)) d
+    WHERE t.fridge_id = d.fridge_id AND t.expiry_date = d.expiry_date AND t.item_count <= 0;
+$$ LANGUAGE sql;
+
+-- 発注リストの件数とバージョン（チェック状態の更新はバージョンだけ上げる）
+CREATE OR REPLACE FUNCTION store_summary_orders_changed()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        UPDATE store_summary t SET order_count = t.order_count + d.n, orders_version = t.orders_version + 1
+        FROM (SELECT fridge_id, COUNT(*) AS n FROM new_rows GROUP BY fridge_id) d
+        WHERE t.fridge_id = d.fridge_id;
+    ELSIF TG_OP = 'DELETE' THEN
+        UPDATE store_summary t SET order_count = t.order_count - d.n, orders_version = t.orders_version + 1
+        FROM (SELECT fridge_id, COUNT(*) AS n FROM old_rows GROUP BY fridge_id) d
+        WHERE t.fridge_id = d.fridge_id;
+    ELSE
+        UPDATE store_summary t SET orders_version = t.orders_version + 1
+        WHERE t.fridge_id IN (SELECT fridge_id FROM new_rows);
+    END IF;
+    RETURN NULL;
+END;
+$$ language 'plpgsql';
+
+DROP TRIGGER IF EXISTS store_summary_orders_update ON shopping_list;
+CREATE TRIGGER store_summary_orders_update AFTER UPDATE ON shopping_list
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION store_summary_orders_changed();
@@ -0,0 +1,55 @@
+-- =============================================
+-- 010: オフライン同期（差分取得） (MySQL)
+-- =============================================
+-- 作成日: 2026-10-18
+-- 端末に持たせた在庫・発注リストの写しを、前回の同期以降の差分だけで更新するための変更。
+--   items / shopping_list の updated_at : 変更された行を引く（店舗・更新日時のインデックスを追加）
+--   sync_tombstones : 削除した行のID（削除は行が残らないので、トリガーで記録する）
+--   items.client_id : オフライン中に追加した在庫の端末側のID（再送で二重に登録しないため）
+-- 古い削除記録は scripts/prune_sync_tombstones.py で消す。
+-- 注意: MySQLでは外部キーの連鎖削除でトリガーが動かないが、
+--   店舗削除では削除記録も連鎖削除され、カテゴリ削除ではアプリが先に在庫を DELETE するので問題ない。
+-- mysqlクライアントで実行する（DELIMITER を使うため）。
+-- =============================================
+
+CREATE TABLE IF NOT EXISTS sync_tombstones (
+    id BIGINT AUTO_INCREMENT PRIMARY KEY,
+    fridge_id INT NOT NULL,
+    kind VARCHAR(10) NOT NULL COMMENT '''item''（在庫） / ''order''（発注リスト）',
+    row_id INT NOT NULL COMMENT '削除した行のID',
+    deleted_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_fridge_deleted (fridge_id, deleted_at),
+    INDEX idx_deleted (deleted_at),
+    FOREIGN KEY (fridge_id) REFERENCES fridges(fridge_id) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci COMMENT='削除した在庫・発注のID（差分同期用、トリガーで記録）';
+
+ALTER TABLE items
+    ADD COLUMN client_id VARCHAR(36) NULL COMMENT 'オフライン中に端末で採番したID（再送時の重複登録防止）',
+    ADD UNIQUE INDEX uq_fridge_client (fridge_id, client_id),
+    ADD INDEX idx_fridge_updated (fridge_id, updated_at);
+
+ALTER TABLE shopping_list
+    ADD INDEX idx_fridge_updated (fridge_id, updated_at);
+
+-- =============================================
+-- トリガー
+-- =============================================
+
+DROP TRIGGER IF EXISTS sync_tombstones_items_delete;
+DROP TRIGGER IF EXISTS sync_tombstones_orders_delete;
+
+DELIMITER //
+
+CREATE TRIGGER sync_tombstones_items_delete AFTER DELETE ON items
+FOR EACH ROW
+BEGIN
+    INSERT INTO sync_tombstones (fridge_id, kind, row_id) VALUES (OLD.fridge_id, 'item', OLD.id);
+END//
+
+CREATE TRIGGER sync_tombstones_orders_delete AFTER DELETE ON shopping_list
+FOR EACH ROW
+BEGIN
+    INSERT INTO sync_tombstones (fridge_id, kind, row_id) VALUES (OLD.fridge_id, 'order', OLD.id);
+END//
+
+DELIMITER ;
@@ -0,0 +1,61 @@
+-- =============================================
+-- 010: オフライン同期（差分取得） (PostgreSQL/Supabase)
+-- =============================================
+-- 作成日: 2026-10-18
+-- 端末に持たせた在庫・発注リストの写しを、前回の同期以降の差分だけで更新するための変更。
+--   items / shopping_list の updated_at : 変更された行を引く（店舗・更新日時のインデックスを追加）
+--   sync_tombstones : 削除した行のID（削除は行が残らないので、トリガーで記録する）
+--   items.client_id : オフライン中に追加した在庫の端末側のID（再送で二重に登録しないため）
+-- 古い削除記録は scripts/prune_sync_tombstones.py で消す。
+-- =============================================
+
+CREATE TABLE IF NOT EXISTS sync_tombstones (
+    id BIGSERIAL PRIMARY KEY,
+    fridge_id INT NOT NULL,
+    kind VARCHAR(10) NOT NULL,
+    row_id INT NOT NULL,
+    deleted_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (fridge_id) REFERENCES fridges(fridge_id) ON DELETE CASCADE
+);
+
+CREATE INDEX IF NOT EXISTS idx_sync_tombstones_fridge ON sync_tombstones(fridge_id, deleted_at);
+-- 保持期間を過ぎた記録の削除用
+CREATE INDEX IF NOT EXISTS idx_sync_tombstones_deleted ON sync_tombstones(deleted_at);
+
+COMMENT ON TABLE sync_tombstones IS '削除した在庫・発注のID（差分同期用、トリガーで記録）';
+COMMENT ON COLUMN sync_tombstones.kind IS '''item''（在庫） / ''order''（発注リスト）';
+COMMENT ON COLUMN sync_tombstones.row_id IS '削除した行のID';
+
+ALTER TABLE items ADD COLUMN IF NOT EXISTS client_id VARCHAR(36) NULL;
+COMMENT ON COLUMN items.client_id IS 'オフライン中に端末で採番したID（再送時の重複登録防止）';
+CREATE UNIQUE INDEX IF NOT EXISTS uq_items_fridge_client ON items(fridge_id, client_id) WHERE client_id IS NOT NULL;
+
+-- 差分同期（店舗の updated_at 以降の行）用
+CREATE INDEX IF NOT EXISTS idx_items_fridge_updated ON items(fridge_id, updated_at);
+CREATE INDEX IF NOT EXISTS idx_shopping_fridge_updated ON shopping_list(fridge_id, updated_at);
+
+-- =============================================
+-- トリガー
+-- =============================================
+
+-- 削除した行を記録する（1文につき1回、遷移テーブルから）
+-- 店舗削除の連鎖削除では店舗の行がすでにないので、fridgesと結合して対象外にする
+CREATE OR REPLACE FUNCTION sync_tombstones_record()
+RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO sync_tombstones (fridge_id, kind, row_id)
+    SELECT o.fridge_id, TG_ARGV[0], o.id
+    FROM old_rows o
+    JOIN fridges f ON f.fridge_id = o.fridge_id;
+    RETURN NULL;
+END;
+$$ language 'plpgsql';
+
+DROP TRIGGER IF EXISTS sync_tombstones_items_delete ON items;
+DROP TRIGGER IF EXISTS sync_tombstones_orders_delete ON shopping_list;
+CREATE TRIGGER sync_tombstones_items_delete AFTER DELETE ON items
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION sync_tombstones_record('item');
+CREATE TRIGGER sync_tombstones_orders_delete AFTER DELETE ON shopping_list
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION sync_tombstones_record('order');
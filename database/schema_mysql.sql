@@ -7,6 +7,9 @@
 -- =============================================
 
 -- 既存のテーブルを削除(開発時のリセット用)
+DROP TABLE IF EXISTS sync_tombstones;
+DROP TABLE IF EXISTS store_expiry_counts;
+DROP TABLE IF EXISTS store_summary;
 DROP TABLE IF EXISTS items;
 DROP TABLE IF EXISTS shopping_list;
 DROP TABLE IF EXISTS categories;
@@ -23,6 +26,9 @@ CREATE TABLE fridges (
     fridge_icon VARCHAR(10) DEFAULT '🏪' COMMENT '絵文字アイコン',
     password_hash VARCHAR(255) NOT NULL COMMENT '4桁パスワードのハッシュ',
     owner_user_id INT NULL COMMENT '作成者ID（Phase2実装予定）',
+    category_version INT NOT NULL DEFAULT 0 COMMENT 'カテゴリ変更のたびに加算（カテゴリキャッシュの整合性確認用）',
+    failed_password_attempts INT NOT NULL DEFAULT 0 COMMENT 'パスワードを連続で間違えた回数（成功で0に戻す）',
+    password_locked_until DATETIME NULL COMMENT 'この時刻までパスワード入力を受け付けない',
     created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
     INDEX idx_owner (owner_user_id)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
@@ -73,13 +79,18 @@ CREATE TABLE items (
     quantity_level INT NOT NULL DEFAULT 1 COMMENT '残量レベル',
     opened_date DATE NULL COMMENT '開封日',
     expiry_date DATE NULL COMMENT '賞味期限',
+    expiry_sort DATE AS (COALESCE(expiry_date, '9999-12-31')) STORED COMMENT '並び替え用の賞味期限（未設定は9999-12-31）',
     memo TEXT NULL COMMENT 'メモ（発注先、ロット番号など）',
     created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
     updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    client_id VARCHAR(36) NULL COMMENT 'オフライン中に端末で採番したID（再送時の重複登録防止）',
     INDEX idx_fridge (fridge_id),
     INDEX idx_category (category_id),
-    INDEX idx_expiry (expiry_date),
-    INDEX idx_quantity (quantity_level),
+    INDEX idx_fridge_updated (fridge_id, updated_at),
+    UNIQUE KEY uq_fridge_client (fridge_id, client_id),
+    INDEX idx_page_expiry (fridge_id, category_id, expiry_sort, id),
+    INDEX idx_page_quantity (fridge_id, category_id, quantity_level DESC, expiry_sort, id),
+    FULLTEXT INDEX ft_name_memo (name, memo) WITH PARSER ngram,
     FOREIGN KEY (fridge_id) REFERENCES fridges(fridge_id) ON DELETE CASCADE,
     FOREIGN KEY (category_id) REFERENCES categories(id) ON DELETE CASCADE
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
@@ -95,12 +106,177 @@ CREATE TABLE shopping_list (
     memo TEXT NULL COMMENT 'メモ（発注先、納期など）',
     is_checked BOOLEAN DEFAULT FALSE COMMENT '発注済みフラグ',
     created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-    INDEX idx_fridge (fridge_id),
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    INDEX idx_fridge_created (fridge_id, created_at),
+    INDEX idx_fridge_updated (fridge_id, updated_at),
+    UNIQUE KEY uq_fridge_item (fridge_id, item_id),
+    INDEX idx_fridge_checked (fridge_id, is_checked),
     INDEX idx_item (item_id),
+    FULLTEXT INDEX ft_item_name (item_name) WITH PARSER ngram,
     FOREIGN KEY (fridge_id) REFERENCES fridges(fridge_id) ON DELETE CASCADE,
     FOREIGN KEY (item_id) REFERENCES items(id) ON DELETE SET NULL
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
 
+-- =============================================
+-- 7. store_summaryテーブル(店舗ごとの集計)
+-- =============================================
+CREATE TABLE store_summary (
+    fridge_id INT PRIMARY KEY,
+    item_count INT NOT NULL DEFAULT 0 COMMENT '在庫数',
+    low_stock_items INT NOT NULL DEFAULT 0 COMMENT '残量レベル3（少ない）の在庫数',
+    out_of_stock_items INT NOT NULL DEFAULT 0 COMMENT '残量レベル4（なし）の在庫数',
+    order_count INT NOT NULL DEFAULT 0 COMMENT '発注リストの件数',
+    items_version BIGINT NOT NULL DEFAULT 0 COMMENT '在庫を変更するたびに加算（画面のETag用）',
+    orders_version BIGINT NOT NULL DEFAULT 0 COMMENT '発注リストを変更するたびに加算（画面のETag用）',
+    FOREIGN KEY (fridge_id) REFERENCES fridges(fridge_id) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci COMMENT='店舗ごとの集計（トリガーで更新）';
+
+-- =============================================
+-- 8. store_expiry_countsテーブル(賞味期限の日付ごとの在庫数)
+-- =============================================
+CREATE TABLE store_expiry_counts (
+    fridge_id INT NOT NULL,
+    expiry_date DATE NOT NULL,
+    item_count INT NOT NULL,
+    PRIMARY KEY (fridge_id, expiry_date),
+    FOREIGN KEY (fridge_id) REFERENCES fridges(fridge_id) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci COMMENT='店舗・賞味期限の日付ごとの在庫数（0件の行は削除）';
+
+-- =============================================
+-- 9. sync_tombstonesテーブル(削除した在庫・発注のID)
+-- =============================================
+CREATE TABLE sync_tombstones (
+    id BIGINT AUTO_INCREMENT PRIMARY KEY,
+    fridge_id INT NOT NULL,
+    kind VARCHAR(10) NOT NULL COMMENT '''item''（在庫） / ''order''（発注リスト）',
+    row_id INT NOT NULL COMMENT '削除した行のID',
+    deleted_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_fridge_deleted (fridge_id, deleted_at),
+    INDEX idx_deleted (deleted_at),
+    FOREIGN KEY (fridge_id) REFERENCES fridges(fridge_id) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci COMMENT='削除した在庫・発注のID（差分同期用、トリガーで記録）';
+
+-- =============================================
+-- 集計テーブルを更新するトリガー
+-- =============================================
+-- 注意: 外部キーの連鎖削除ではトリガーが動かない（カテゴリ削除ではアプリが先に在庫を削除する）
+DELIMITER //
+
+-- 店舗作成時に集計行を作る
+CREATE TRIGGER store_summary_fridge_insert AFTER INSERT ON fridges
+FOR EACH ROW
+BEGIN
+    INSERT IGNORE INTO store_summary (fridge_id) VALUES (NEW.fridge_id);
+END//
+
+CREATE TRIGGER store_summary_items_insert AFTER INSERT ON items
+FOR EACH ROW
+BEGIN
+    UPDATE store_summary
+    SET item_count = item_count + 1,
+        low_stock_items = low_stock_items + (NEW.quantity_level = 3),
+        out_of_stock_items = out_of_stock_items + (NEW.quantity_level = 4),
+        items_version = items_version + 1
+    WHERE fridge_id = NEW.fridge_id;
+    IF NEW.expiry_date IS NOT NULL THEN
+        INSERT INTO store_expiry_counts (fridge_id, expiry_date, item_count)
+        VALUES (NEW.fridge_id, NEW.expiry_date, 1)
+        ON DUPLICATE KEY UPDATE item_count = item_count + 1;
+    END IF;
+END//
+
+-- 件数が変わらない更新（メモの編集など）でもバージョンは上げる
+CREATE TRIGGER store_summary_items_update AFTER UPDATE ON items
+FOR EACH ROW
+BEGIN
+    IF OLD.fridge_id <=> NEW.fridge_id THEN
+        UPDATE store_summary
+        SET low_stock_items = low_stock_items - (OLD.quantity_level = 3) + (NEW.quantity_level = 3),
+            out_of_stock_items = out_of_stock_items - (OLD.quantity_level = 4) + (NEW.quantity_level = 4),
+            items_version = items_version + 1
+        WHERE fridge_id = NEW.fridge_id;
+    ELSE
+        UPDATE store_summary
+        SET item_count = item_count - 1,
+            low_stock_items = low_stock_items - (OLD.quantity_level = 3),
+            out_of_stock_items = out_of_stock_items - (OLD.quantity_level = 4),
+            items_version = items_version + 1
+        WHERE fridge_id = OLD.fridge_id;
+        UPDATE store_summary
+        SET item_count = item_count + 1,
+            low_stock_items = low_stock_items + (NEW.quantity_level = 3),
+            out_of_stock_items = out_of_stock_items + (NEW.quantity_level = 4),
+            items_version = items_version + 1
+        WHERE fridge_id = NEW.fridge_id;
+    END IF;
+    IF NOT (OLD.fridge_id <=> NEW.fridge_id AND OLD.expiry_date <=> NEW.expiry_date) THEN
+        IF OLD.expiry_date IS NOT NULL THEN
+            UPDATE store_expiry_counts SET item_count = item_count - 1
+            WHERE fridge_id = OLD.fridge_id AND expiry_date = OLD.expiry_date;
+            DELETE FROM store_expiry_counts
+            WHERE fridge_id = OLD.fridge_id AND expiry_date = OLD.expiry_date AND item_count <= 0;
+        END IF;
+        IF NEW.expiry_date IS NOT NULL THEN
+            INSERT INTO store_expiry_counts (fridge_id, expiry_date, item_count)
+            VALUES (NEW.fridge_id, NEW.expiry_date, 1)
+            ON DUPLICATE KEY UPDATE item_count = item_count + 1;
+        END IF;
+    END IF;
+END//
+
+CREATE TRIGGER store_summary_items_delete AFTER DELETE ON items
+FOR EACH ROW
+BEGIN
+    UPDATE store_summary
+    SET item_count = item_count - 1,
+        low_stock_items = low_stock_items - (OLD.quantity_level = 3),
+        out_of_stock_items = out_of_stock_items - (OLD.quantity_level = 4),
+        items_version = items_version + 1
+    WHERE fridge_id = OLD.fridge_id;
+    IF OLD.expiry_date IS NOT NULL THEN
+        UPDATE store_expiry_counts SET item_count = item_count - 1
+        WHERE fridge_id = OLD.fridge_id AND expiry_date = OLD.expiry_date;
+        DELETE FROM store_expiry_counts
+        WHERE fridge_id = OLD.fridge_id AND expiry_date = OLD.expiry_date AND item_count <= 0;
+    END IF;
+END//
+
+-- 発注リストの件数とバージョン（チェック状態の更新はバージョンだけ上げる）
+CREATE TRIGGER store_summary_orders_insert AFTER INSERT ON shopping_list
+FOR EACH ROW
+BEGIN
+    UPDATE store_summary SET order_count = order_count + 1, orders_version = orders_version + 1
+    WHERE fridge_id = NEW.fridge_id;
+END//
+
+CREATE TRIGGER store_summary_orders_update AFTER UPDATE ON shopping_list
+FOR EACH ROW
+BEGIN
+    UPDATE store_summary SET orders_version = orders_version + 1 WHERE fridge_id = NEW.fridge_id;
+END//
+
+CREATE TRIGGER store_summary_orders_delete AFTER DELETE ON shopping_list
+FOR EACH ROW
+BEGIN
+    UPDATE store_summary SET order_count = order_count - 1, orders_version = orders_version + 1
+    WHERE fridge_id = OLD.fridge_id;
+END//
+
+-- 削除した行を差分同期用に記録する
+CREATE TRIGGER sync_tombstones_items_delete AFTER DELETE ON items
+FOR EACH ROW
+BEGIN
+    INSERT INTO sync_tombstones (fridge_id, kind, row_id) VALUES (OLD.fridge_id, 'item', OLD.id);
+END//
+
+CREATE TRIGGER sync_tombstones_orders_delete AFTER DELETE ON shopping_list
+FOR EACH ROW
+BEGIN
+    INSERT INTO sync_tombstones (fridge_id, kind, row_id) VALUES (OLD.fridge_id, 'order', OLD.id);
+END//
+
+DELIMITER ;
+
 -- =============================================
 -- 初期データ
 -- =============================================
@@ -0,0 +1,562 @@
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from flask import copy_current_request_context, g, request, session
+
+from config import (
+    get_db_config,
+    get_replica_configs,
+    USE_PRODUCTION,
+    DB_POOL_MIN_SIZE,
+    DB_POOL_MAX_SIZE,
+    DB_POOL_TIMEOUT,
+    DB_POOL_MAX_LIFETIME,
+    DB_POOL_HEALTH_CHECK_INTERVAL,
+    DB_REPLICA_PIN_SECONDS,
+    DB_REPLICA_RETRY_SECONDS,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class PoolTimeoutError(Exception):
+    """プールから接続を取得できなかった"""
+
+
+# =============================================
+# 物理接続の作成・確認（バックエンド別）
+# =============================================
+# ドライバは使う方だけを最初の接続時にimportする（起動を速くするため）
+
+def _connect_postgres(config=None):
+    import psycopg2
+    conn = psycopg2.connect(config or get_db_config())
+    # セッション初期化は物理接続ごとに1回だけ行う
+    cur = conn.cursor()
+    cur.execute("SET timezone = 'Asia/Tokyo'")
+    cur.close()
+    conn.commit()
+    return conn
+
+
+def _connect_mysql(config=None):
+    import mysql.connector
+    conn = mysql.connector.connect(**(config or get_db_config()))
+    cur = conn.cursor()
+    cur.execute("SET time_zone = '+09:00'")
+    cur.close()
+    conn.commit()
+    return conn
+
+
+def connect():
+    """プールを通さない物理接続を作る（バックグラウンド処理用）"""
+    if USE_PRODUCTION:
+        return _connect_postgres()
+    return _connect_mysql()
+
+
+def _ping_postgres(conn):
+    import psycopg2
+    if conn.closed:
+        return False
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT 1")
+        cur.close()
+        conn.rollback()
+        return True
+    except psycopg2.Error:
+        return False
+
+
+def _ping_mysql(conn):
+    import mysql.connector
+    try:
+        conn.ping(reconnect=False)
+        return True
+    except mysql.connector.Error:
+        return False
+
+
+# =============================================
+# コネクションプール
+# =============================================
+
+class ConnectionPool:
+    """スレッドセーフな簡易コネクションプール
+
+    - 物理接続ごとに作成時刻・最終利用時刻を記録し、max_lifetimeを超えたら作り直す
+    - health_check_interval以上アイドルだった接続は貸し出し前にpingする
+    - 返却時は未完了のトランザクションをロールバックする
+    """
+
+    def __init__(self, connect, ping, min_size=1, max_size=4, timeout=10.0,
+                 max_lifetime=1800.0, health_check_interval=30.0):
+        self._connect = connect
+        self._ping = ping
+        self.min_size = min_size
+        self.max_size = max(max_size, 1)
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.health_check_interval = health_check_interval
+
+        self._cond = threading.Condition()
+        self._idle = []        # [(conn, created_at, last_used)]
+        self._in_use = {}      # id(conn) -> created_at
+        self._size = 0
+        self._stats = {
+            'connections_created': 0,
+            'connections_closed': 0,
+            'acquired': 0,
+            'released': 0,
+            'waits': 0,
+            'timeouts': 0,
+            'health_check_failures': 0,
+            'expired': 0,
+            'acquire_wait_seconds_total': 0.0,
+        }
+
+        for _ in range(min_size):
+            try:
+                self._idle.append(self._new_connection())
+            except Exception:
+                # 起動時に繋がらなくても最初の利用時に再試行する
+                break
+
+    def _new_connection(self):
+        conn = self._connect()
+        now = time.monotonic()
+        with self._cond:
+            self._size += 1
+            self._stats['connections_created'] += 1
+        return (conn, now, now)
+
+    def _close(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+        with self._cond:
+            self._size -= 1
+            self._stats['connections_closed'] += 1
+            self._cond.notify()
+
+    def acquire(self, blocking=True):
+        """接続を借りる（blocking=Falseなら、空きがなく増やせもしないときは待たずにNone）"""
+        start = time.monotonic()
+        deadline = start + self.timeout
+        while True:
+            entry = None
+            with self._cond:
+                if not blocking and not self._idle and self._size >= self.max_size:
+                    return None
+                while not self._idle and self._size >= self.max_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats['timeouts'] += 1
+                        raise PoolTimeoutError(
+                            f'{self.timeout}秒以内にDB接続を取得できませんでした'
+                        )
+                    self._stats['waits'] += 1
+                    self._cond.wait(remaining)
+                if self._idle:
+                    entry = self._idle.pop()
+                else:
+                    # 枠を先に確保してからロック外で接続する
+                    self._size += 1
+
+            if entry is None:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+                now = time.monotonic()
+                created_at = now
+                with self._cond:
+                    self._stats['connections_created'] += 1
+            else:
+                conn, created_at, last_used = entry
+                now = time.monotonic()
+                if now - created_at > self.max_lifetime:
+                    with self._cond:
+                        self._stats['expired'] += 1
+                    self._close(conn)
+                    continue
+                if now - last_used > self.health_check_interval and not self._ping(conn):
+                    with self._cond:
+                        self._stats['health_check_failures'] += 1
+                    self._close(conn)
+                    continue
+
+            with self._cond:
+                self._in_use[id(conn)] = created_at
+                self._stats['acquired'] += 1
+                self._stats['acquire_wait_seconds_total'] += time.monotonic() - start
+            return conn
+
+    def release(self, conn, discard=False):
+        with self._cond:
+            created_at = self._in_use.pop(id(conn), None)
+            self._stats['released'] += 1
+        if created_at is None:
+            # このプールの接続ではない
+            conn.close()
+            return
+
+        if not discard:
+            try:
+                conn.rollback()
+            except Exception:
+                discard = True
+
+        if discard or time.monotonic() - created_at > self.max_lifetime:
+            if not discard:
+                with self._cond:
+                    self._stats['expired'] += 1
+            self._close(conn)
+            return
+
+        with self._cond:
+            self._idle.append((conn, created_at, time.monotonic()))
+            self._cond.notify()
+
+    def close_all(self):
+        with self._cond:
+            idle, self._idle = self._idle, []
+        for conn, _, _ in idle:
+            self._close(conn)
+
+    def stats(self):
+        with self._cond:
+            stats = dict(self._stats)
+            stats.update({
+                'backend': 'postgresql' if USE_PRODUCTION else 'mysql',
+                'pid': os.getpid(),
+                'size': self._size,
+                'idle': len(self._idle),
+                'in_use': len(self._in_use),
+                'min_size': self.min_size,
+                'max_size': self.max_size,
+            })
+        return stats
+
+
+# gunicornのfork後に親プロセスの接続を共有しないよう、PIDごとにプールを持つ
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def _new_pool(config=None, min_size=DB_POOL_MIN_SIZE):
+    if USE_PRODUCTION:
+        connect, ping = _connect_postgres, _ping_postgres
+    else:
+        connect, ping = _connect_mysql, _ping_mysql
+    return ConnectionPool(
+        partial(connect, config),
+        ping,
+        min_size=min_size,
+        max_size=DB_POOL_MAX_SIZE,
+        timeout=DB_POOL_TIMEOUT,
+        max_lifetime=DB_POOL_MAX_LIFETIME,
+        health_check_interval=DB_POOL_HEALTH_CHECK_INTERVAL,
+    )
+
+
+def get_pool():
+    """プライマリのプール（書き込み・バックグラウンド処理・レプリカが使えないときの読み取り）"""
+    global _pool, _pool_pid
+    pid = os.getpid()
+    if _pool is None or _pool_pid != pid:
+        with _pool_lock:
+            if _pool is None or _pool_pid != pid:
+                _pool = _new_pool()
+                _pool_pid = pid
+    return _pool
+
+
+class ReplicaSet:
+    """読み取り用レプリカのプールを順番に使う（ラウンドロビン）
+
+    接続を取得できなかったレプリカは retry_seconds の間外し、過ぎたら次の順番で再び試す。
+    貸し出し前の疎通確認はレプリカごとのプールが行う（health_check_interval）。
+    """
+
+    def __init__(self, configs, retry_seconds):
+        self.retry_seconds = retry_seconds
+        self._lock = threading.Lock()
+        # 起動時には接続しない（最初の読み取りで作る）
+        self._pools = [_new_pool(config, min_size=0) for config in configs]
+        self._down_until = [0.0] * len(self._pools)
+        self._next = 0
+        self._stats = {'acquired': 0, 'failures': 0, 'fallbacks': 0}
+
+    def __len__(self):
+        return len(self._pools)
+
+    def acquire(self):
+        """(プール, 接続) を返す。使えるレプリカがなければ (None, None)"""
+        with self._lock:
+            start = self._next
+            self._next = (self._next + 1) % len(self._pools)
+        for offset in range(len(self._pools)):
+            index = (start + offset) % len(self._pools)
+            if time.monotonic() < self._down_until[index]:
+                continue
+            pool = self._pools[index]
+            try:
+                conn = pool.acquire()
+            except PoolTimeoutError:
+                # 混んでいるだけなので外さず、次のレプリカ（なければプライマリ）で読む
+                continue
+            except Exception as e:
+                with self._lock:
+                    self._down_until[index] = time.monotonic() + self.retry_seconds
+                    self._stats['failures'] += 1
+                logger.warning('レプリカ%dに接続できないため%d秒間外します: %s', index, self.retry_seconds, e)
+                continue
+            with self._lock:
+                self._stats['acquired'] += 1
+            return pool, conn
+        with self._lock:
+            self._stats['fallbacks'] += 1
+        return None, None
+
+    def stats(self):
+        now = time.monotonic()
+        with self._lock:
+            stats = dict(self._stats)
+            down_until = list(self._down_until)
+        stats['replicas'] = [
+            dict(pool.stats(), available=now >= until)
+            for pool, until in zip(self._pools, down_until)
+        ]
+        return stats
+
+
+_replicas = None
+_replicas_pid = None
+
+
+def get_replicas():
+    """読み取り用レプリカ（DATABASE_REPLICASが未設定ならNone）"""
+    global _replicas, _replicas_pid
+    configs = get_replica_configs()
+    if not configs:
+        return None
+    pid = os.getpid()
+    if _replicas is None or _replicas_pid != pid:
+        with _pool_lock:
+            if _replicas is None or _replicas_pid != pid:
+                _replicas = ReplicaSet(configs, DB_REPLICA_RETRY_SECONDS)
+                _replicas_pid = pid
+    return _replicas
+
+
+# =============================================
+# クエリ実行のフック（計測・EXPLAIN収集用）
+# =============================================
+
+_query_listeners = []
+_acquire_listeners = []
+
+
+def add_query_listener(listener):
+    """クエリ実行ごとに listener(sql, params, seconds) を呼ぶ"""
+    if listener not in _query_listeners:
+        _query_listeners.append(listener)
+
+
+def remove_query_listener(listener):
+    _query_listeners.remove(listener)
+
+
+def add_acquire_listener(listener):
+    """リクエストがプールから接続を取得するたびに listener(seconds) を呼ぶ"""
+    if listener not in _acquire_listeners:
+        _acquire_listeners.append(listener)
+
+
+class TracedCursor:
+    """execute / executemany の前後でリスナーを呼ぶカーソルのラッパー"""
+
+    def __init__(self, cursor):
+        object.__setattr__(self, '_cursor', cursor)
+
+    def _notify(self, query, params, elapsed):
+        for listener in _query_listeners:
+            listener(query, params, elapsed)
+
+    def execute(self, query, params=None):
+        start = time.perf_counter()
+        try:
+            return self._cursor.execute(query, params)
+        finally:
+            self._notify(query, params, time.perf_counter() - start)
+
+    def executemany(self, query, seq_of_params):
+        start = time.perf_counter()
+        try:
+            return self._cursor.executemany(query, seq_of_params)
+        finally:
+            self._notify(query, None, time.perf_counter() - start)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __setattr__(self, name, value):
+        setattr(self._cursor, name, value)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._cursor.close()
+
+
+class TracedConnection:
+    """cursor() がTracedCursorを返す接続のラッパー（それ以外はそのまま委譲）"""
+
+    def __init__(self, conn):
+        self.raw = conn
+
+    def cursor(self, *args, **kwargs):
+        return TracedCursor(self.raw.cursor(*args, **kwargs))
+
+    def __getattr__(self, name):
+        return getattr(self.raw, name)
+
+
+# =============================================
+# リクエスト単位の接続（flask.g）
+# =============================================
+
+# レプリカで読んでよいリクエスト（更新はGET以外で行う）
+_READ_METHODS = ('GET', 'HEAD')
+
+
+def _reads_from_replica():
+    """読み取り専用のリクエストで、直前に更新していないか（更新後はしばらくプライマリで読む）"""
+    return request.method in _READ_METHODS and session.get('db_primary_until', 0) <= time.time()
+
+
+def get_db():
+    """現在のリクエスト用のDB接続を取得（リクエスト内で使い回す）
+
+    レプリカが設定されていれば、読み取り専用のリクエストはレプリカから順番に借りる
+    （すべて使えなければプライマリ）。
+    """
+    if 'db_conn' not in g:
+        start = time.perf_counter()
+        pool = conn = None
+        replicas = get_replicas()
+        if replicas is not None and _reads_from_replica():
+            pool, conn = replicas.acquire()
+        if conn is None:
+            pool = get_pool()
+            conn = pool.acquire()
+        elapsed = time.perf_counter() - start
+        for listener in _acquire_listeners:
+            listener(elapsed)
+        g.db_pool = pool
+        g.db_conn = TracedConnection(conn)
+    return g.db_conn
+
+
+# 同時読み取り用のスレッド。fork後はスレッドが引き継がれないので、PIDごとに作り直す
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor, _executor_pid
+    pid = os.getpid()
+    if _executor is None or _executor_pid != pid:
+        with _executor_lock:
+            if _executor is None or _executor_pid != pid:
+                _executor = ThreadPoolExecutor(max_workers=DB_POOL_MAX_SIZE, thread_name_prefix='db-read')
+                _executor_pid = pid
+    return _executor
+
+
+def fetch_concurrently(*calls):
+    """互いに依存しない読み取りを別々の接続で同時に実行し、結果を calls の順に返す
+
+    calls は接続を受け取る関数。先頭はリクエストの接続でこのスレッドが実行し、残りはプールの
+    空き接続を借りて別スレッドで実行する。空きがなければ待たずにリクエストの接続で順に実行する
+    （プールが混んでいるときに、1リクエストが接続を抱え込んで他を待たせないため）。
+    """
+    conn = get_db()
+    # リクエストの接続と同じ接続先（プライマリかレプリカ）から借りる
+    pool = g.db_pool
+    futures = []
+    for call in calls[1:]:
+        extra = pool.acquire(blocking=False)
+        if extra is None:
+            futures.append(None)
+            continue
+
+        # 計測・スロークエリの記録が画面名を取れるよう、リクエストのコンテキストを引き継ぐ
+        @copy_current_request_context
+        def run(call=call, extra=extra):
+            if not USE_PRODUCTION:
+                return call(TracedConnection(extra))
+            # psycopg2はトランザクションの最初にBEGINを別に送る（1往復）ので、単発の読み取りは
+            # autocommitで送る（トランザクション外なので切り替え自体は通信しない）
+            extra.autocommit = True
+            try:
+                return call(TracedConnection(extra))
+            finally:
+                extra.autocommit = False
+
+        try:
+            future = _get_executor().submit(run)
+        except Exception:
+            pool.release(extra)
+            raise
+        # 返却時のロールバック（1往復）は結果を渡した後に行い、リクエストを待たせない
+        future.add_done_callback(lambda _, extra=extra: pool.release(extra))
+        futures.append(future)
+
+    results = [calls[0](conn)]
+    for call, future in zip(calls[1:], futures):
+        results.append(future.result() if future is not None else call(conn))
+    return results
+
+
+def close_db(exc=None):
+    conn = g.pop('db_conn', None)
+    if conn is not None:
+        g.pop('db_pool').release(conn.raw)
+
+
+def _pin_to_primary(response):
+    """更新したブラウザは、DB_REPLICA_PIN_SECONDS の間の読み取りをプライマリで行う"""
+    if request.method not in _READ_METHODS and get_replica_configs():
+        session['db_primary_until'] = time.time() + DB_REPLICA_PIN_SECONDS
+    return response
+
+
+def dict_cursor(conn, **kwargs):
+    """列名をキーにした辞書で行を返すカーソル"""
+    if USE_PRODUCTION:
+        import psycopg2.extras
+        return conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor, **kwargs)
+    return conn.cursor(dictionary=True, **kwargs)
+
+
+def init_app(app):
+    app.teardown_appcontext(close_db)
+    app.after_request(_pin_to_primary)
@@ -0,0 +1,280 @@
+"""店舗ごとの変更通知（Server-Sent Events）
+
+PostgreSQL: 更新と同じトランザクションで pg_notify し、ワーカープロセスごとに1本の
+専用接続でLISTENするスレッドが、その店舗を購読しているブラウザに配る。
+MySQL: 購読者がいる店舗だけ、一定間隔で updated_at を確認して変更を拾う。
+
+SSEの接続はその間ずっとスレッドを1つ使うので、gunicornは gthread ワーカーで起動する
+（例: gunicorn --worker-class gthread --threads 16 app:app）。
+"""
+import json
+import logging
+import os
+import queue
+import select
+import threading
+import time
+
+from flask import Response
+
+import db
+from config import (
+    USE_PRODUCTION,
+    EVENTS_MAX_CLIENTS,
+    EVENTS_HEARTBEAT_SECONDS,
+    EVENTS_MAX_STREAM_SECONDS,
+    EVENTS_POLL_INTERVAL,
+)
+
+logger = logging.getLogger('fridge.events')
+
+CHANNEL = 'fridge_store_events'
+
+# NOTIFYのペイロードの上限（8000バイト）より少し小さくする
+_MAX_PAYLOAD_BYTES = 7900
+# 購読者ごとに溜めておくイベント数。溢れたら再読み込みを促して切断する
+_QUEUE_SIZE = 256
+# ブラウザが再接続するまでの待ち時間（ミリ秒）
+_RETRY_MS = 3000
+# LISTEN接続が切れたときに再接続するまでの待ち時間（秒）
+_RECONNECT_DELAY = 5
+
+# イベントの種類 -> 対象の画面。ペイロードが大きすぎるときは 'changed' に置き換える
+SCOPES = {
+    'item': 'inventory',
+    'item_removed': 'inventory',
+    'order': 'orders',
+    'orders_removed': 'orders',
+}
+
+
+def changed(scope):
+    """画面に再読み込みを促すイベント（追加など、差分で反映しにくい変更用）"""
+    return 'changed', {'scope': scope}
+
+
+# =============================================
+# 通知（更新処理から呼ぶ）
+# =============================================
+
+def publish(conn, store_id, event, data):
+    """変更を通知する（呼び出し側のcommitで配信される）"""
+    publish_many(conn, store_id, [(event, data)])
+
+
+def publish_many(conn, store_id, messages):
+    """[(event, data), ...] をまとめて通知する（MySQLでは何もしない。ポーリングで拾う）"""
+    if not USE_PRODUCTION or not messages or EVENTS_MAX_CLIENTS <= 0:
+        return
+    payloads = []
+    for event, data in messages:
+        payload = json.dumps({'store_id': store_id, 'event': event, 'data': data},
+                             ensure_ascii=False, default=str)
+        if len(payload.encode('utf-8')) > _MAX_PAYLOAD_BYTES:
+            event, data = changed(SCOPES.get(event))
+            payload = json.dumps({'store_id': store_id, 'event': event, 'data': data})
+        payloads.append(payload)
+    cursor = conn.cursor()
+    cursor.execute("SELECT pg_notify(%s, payload) FROM unnest(%s::text[]) AS payload", (CHANNEL, payloads))
+    cursor.close()
+
+
+# =============================================
+# 配信（ワーカープロセスごとに1つ）
+# =============================================
+
+class Subscription:
+    def __init__(self, store_id):
+        self.store_id = store_id
+        self.queue = queue.Queue(maxsize=_QUEUE_SIZE)
+        self.overflowed = False
+
+
+class EventHub:
+    """店舗ごとの購読者を管理し、LISTEN（PostgreSQL）かポーリング（MySQL）で拾った変更を配る"""
+
+    def __init__(self, poll_changes=None):
+        self._lock = threading.Lock()
+        self._subscribers = {}  # store_id -> set(Subscription)
+        self._count = 0
+        self._poll_changes = poll_changes
+        target = self._listen if USE_PRODUCTION else self._poll
+        self._thread = threading.Thread(target=target, name='store-events', daemon=True)
+        self._thread.start()
+
+    def subscribe(self, store_id):
+        """購読を始める（同時接続数の上限に達していればNone）"""
+        with self._lock:
+            if self._count >= EVENTS_MAX_CLIENTS:
+                return None
+            subscription = Subscription(store_id)
+            self._subscribers.setdefault(store_id, set()).add(subscription)
+            self._count += 1
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscribers.get(subscription.store_id)
+            if subscriptions and subscription in subscriptions:
+                subscriptions.discard(subscription)
+                self._count -= 1
+                if not subscriptions:
+                    del self._subscribers[subscription.store_id]
+
+    def store_ids(self):
+        with self._lock:
+            return list(self._subscribers)
+
+    def stats(self):
+        with self._lock:
+            return {'stores': len(self._subscribers), 'clients': self._count}
+
+    def dispatch(self, store_id, event, data):
+        with self._lock:
+            subscriptions = list(self._subscribers.get(store_id, ()))
+        for subscription in subscriptions:
+            try:
+                subscription.queue.put_nowait((event, data))
+            except queue.Full:
+                subscription.overflowed = True
+
+    def _resync_all(self):
+        # 通知を取りこぼした可能性があるので、全員に再読み込みを促す
+        for store_id in self.store_ids():
+            self.dispatch(store_id, 'resync', {})
+
+    def _listen(self):
+        reconnecting = False
+        while True:
+            conn = None
+            try:
+                conn = db.connect()
+                conn.autocommit = True
+                cursor = conn.cursor()
+                cursor.execute(f'LISTEN {CHANNEL}')
+                if reconnecting:
+                    self._resync_all()
+                while True:
+                    if select.select([conn], [], [], 60) == ([], [], []):
+                        # しばらく通知がなければ、接続が生きているか確認する
+                        cursor.execute('SELECT 1')
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        message = json.loads(conn.notifies.pop(0).payload)
+                        self.dispatch(message['store_id'], message['event'], message['data'])
+            except Exception:
+                logger.exception('LISTEN用の接続でエラーが発生しました。再接続します')
+            finally:
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except Exception:
+                        pass
+            reconnecting = True
+            time.sleep(_RECONNECT_DELAY)
+
+    def _poll(self):
+        conn = None
+        states = {}  # store_id -> poll_changes が返した状態
+        while True:
+            time.sleep(EVENTS_POLL_INTERVAL)
+            store_ids = self.store_ids()
+            for store_id in list(states):
+                if store_id not in store_ids:
+                    del states[store_id]
+            if not store_ids or self._poll_changes is None:
+                continue
+            try:
+                if conn is None:
+                    conn = db.connect()
+                for store_id in store_ids:
+                    states[store_id], messages = self._poll_changes(conn, store_id, states.get(store_id))
+                    # REPEATABLE READではトランザクションを終えないと新しい変更が見えない
+                    conn.rollback()
+                    for event, data in messages:
+                        self.dispatch(store_id, event, data)
+            except Exception:
+                logger.exception('変更の確認でエラーが発生しました')
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except Exception:
+                        pass
+                conn = None
+
+
+# gunicornのfork後はスレッドが引き継がれないので、PIDごとに作り直す
+_hub = None
+_hub_pid = None
+_hub_lock = threading.Lock()
+_poll_changes = None
+
+
+def get_hub():
+    global _hub, _hub_pid
+    pid = os.getpid()
+    if _hub is None or _hub_pid != pid:
+        with _hub_lock:
+            if _hub is None or _hub_pid != pid:
+                _hub = EventHub(_poll_changes)
+                _hub_pid = pid
+    return _hub
+
+
+# =============================================
+# SSEレスポンス
+# =============================================
+
+def _format(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
+
+class _EventStream:
+    """SSEの本文。切断時（close）に必ず購読をやめる"""
+
+    def __init__(self, hub, subscription):
+        self.hub = hub
+        self.subscription = subscription
+
+    def __iter__(self):
+        subscription = self.subscription
+        yield f'retry: {_RETRY_MS}\n' + _format('ready', {})
+        deadline = time.monotonic() + EVENTS_MAX_STREAM_SECONDS
+        while not subscription.overflowed:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                event, data = subscription.queue.get(timeout=min(EVENTS_HEARTBEAT_SECONDS, remaining))
+            except queue.Empty:
+                yield ': ping\n\n'
+                continue
+            yield _format(event, data)
+        # 溢れた場合は取りこぼしがあるので再読み込みを促す。時間切れならブラウザが再接続する
+        yield _format('resync' if subscription.overflowed else 'bye', {})
+
+    def close(self):
+        self.hub.unsubscribe(self.subscription)
+
+
+def stream_response(store_id):
+    """店舗の変更通知のSSEレスポンス（無効なら204、接続数が上限なら503）"""
+    if EVENTS_MAX_CLIENTS <= 0:
+        # 204を返すとEventSourceは再接続しない
+        return Response(status=204)
+    hub = get_hub()
+    subscription = hub.subscribe(store_id)
+    if subscription is None:
+        return Response('接続数が上限に達しています', status=503, mimetype='text/plain')
+    response = Response(_EventStream(hub, subscription), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    # nginxなどのプロキシにバッファさせない
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def init_app(app, poll_changes):
+    """MySQLで変更を拾う関数 poll_changes(conn, store_id, state) -> (state, [(event, data), ...]) を登録する"""
+    global _poll_changes
+    _poll_changes = poll_changes
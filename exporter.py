@@ -0,0 +1,117 @@
+import csv
+import io
+import json
+
+import db
+from config import USE_PRODUCTION, EXPORT_FETCH_SIZE
+
+# 書き出し対象ごとの列とクエリ（fridge_idの条件は後から付ける）
+EXPORTS = {
+    'items': {
+        'columns': ['id', 'fridge_id', 'category_id', 'category_name', 'name', 'quantity_level',
+                    'opened_date', 'expiry_date', 'memo', 'created_at', 'updated_at'],
+        'query': """
+            SELECT i.id, i.fridge_id, i.category_id, c.name AS category_name, i.name,
+                   i.quantity_level, i.opened_date, i.expiry_date, i.memo, i.created_at, i.updated_at
+            FROM items i
+            JOIN categories c ON c.id = i.category_id
+        """,
+        'store_filter': "WHERE i.fridge_id = %s",
+        'order': "ORDER BY i.fridge_id, i.id",
+    },
+    'orders': {
+        'columns': ['id', 'fridge_id', 'item_id', 'item_name', 'memo', 'is_checked', 'created_at'],
+        'query': """
+            SELECT s.id, s.fridge_id, s.item_id, s.item_name, s.memo, s.is_checked, s.created_at
+            FROM shopping_list s
+        """,
+        'store_filter': "WHERE s.fridge_id = %s",
+        'order': "ORDER BY s.fridge_id, s.created_at, s.id",
+    },
+}
+
+
+def _open_cursor(conn, kind):
+    """全件をメモリに載せないカーソルを開く
+
+    PostgreSQL: サーバーサイド（名前付き）カーソル
+    MySQL: バッファしないカーソル
+    """
+    if USE_PRODUCTION:
+        cursor = db.dict_cursor(conn, name=f'export_{kind}')
+        cursor.itersize = EXPORT_FETCH_SIZE
+        return cursor
+    return db.dict_cursor(conn, buffered=False)
+
+
+def _iter_rows(conn, kind, store_id):
+    export = EXPORTS[kind]
+    query = export['query']
+    params = ()
+    if store_id is not None:
+        query += export['store_filter']
+        params = (store_id,)
+    query += ' ' + export['order']
+
+    cursor = _open_cursor(conn, kind)
+    try:
+        cursor.execute(query, params)
+        while True:
+            rows = cursor.fetchmany(EXPORT_FETCH_SIZE)
+            if not rows:
+                break
+            yield rows
+    finally:
+        cursor.close()
+
+
+def _format_value(value):
+    if value is None:
+        return ''
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return value
+
+
+# Excel・スプレッドシートで数式として実行される先頭文字（CSVインジェクション対策）
+_FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+def _csv_value(value):
+    """CSV用の値。数式と解釈される文字で始まる文字列は先頭に ' を付けて文字列として扱わせる"""
+    value = _format_value(value)
+    if isinstance(value, str) and value.startswith(_FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def iter_export(conn, kind, fmt, store_id=None):
+    """書き出しデータをチャンク（bytes）ごとに返すジェネレータ
+
+    fetchmanyで少しずつ読むので、件数が増えてもメモリ使用量は一定。
+    store_idがNoneなら全店舗分。
+    """
+    columns = EXPORTS[kind]['columns']
+
+    if fmt == 'csv':
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        # Excelで文字化けしないようBOMを付ける
+        buf.write('\ufeff')
+        writer.writerow(columns)
+        for rows in _iter_rows(conn, kind, store_id):
+            for row in rows:
+                writer.writerow([_csv_value(row[column]) for column in columns])
+            yield buf.getvalue().encode('utf-8')
+            buf.seek(0)
+            buf.truncate()
+        if buf.tell():
+            yield buf.getvalue().encode('utf-8')
+    else:
+        for rows in _iter_rows(conn, kind, store_id):
+            chunk = ''.join(
+                json.dumps({column: row[column] for column in columns},
+                           ensure_ascii=False, default=_format_value) + '\n'
+                for row in rows
+            )
+            yield chunk.encode('utf-8')
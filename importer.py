@@ -0,0 +1,207 @@
+import csv
+import io
+import time
+from datetime import date, datetime
+
+from config import USE_PRODUCTION, IMPORT_BATCH_SIZE, IMPORT_MAX_REJECTED_DETAILS
+
+# CSVの列名（英語・日本語どちらのヘッダーでも受け付ける）
+COLUMN_ALIASES = {
+    'name': 'name', '商品名': 'name',
+    'category': 'category', 'カテゴリ': 'category',
+    'quantity_level': 'quantity_level', '残量レベル': 'quantity_level', '残量': 'quantity_level',
+    'opened_date': 'opened_date', '開封日': 'opened_date',
+    'expiry_date': 'expiry_date', '賞味期限': 'expiry_date',
+    'memo': 'memo', 'メモ': 'memo',
+}
+
+ITEM_COLUMNS = ('fridge_id', 'category_id', 'name', 'container_type',
+                'quantity_level', 'opened_date', 'expiry_date', 'memo')
+
+
+class CSVImportError(Exception):
+    """CSV全体を取り込めない（ヘッダー不正など）"""
+
+
+def _parse_date(value):
+    # strptimeは遅いので、ゼロ埋めされた日付はfromisoformatで処理する
+    if len(value) == 10:
+        try:
+            return date.fromisoformat(value.replace('/', '-'))
+        except ValueError:
+            pass
+    for fmt in ('%Y-%m-%d', '%Y/%m/%d'):
+        try:
+            return datetime.strptime(value, fmt).date()
+        except ValueError:
+            pass
+    raise ValueError(value)
+
+
+# 1行を検証して (name, category_name, quantity_level, opened_date, expiry_date, memo) を返す
+def validate_row(row):
+    name = (row.get('name') or '').strip()
+    if not name or len(name) > 50:
+        raise ValueError('商品名は必須です(50文字以内)')
+
+    category_name = (row.get('category') or '').strip()
+    if not category_name or len(category_name) > 50:
+        raise ValueError('カテゴリ名は必須です（50文字以内）')
+
+    quantity_level = (row.get('quantity_level') or '').strip() or '1'
+    if quantity_level not in ('1', '2', '3', '4'):
+        raise ValueError('残量レベルは1〜4で入力してください')
+
+    dates = []
+    for key, label in (('opened_date', '開封日'), ('expiry_date', '賞味期限')):
+        value = (row.get(key) or '').strip()
+        if not value:
+            dates.append(None)
+            continue
+        try:
+            dates.append(_parse_date(value))
+        except ValueError:
+            raise ValueError(f'{label}の形式が正しくありません（YYYY-MM-DD）')
+
+    memo = (row.get('memo') or '').strip() or None
+    if memo and len(memo) > 200:
+        raise ValueError('メモは200文字以内で入力してください')
+
+    return name, category_name, int(quantity_level), dates[0], dates[1], memo
+
+
+# =============================================
+# バックエンド別の書き込み
+# =============================================
+
+class _PostgresLoader:
+    """一時テーブルにCOPYで流し込み、最後にINSERT ... SELECTで在庫に反映"""
+
+    def __init__(self, conn):
+        self.conn = conn
+        cursor = conn.cursor()
+        cursor.execute("""
+            CREATE TEMP TABLE import_items_staging (
+                fridge_id INT, category_id INT, name VARCHAR(50), container_type INT,
+                quantity_level INT, opened_date DATE, expiry_date DATE, memo TEXT
+            ) ON COMMIT DROP
+        """)
+        cursor.close()
+
+    def write(self, rows):
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        for row in rows:
+            writer.writerow(['' if v is None else v for v in row])
+        buf.seek(0)
+        cursor = self.conn.cursor()
+        cursor.copy_expert(
+            f"COPY import_items_staging ({', '.join(ITEM_COLUMNS)}) FROM STDIN WITH (FORMAT csv)",
+            buf
+        )
+        cursor.close()
+
+    def finish(self):
+        cursor = self.conn.cursor()
+        cursor.execute(f"""
+            INSERT INTO items ({', '.join(ITEM_COLUMNS)})
+            SELECT {', '.join(ITEM_COLUMNS)} FROM import_items_staging
+        """)
+        cursor.close()
+
+
+class _MySQLLoader:
+    """複数行INSERTでバッチごとに書き込む"""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def write(self, rows):
+        placeholders = '(' + ', '.join(['%s'] * len(ITEM_COLUMNS)) + ')'
+        query = (f"INSERT INTO items ({', '.join(ITEM_COLUMNS)}) VALUES "
+                 + ', '.join([placeholders] * len(rows)))
+        cursor = self.conn.cursor()
+        cursor.execute(query, [value for row in rows for value in row])
+        cursor.close()
+
+    def finish(self):
+        pass
+
+
+# =============================================
+# 取り込み本体
+# =============================================
+
+def import_items_csv(conn, store_id, stream, categories, create_category, encoding='utf-8-sig'):
+    """CSVをストリームで読みながら検証し、有効な行を在庫に一括登録する
+
+    categories: 既存カテゴリ（id, nameを持つ辞書のリスト）
+    create_category: カテゴリ名を受け取り新しいカテゴリIDを返す関数
+    commitは呼び出し側で行う。
+    """
+    started = time.perf_counter()
+    text = io.TextIOWrapper(stream, encoding=encoding, newline='')
+    reader = csv.reader(text)
+
+    try:
+        header = next(reader)
+    except StopIteration:
+        raise CSVImportError('CSVが空です')
+    except UnicodeDecodeError:
+        raise CSVImportError('文字コードが正しくありません')
+    columns = [COLUMN_ALIASES.get(h.strip().lstrip('\ufeff')) for h in header]
+    if 'name' not in columns or 'category' not in columns:
+        raise CSVImportError('ヘッダーに「商品名(name)」と「カテゴリ(category)」の列が必要です')
+
+    category_ids = {category['name']: category['id'] for category in categories}
+    created_categories = []
+    loader = _PostgresLoader(conn) if USE_PRODUCTION else _MySQLLoader(conn)
+
+    batch = []
+    imported = 0
+    rejected = 0
+    rejected_rows = []
+    line_no = 1
+    try:
+        for line_no, values in enumerate(reader, start=2):
+            if not any(v.strip() for v in values):
+                continue
+            row = {column: value for column, value in zip(columns, values) if column}
+            try:
+                name, category_name, quantity_level, opened_date, expiry_date, memo = validate_row(row)
+            except ValueError as e:
+                rejected += 1
+                if len(rejected_rows) < IMPORT_MAX_REJECTED_DETAILS:
+                    rejected_rows.append({'line': line_no, 'name': row.get('name', ''), 'reason': str(e)})
+                continue
+
+            category_id = category_ids.get(category_name)
+            if category_id is None:
+                category_id = create_category(category_name)
+                category_ids[category_name] = category_id
+                created_categories.append(category_name)
+
+            batch.append((store_id, category_id, name, 1, quantity_level, opened_date, expiry_date, memo))
+            if len(batch) >= IMPORT_BATCH_SIZE:
+                loader.write(batch)
+                imported += len(batch)
+                batch = []
+    except UnicodeDecodeError:
+        raise CSVImportError(f'{line_no}行目付近の文字コードが正しくありません')
+    except csv.Error as e:
+        raise CSVImportError(f'{line_no}行目のCSV形式が正しくありません（{e}）')
+
+    if batch:
+        loader.write(batch)
+        imported += len(batch)
+    loader.finish()
+
+    elapsed = time.perf_counter() - started
+    return {
+        'imported': imported,
+        'rejected': rejected,
+        'rejected_rows': rejected_rows,
+        'created_categories': created_categories,
+        'elapsed': elapsed,
+        'rows_per_second': int((imported + rejected) / elapsed) if elapsed > 0 else None,
+    }
@@ -0,0 +1,246 @@
+import bisect
+import re
+import threading
+import time
+
+from flask import Response, before_render_template, g, has_request_context, request, template_rendered
+
+import db
+
+# 画面・テンプレート用（秒）
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# クエリ・接続取得用（秒）
+QUERY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """ラベルごとに加算するだけのカウンタ"""
+
+    type = 'counter'
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        for label_values, value in values:
+            yield f'{self.name}{_format_labels(self.labels, label_values)} {_format_value(value)}'
+
+
+class Histogram:
+    """ラベルごとのバケット数・合計・件数を持つヒストグラム"""
+
+    type = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=REQUEST_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._values = {}  # ラベル -> [バケットごとの件数..., 合計, 件数]
+
+    def observe(self, value, *label_values):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(label_values)
+            if entry is None:
+                entry = self._values[label_values] = [0] * len(self.buckets) + [0.0, 0]
+            if index < len(self.buckets):
+                entry[index] += 1
+            entry[-2] += value
+            entry[-1] += 1
+
+    def render(self):
+        with self._lock:
+            values = sorted((labels, list(entry)) for labels, entry in self._values.items())
+        for label_values, entry in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets, entry):
+                cumulative += count
+                yield (f'{self.name}_bucket{_format_labels(self.labels, label_values, ("le", _format_value(bound)))}'
+                       f' {cumulative}')
+            yield f'{self.name}_bucket{_format_labels(self.labels, label_values, ("le", "+Inf"))} {entry[-1]}'
+            yield f'{self.name}_sum{_format_labels(self.labels, label_values)} {_format_value(entry[-2])}'
+            yield f'{self.name}_count{_format_labels(self.labels, label_values)} {entry[-1]}'
+
+
+REQUESTS = Counter('fridge_http_requests_total', '画面・APIごとのリクエスト数',
+                   ('endpoint', 'method', 'status'))
+REQUEST_SECONDS = Histogram('fridge_http_request_duration_seconds', '画面・APIごとの処理時間',
+                            ('endpoint', 'method'))
+ACQUIRE_SECONDS = Histogram('fridge_db_connection_acquire_seconds', 'プールからのDB接続の取得時間',
+                            buckets=QUERY_BUCKETS)
+QUERIES = Counter('fridge_db_queries_total', 'クエリの実行回数', ('endpoint', 'query'))
+QUERY_SECONDS = Histogram('fridge_db_query_duration_seconds', 'クエリの実行時間',
+                          ('endpoint', 'query'), buckets=QUERY_BUCKETS)
+TEMPLATE_SECONDS = Histogram('fridge_template_render_seconds', 'テンプレートの描画時間', ('template',))
+
+METRICS = (REQUESTS, REQUEST_SECONDS, ACQUIRE_SECONDS, QUERIES, QUERY_SECONDS, TEMPLATE_SECONDS)
+
+
+# =============================================
+# クエリ名（SQLの種類と対象テーブルから作る）
+# =============================================
+
+_VERB_RE = re.compile(r'^\s*(\w+)')
+_TABLE_RE = re.compile(r'\b(?:FROM|INTO|UPDATE|JOIN)\s+([a-z_][a-z0-9_]*)', re.IGNORECASE)
+_query_names = {}
+_QUERY_NAMES_MAX = 1000
+
+
+def query_name(sql):
+    """'select items,fridges' のような名前を返す（ラベルの種類が増えすぎないよう値は使わない）"""
+    name = _query_names.get(sql)
+    if name is None:
+        verb = _VERB_RE.match(sql)
+        tables = []
+        for table in _TABLE_RE.findall(sql):
+            table = table.lower()
+            if table not in tables and table not in ('unnest', 'stdin'):
+                tables.append(table)
+        name = f"{verb.group(1).lower() if verb else 'unknown'} {','.join(tables)}".strip()
+        if len(_query_names) < _QUERY_NAMES_MAX:
+            _query_names[sql] = name
+    return name
+
+
+def _current_endpoint():
+    if has_request_context():
+        return request.endpoint or 'unknown'
+    return 'none'
+
+
+# =============================================
+# フック
+# =============================================
+
+def _on_query(sql, params, seconds):
+    labels = (_current_endpoint(), query_name(sql))
+    QUERIES.inc(*labels)
+    QUERY_SECONDS.observe(seconds, *labels)
+
+
+def _on_acquire(seconds):
+    ACQUIRE_SECONDS.observe(seconds)
+
+
+def _before_request():
+    g.metrics_started = time.perf_counter()
+
+
+def _after_request(response):
+    started = g.pop('metrics_started', None)
+    if started is not None:
+        endpoint = request.endpoint or 'unknown'
+        REQUESTS.inc(endpoint, request.method, str(response.status_code))
+        REQUEST_SECONDS.observe(time.perf_counter() - started, endpoint, request.method)
+    return response
+
+
+def _before_render(sender, template, context, **extra):
+    g.setdefault('metrics_template_starts', []).append(time.perf_counter())
+
+
+def _after_render(sender, template, context, **extra):
+    starts = g.get('metrics_template_starts')
+    if starts:
+        TEMPLATE_SECONDS.observe(time.perf_counter() - starts.pop(), template.name or 'unknown')
+
+
+def _render_samples(name, help, type, samples):
+    """統計値（stats()の戻り値）をそのまま出力する"""
+    yield f'# HELP {name} {help}'
+    yield f'# TYPE {name} {type}'
+    for labels, value in samples:
+        yield f'{name}{_format_labels([k for k, _ in labels], [v for _, v in labels])} {_format_value(value)}'
+
+
+def render_metrics(caches=()):
+    lines = []
+    for metric in METRICS:
+        lines.append(f'# HELP {metric.name} {metric.help}')
+        lines.append(f'# TYPE {metric.name} {metric.type}')
+        lines.extend(metric.render())
+
+    # プライマリと読み取り用レプリカ（pool="primary" / "replica0"…）
+    pools = [('primary', db.get_pool().stats())]
+    replicas = db.get_replicas()
+    if replicas is not None:
+        replica_stats = replicas.stats()
+        pools.extend((f'replica{index}', stats) for index, stats in enumerate(replica_stats['replicas']))
+        lines.extend(_render_samples('fridge_db_replica_available', 'レプリカが使えるか（接続失敗で外している間は0）',
+                                     'gauge', [
+            ((('pool', name),), int(stats['available'])) for name, stats in pools[1:]
+        ]))
+        lines.extend(_render_samples('fridge_db_replica_events_total',
+                                     'レプリカの選択結果（貸し出し・接続失敗・プライマリへの切り替え）', 'counter', [
+            ((('event', key),), replica_stats[key]) for key in ('acquired', 'failures', 'fallbacks')
+        ]))
+    lines.extend(_render_samples('fridge_db_pool_connections', 'プールの接続数', 'gauge', [
+        ((('pool', name), ('state', state)), stats[state])
+        for name, stats in pools
+        for state in ('idle', 'in_use')
+    ]))
+    lines.extend(_render_samples('fridge_db_pool_events_total', 'プールのイベント数（作成・期限切れ・タイムアウトなど）',
+                                 'counter', [
+        ((('pool', name), ('event', key)), stats[key])
+        for name, stats in pools
+        for key in ('connections_created', 'connections_closed', 'waits', 'timeouts',
+                    'health_check_failures', 'expired')
+    ]))
+    cache_stats = [cache.stats() for cache in caches]
+    lines.extend(_render_samples('fridge_cache_entries', 'プロセス内キャッシュの件数', 'gauge', [
+        ((('cache', stats['name']),), stats['entries']) for stats in cache_stats
+    ]))
+    lines.extend(_render_samples('fridge_cache_events_total', 'プロセス内キャッシュのヒット・ミス・無効化の回数',
+                                 'counter', [
+        ((('cache', stats['name']), ('event', key)), stats[key])
+        for stats in cache_stats
+        for key in ('hits', 'misses', 'invalidations')
+    ]))
+    return '\n'.join(lines) + '\n'
+
+
+def init_app(app, caches=()):
+    """計測フックと /metrics を登録する
+
+    値はワーカープロセスごとに集計される（gunicornの複数ワーカーでは、
+    スクレイプしたワーカーの値になる）。
+    """
+    db.add_query_listener(_on_query)
+    db.add_acquire_listener(_on_acquire)
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    before_render_template.connect(_before_render, app)
+    template_rendered.connect(_after_render, app)
+
+    def metrics_view():
+        return Response(render_metrics(caches), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+    app.add_url_rule('/metrics', 'metrics', metrics_view)
@@ -0,0 +1,82 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+import bcrypt
+
+from config import (
+    PASSWORD_HASH_ROUNDS,
+    PASSWORD_HASH_MAX_WORKERS,
+    PASSWORD_HASH_MAX_PENDING,
+    PASSWORD_HASH_TIMEOUT,
+)
+
+
+class PasswordBusyError(Exception):
+    """ハッシュ計算の待ちが上限に達していて受け付けられない"""
+
+
+# bcryptは計算中にGILを解放するので、専用スレッドで実行すれば他のスレッドは止まらない。
+# 同時に計算する数と待たせる数に上限を設け、超えた分はすぐに断る。
+# fork後はスレッドが引き継がれないので、PIDごとに作り直す
+_executor = None
+_slots = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor, _slots, _executor_pid
+    pid = os.getpid()
+    if _executor is None or _executor_pid != pid:
+        with _executor_lock:
+            if _executor is None or _executor_pid != pid:
+                _executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_MAX_WORKERS,
+                                               thread_name_prefix='bcrypt')
+                _slots = threading.BoundedSemaphore(PASSWORD_HASH_MAX_WORKERS + PASSWORD_HASH_MAX_PENDING)
+                _executor_pid = pid
+    return _executor, _slots
+
+
+def _run(fn, *args):
+    executor, slots = _get_executor()
+    if not slots.acquire(blocking=False):
+        raise PasswordBusyError()
+    try:
+        future = executor.submit(fn, *args)
+    except Exception:
+        slots.release()
+        raise
+    future.add_done_callback(lambda _: slots.release())
+    try:
+        return future.result(timeout=PASSWORD_HASH_TIMEOUT)
+    except FutureTimeoutError:
+        raise PasswordBusyError()
+
+
+def _hash(password):
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds=PASSWORD_HASH_ROUNDS)).decode('utf-8')
+
+
+def _check(password, password_hash):
+    return bcrypt.checkpw(password.encode('utf-8'), password_hash.encode('utf-8'))
+
+
+def hash_password(password):
+    """設定のコストでハッシュ化する（混み合っていればPasswordBusyError）"""
+    return _run(_hash, password)
+
+
+def verify_password(password, password_hash):
+    """パスワードがハッシュと一致するか（混み合っていればPasswordBusyError）"""
+    if not password:
+        return False
+    return _run(_check, password, password_hash)
+
+
+def needs_rehash(password_hash):
+    """ハッシュのコストが現在の設定と違うか（$2b$12$... の12の部分）"""
+    try:
+        return int(password_hash.split('$')[2]) != PASSWORD_HASH_ROUNDS
+    except (IndexError, ValueError):
+        return True
@@ -0,0 +1,42 @@
+from config import USE_PRODUCTION
+
+# この残量レベル以上（少ない・なし）なら発注の対象（在庫一覧の「リストに追加」ボタンと同じ条件）
+REORDER_MIN_LEVEL = 3
+
+# 賞味期限切れの判定に使う今日の日付（DBセッションのタイムゾーンはJSTに設定済み）
+_SQL_TODAY = "CURRENT_DATE" if USE_PRODUCTION else "CURDATE()"
+
+# 発注リストに同じ在庫がすでにあれば何もしない（一意制約 (fridge_id, item_id) で判定）
+SQL_ON_ORDER_CONFLICT = ("ON CONFLICT (fridge_id, item_id) WHERE item_id IS NOT NULL DO NOTHING" if USE_PRODUCTION
+                         else "ON DUPLICATE KEY UPDATE item_id = shopping_list.item_id")
+
+
+def add_low_stock_to_orders(conn, store_id=None):
+    """残量が少ない・期限切れの在庫を、まだ入っていなければ発注リストに追加する
+
+    store_idを省略すると全店舗が対象。1文のINSERT ... SELECTで追加し、追加した件数を返す
+    （commitは呼び出し側で行う）。
+    """
+    store_filter = "AND i.fridge_id = %s" if store_id is not None else ""
+    query = f"""
+        INSERT INTO shopping_list (fridge_id, item_id, item_name, memo)
+        SELECT i.fridge_id, i.id, i.name, i.memo
+        FROM items i
+        WHERE (i.quantity_level >= %s OR i.expiry_date < {_SQL_TODAY})
+          {store_filter}
+          AND NOT EXISTS (
+              SELECT 1 FROM shopping_list s
+              WHERE s.fridge_id = i.fridge_id AND s.item_id = i.id
+          )
+        ORDER BY i.fridge_id, i.id
+        {SQL_ON_ORDER_CONFLICT}
+    """
+    params = [REORDER_MIN_LEVEL]
+    if store_id is not None:
+        params.append(store_id)
+    cursor = conn.cursor()
+    cursor.execute(query, params)
+    # MySQLのON DUPLICATE KEY UPDATEは値が変わらなければ0件と数える
+    added = cursor.rowcount
+    cursor.close()
+    return added
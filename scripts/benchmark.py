@@ -0,0 +1,304 @@
+"""主要な画面の負荷ベンチマーク
+
+ダミーデータ（scripts/seed_data.py）を入れたローカルDBに対して、主要な画面を並列に呼び、
+画面ごとのスループットとレイテンシ（p50/p95/p99）を表示する。
+乱数のシードを固定しているので、同じ引数なら同じ順序・同じ対象でリクエストを送る。
+
+  # gunicornなどで起動したサーバーに対して
+  PRODUCTION=true DATABASE_URL=postgresql://localhost/fridge_test \\
+      python scripts/benchmark.py --seed --url http://127.0.0.1:8000 --output before.json
+  # --url を省略するとFlaskのテストクライアントでプロセス内から呼ぶ
+  python scripts/benchmark.py --compare before.json
+"""
+import argparse
+import contextlib
+import http.client
+import io
+import json
+import math
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode, urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db
+import seed_data
+
+# 計測する画面（名前, 1巡あたりの回数）。閲覧系を多めにする
+ROUTES = [
+    ('store_select', 1),
+    ('inventory_list_expiry', 4),
+    ('inventory_list_quantity', 2),
+    ('update_quantity', 2),
+    ('add_to_order', 1),
+    ('order_list', 2),
+    ('receive_from_order_post', 1),
+    ('search', 2),
+]
+
+
+def load_targets(conn):
+    """リクエスト先に使うID（店舗ごとのカテゴリ・在庫、発注リスト）を取得"""
+    cursor = conn.cursor()
+    cursor.execute("SELECT fridge_id, id FROM categories ORDER BY id")
+    categories = {}
+    for store_id, category_id in cursor.fetchall():
+        categories.setdefault(store_id, []).append(category_id)
+    cursor.execute("SELECT fridge_id, id, category_id FROM items ORDER BY id")
+    items = {}
+    for store_id, item_id, category_id in cursor.fetchall():
+        items.setdefault(store_id, []).append((item_id, category_id))
+    cursor.execute("SELECT fridge_id, id FROM shopping_list ORDER BY id")
+    orders = [(store_id, order_id) for store_id, order_id in cursor.fetchall()]
+    cursor.close()
+    conn.rollback()
+    return categories, items, orders
+
+
+def build_requests(categories, items, orders, rounds, random_seed, routes=ROUTES):
+    """(画面名, メソッド, パス, フォーム) のリストを作る（シャッフル済み）"""
+    rng = random.Random(random_seed)
+    store_ids = sorted(store_id for store_id in items if store_id in categories)
+    # 入荷は発注を1件消費するので、同じ発注を二度使わないよう先に割り当てる
+    orders = list(orders)
+    rng.shuffle(orders)
+
+    requests = []
+    for _ in range(rounds):
+        for name, weight in routes:
+            for _ in range(weight):
+                store_id = rng.choice(store_ids)
+                base = f'/store/{store_id}'
+                item_id, category_id = rng.choice(items[store_id])
+                if name == 'store_select':
+                    requests.append((name, 'GET', '/', None))
+                elif name == 'inventory_list_expiry':
+                    requests.append((name, 'GET', f'{base}/inventory?category={category_id}&sort=expiry', None))
+                elif name == 'inventory_list_quantity':
+                    requests.append((name, 'GET', f'{base}/inventory?category={category_id}&sort=quantity', None))
+                elif name == 'update_quantity':
+                    level = rng.randint(1, 4)
+                    requests.append((name, 'POST', f'{base}/update_quantity/{item_id}/{level}', {}))
+                elif name == 'add_to_order':
+                    requests.append((name, 'POST', f'{base}/add_to_order/{item_id}', {}))
+                elif name == 'order_list':
+                    requests.append((name, 'GET', f'{base}/orders', None))
+                elif name == 'search':
+                    # 商品名の一部（2文字以上）で検索する
+                    word = rng.choice(seed_data.ITEM_NAMES)
+                    length = rng.randint(min(2, len(word)), len(word))
+                    start = rng.randint(0, len(word) - length)
+                    query = urlencode({'q': word[start:start + length]})
+                    requests.append((name, 'GET', f'/api/store/{store_id}/search?{query}', None))
+                elif name == 'receive_from_order_post' and orders:
+                    order_store_id, order_id = orders.pop()
+                    form = {
+                        'name': 'ベンチマーク入荷',
+                        'category_id': categories[order_store_id][0],
+                        'quantity_level': 1,
+                        'opened_date': '',
+                        'expiry_date': '2030-01-01',
+                        'memo': '',
+                    }
+                    requests.append((name, 'POST', f'/store/{order_store_id}/receive_from_order/{order_id}', form))
+    rng.shuffle(requests)
+    return requests
+
+
+# =============================================
+# リクエストの送り方（HTTP / プロセス内）
+# =============================================
+
+class HTTPSender:
+    """スレッドごとにkeep-aliveの接続を持ち、リダイレクトは追わない"""
+
+    def __init__(self, url):
+        parts = urlsplit(url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self._local = threading.local()
+
+    def _connection(self):
+        if not hasattr(self._local, 'conn'):
+            self._local.conn = http.client.HTTPConnection(self.host, self.port, timeout=60)
+        return self._local.conn
+
+    def send(self, method, path, form):
+        body = urlencode(form).encode('utf-8') if form is not None else None
+        headers = {'Content-Type': 'application/x-www-form-urlencoded'} if body is not None else {}
+        conn = self._connection()
+        try:
+            conn.request(method, path, body=body, headers=headers)
+            response = conn.getresponse()
+            response.read()
+        except (http.client.HTTPException, OSError):
+            conn.close()
+            del self._local.conn
+            raise
+        return response.status
+
+
+class InProcessSender:
+    """Flaskのテストクライアントで呼ぶ（サーバーを起動せずに測れる）"""
+
+    def __init__(self):
+        with contextlib.redirect_stdout(io.StringIO()):
+            import app as app_module
+        self.app = app_module.app
+        self._local = threading.local()
+
+    def send(self, method, path, form):
+        if not hasattr(self._local, 'client'):
+            self._local.client = self.app.test_client()
+        response = self._local.client.open(path, method=method, data=form)
+        response.get_data()
+        return response.status_code
+
+
+# =============================================
+# 実行と集計
+# =============================================
+
+def percentile(sorted_values, p):
+    """最近傍順位法のパーセンタイル"""
+    if not sorted_values:
+        return None
+    index = max(0, math.ceil(p / 100 * len(sorted_values)) - 1)
+    return sorted_values[index]
+
+
+def run(sender, requests, concurrency):
+    """全リクエストを並列に送り、(画面ごとのレイテンシ, エラー数, 経過秒) を返す"""
+    latencies = {name: [] for name, _ in ROUTES}
+    errors = {name: 0 for name, _ in ROUTES}
+    lock = threading.Lock()
+
+    def worker(request):
+        name, method, path, form = request
+        started = time.perf_counter()
+        try:
+            ok = sender.send(method, path, form) < 400
+        except Exception:
+            ok = False
+        elapsed = time.perf_counter() - started
+        with lock:
+            latencies[name].append(elapsed)
+            if not ok:
+                errors[name] += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(worker, requests))
+    return latencies, errors, time.perf_counter() - started
+
+
+def summarize(latencies, errors, wall_seconds):
+    results = {}
+    for name, values in latencies.items():
+        values = sorted(values)
+        if not values:
+            continue
+        results[name] = {
+            'requests': len(values),
+            'errors': errors[name],
+            'throughput': len(values) / wall_seconds,
+            'mean_ms': sum(values) / len(values) * 1000,
+            'p50_ms': percentile(values, 50) * 1000,
+            'p95_ms': percentile(values, 95) * 1000,
+            'p99_ms': percentile(values, 99) * 1000,
+            'max_ms': values[-1] * 1000,
+        }
+    return results
+
+
+def print_report(results, wall_seconds, baseline=None):
+    # 全角文字は桁がずれるので見出しは英字にする
+    header = f"{'route':<26}{'n':>6}{'err':>6}{'req/s':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}"
+    if baseline:
+        header += f"{'p95 diff':>9}"
+    print(header)
+    total = 0
+    for name, r in results.items():
+        total += r['requests']
+        line = (f"{name:<26}{r['requests']:>6}{r['errors']:>6}{r['throughput']:>9.1f}"
+                f"{r['p50_ms']:>9.1f}{r['p95_ms']:>9.1f}{r['p99_ms']:>9.1f}{r['max_ms']:>9.1f}")
+        if baseline and name in baseline.get('routes', {}):
+            before = baseline['routes'][name]['p95_ms']
+            line += f"{(r['p95_ms'] - before) / before * 100:>+8.0f}%"
+        print(line)
+    print(f"\n合計 {total} 件 / {wall_seconds:.1f}秒 / {total / wall_seconds:.1f} req/s（時間はミリ秒）")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='主要な画面の負荷ベンチマーク')
+    parser.add_argument('--url', help='対象サーバー（省略時はプロセス内のテストクライアント）')
+    parser.add_argument('--seed', action='store_true', help='実行前にダミーデータを入れ直す（既存データは削除）')
+    parser.add_argument('--stores', type=int, default=200)
+    parser.add_argument('--categories', type=int, default=6)
+    parser.add_argument('--items', type=int, default=300)
+    parser.add_argument('--rounds', type=int, default=100, help='ROUTESの重みを1巡とした繰り返し回数')
+    parser.add_argument('--routes', help='計測する画面（カンマ区切り、省略時はROUTESすべて）。'
+                                         '例: 閲覧系だけ store_select,inventory_list_expiry,order_list')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--warmup', type=int, default=5, help='計測前に捨てる巡回数')
+    parser.add_argument('--random-seed', type=int, default=0)
+    parser.add_argument('--output', help='結果をJSONで保存するファイル')
+    parser.add_argument('--compare', help='比較対象の結果JSON（p95の増減を表示）')
+    args = parser.parse_args()
+
+    # 在庫や発注を書き換えるので、本番DBには実行しない
+    seed_data.ensure_local_database()
+
+    pool = db.get_pool()
+    conn = pool.acquire()
+    try:
+        if args.seed:
+            result = seed_data.seed(conn, args.stores, args.categories, args.items, args.random_seed)
+            print(f"ダミーデータ: 店舗 {result['stores']} / 在庫 {result['items']} / 発注 {result['orders']}")
+        categories, items, orders = load_targets(conn)
+    finally:
+        pool.release(conn)
+    if not items:
+        sys.exit('在庫がありません。--seed を付けて実行してください')
+
+    routes = ROUTES
+    if args.routes:
+        names = args.routes.split(',')
+        unknown = set(names) - {name for name, _ in ROUTES}
+        if unknown:
+            sys.exit(f"不明な画面: {', '.join(sorted(unknown))}")
+        routes = [(name, weight) for name, weight in ROUTES if name in names]
+
+    sender = HTTPSender(args.url) if args.url else InProcessSender()
+    requests = build_requests(categories, items, orders, args.warmup + args.rounds, args.random_seed, routes)
+    warmup_count = len(requests) * args.warmup // (args.warmup + args.rounds)
+    run(sender, requests[:warmup_count], args.concurrency)
+
+    latencies, errors, wall_seconds = run(sender, requests[warmup_count:], args.concurrency)
+    results = summarize(latencies, errors, wall_seconds)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+    print_report(results, wall_seconds, baseline)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({
+                'target': args.url or 'in-process',
+                'concurrency': args.concurrency,
+                'rounds': args.rounds,
+                'random_seed': args.random_seed,
+                'wall_seconds': wall_seconds,
+                'routes': results,
+            }, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
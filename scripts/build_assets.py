@@ -0,0 +1,31 @@
+"""静的ファイルのビルド（デプロイ時に実行）
+
+static/css・static/js を画面ごとに連結・最小化し、内容のハッシュを付けたファイル名で
+static/dist/ に書き出す。gzip（.gz）とbrotli（.br、brotliが入っていれば）の圧縮版と、
+バンドル名からファイル名を引く manifest.json も作る。
+書き出さなくても動く（最初のリクエストでメモリ上に同じものを作る）が、
+ワーカーごとに最高圧縮をやり直さずに済む。
+
+  python scripts/build_assets.py
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import assets
+
+
+def main():
+    built = assets.write_dist()
+    print(f'{assets.DIST_DIR} に書き出しました')
+    for name, (filename, encodings) in built.items():
+        sources = sum(os.path.getsize(os.path.join(assets._STATIC_DIR, path)) for path in assets.BUNDLES[name])
+        sizes = ' '.join(f'{encoding}={len(content):,}' for encoding, content in encodings.items())
+        print(f'  {name:<18} {filename:<32} 元={sources:,} {sizes}')
+    if assets.brotli is None:
+        print('brotliが入っていないため、gzipのみ作成しました')
+
+
+if __name__ == '__main__':
+    main()
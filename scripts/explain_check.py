@@ -0,0 +1,301 @@
+"""app.py が発行する全クエリの実行計画を確認する
+
+ダミーデータを入れたローカルDBに対して、テストクライアントで画面・APIを一通り呼び、
+実行されたクエリを集めてEXPLAINする。
+シーケンシャルスキャン / ソート（MySQLでは type=ALL / Using filesort）になったクエリがあれば
+終了コード1で終わるので、インデックスやクエリを変更したときの回帰確認に使う。
+
+PostgreSQLは小さいテーブルならインデックスがあってもSeq Scanを選ぶため、
+enable_seqscan / enable_sort をオフにして「インデックスで処理できる計画があるか」を確認する。
+
+  PRODUCTION=true DATABASE_URL=postgresql://localhost/fridge_test python scripts/explain_check.py --seed
+  python scripts/explain_check.py --seed   # MySQL（config.DB_CONFIG_LOCAL）
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import re
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import USE_PRODUCTION
+import db
+import seed_data
+
+# 全件を読むのが仕様のクエリ（対象テーブルのフルスキャン・ソートを許可する）
+# (正規表現, 許可する問題の種類, 理由)
+ALLOWED_PLANS = [
+    (r'^SELECT f\.fridge_id, f\.fridge_name, f\.fridge_icon, .* FROM fridges f LEFT JOIN store_summary s .* ORDER BY f\.created_at$', {'full_scan', 'sort'},
+     '店舗一覧は全店舗を集計テーブルと一緒に表示する'),
+    (r'FROM items i JOIN categories c ON c\.id = i\.category_id ORDER BY', {'full_scan', 'sort'},
+     '全店舗分の書き出し'),
+    (r'FROM shopping_list s ORDER BY', {'full_scan', 'sort'}, '全店舗分の書き出し'),
+    (r'ORDER BY CASE WHEN (i\.name|s\.item_name) I?LIKE', {'sort'}, '検索結果は一致した行だけを一致の種類順に並べる'),
+]
+
+# EXPLAINできない・不要な文
+SKIP_PATTERNS = [
+    r'^(SET|COPY|CREATE TEMP) ',
+    r'import_items_staging',  # COMMITで消える一時テーブル
+    r'^SELECT LAST_INSERT_ID\(\)$',
+]
+
+
+def normalize(sql):
+    return re.sub(r'\s+', ' ', sql).strip()
+
+
+class QueryRecorder:
+    """db.add_query_listener に登録して、実行されたクエリを初出順に集める"""
+
+    def __init__(self):
+        self.label = None
+        self.queries = {}  # 正規化したSQL -> (元のSQL, パラメータ, 画面)
+
+    def __call__(self, sql, params, seconds):
+        key = normalize(sql)
+        if key not in self.queries:
+            self.queries[key] = (sql, params, self.label)
+
+
+# =============================================
+# 画面・APIを一通り呼ぶ
+# =============================================
+
+def fetch_ids(conn, store_id):
+    """シナリオで使う在庫・カテゴリ・発注のIDを取得"""
+    cursor = conn.cursor()
+    cursor.execute("SELECT id FROM categories WHERE fridge_id = %s ORDER BY id", (store_id,))
+    category_ids = [row[0] for row in cursor.fetchall()]
+    cursor.execute("SELECT id FROM items WHERE fridge_id = %s ORDER BY id LIMIT 3", (store_id,))
+    item_ids = [row[0] for row in cursor.fetchall()]
+    cursor.execute("SELECT id FROM shopping_list WHERE fridge_id = %s ORDER BY id LIMIT 3", (store_id,))
+    order_ids = [row[0] for row in cursor.fetchall()]
+    cursor.close()
+    conn.rollback()
+    return category_ids, item_ids, order_ids
+
+
+def run_scenario(client, recorder, store_id, category_ids, item_ids, order_ids):
+    """主要な画面・APIを順に呼ぶ。5xxが返ったらエラー一覧に入れる"""
+    errors = []
+    item_id, other_item_id, deleted_item_id = item_ids
+    order_id, received_order_id, bulk_order_id = order_ids
+    base = f'/store/{store_id}'
+    item_form = {'name': '確認用', 'category_id': category_ids[0], 'quantity_level': 2,
+                 'opened_date': '', 'expiry_date': '2030-01-01', 'memo': ''}
+
+    steps = [
+        ('GET', '/', None),
+        ('GET', f'{base}/inventory', None),
+        ('GET', f'{base}/inventory?sort=quantity', None),
+        ('GET', f'{base}/inventory?category={category_ids[1]}', None),
+        ('NEXT', f'{base}/inventory/items?category={category_ids[0]}&sort=expiry', None),
+        ('NEXT', f'{base}/inventory/items?category={category_ids[0]}&sort=quantity', None),
+        ('GET', f'{base}/inventory?category={category_ids[0]}&expiry=expired', None),
+        ('GET', f'{base}/inventory?category={category_ids[0]}&sort=quantity&expiry=warning', None),
+        ('NEXT', f'{base}/inventory/items?category={category_ids[0]}&sort=expiry&expiry=warning', None),
+        ('POST', f'{base}/update_quantity/{item_id}/2', None),
+        ('PATCH', f'/api/store/{store_id}/items/{item_id}/quantity', {'quantity_level': 3}),
+        ('PATCH', f'/api/store/{store_id}/items/quantity',
+         {'updates': [{'item_id': item_id, 'quantity_level': 1},
+                      {'item_id': other_item_id, 'quantity_level': 4}]}),
+        ('GET', f'{base}/add_item', None),
+        ('POST', f'{base}/add_item', item_form),
+        ('GET', f'{base}/edit_item/{item_id}', None),
+        ('POST', f'{base}/edit_item/{item_id}', item_form),
+        ('POST', f'{base}/add_to_order/{other_item_id}', None),
+        ('POST', f'{base}/reorder', None),
+        ('POST', f'{base}/delete_item/{deleted_item_id}', None),
+        ('GET', f'{base}/orders', None),
+        ('POST', f'{base}/add_order', {'item_name': '確認用', 'memo': ''}),
+        ('POST', f'{base}/toggle_order_check/{order_id}', None),
+        ('PATCH', f'/api/store/{store_id}/orders/{order_id}', {'is_checked': True}),
+        ('JSON', f'/api/store/{store_id}/items', {'client_id': 'explain-check', 'name': '確認用',
+                                                  'category_id': category_ids[0], 'quantity_level': 1}),
+        ('GET', f'{base}/receive_from_order/{received_order_id}', None),
+        ('POST', f'{base}/receive_from_order/{received_order_id}', item_form),
+        ('GET', f'{base}/receive_orders', None),
+        ('POST', f'{base}/receive_orders',
+         {'order_id': bulk_order_id, f'name_{bulk_order_id}': '確認用',
+          f'category_id_{bulk_order_id}': category_ids[0], f'quantity_level_{bulk_order_id}': 1,
+          f'expiry_date_{bulk_order_id}': '2030-01-01'}),
+        ('POST', f'{base}/finish_order', None),
+        ('POST', f'{base}/import_items',
+         {'csv_file': (io.BytesIO('name,category\n確認用,食材\n'.encode('utf-8')), 'items.csv')}),
+        ('POST', f'{base}/add_category', {'name': '確認用カテゴリ'}),
+        ('POST', f'{base}/rename_category', {'category_id': category_ids[-1], 'name': '確認用カテゴリ2'}),
+        ('POST', f'{base}/delete_category', {'category_id': category_ids[-1]}),
+        ('GET', f'/api/store/{store_id}/search?q=醤油', None),
+        ('GET', f'/api/store/{store_id}/search?q=卵', None),
+        ('SYNC', f'/api/store/{store_id}/sync', None),
+        ('GET', f'{base}/edit', None),
+        ('POST', f'{base}/update_info', {'store_name': '確認用店舗', 'store_icon': '🏪'}),
+        ('GET', f'{base}/delete', None),
+        ('GET', f'{base}/export/items.csv', None),
+        ('GET', f'{base}/export/orders.ndjson', None),
+        ('GET', '/admin/export/items.csv', None),
+        ('GET', '/admin/export/orders.csv', None),
+        ('POST', '/create_store', {'store_name': '確認用店舗', 'store_icon': '🏪',
+                                   'password': seed_data.SEED_PASSWORD,
+                                   'password_confirm': seed_data.SEED_PASSWORD}),
+    ]
+
+    for method, url, data in steps:
+        recorder.label = f'{method} {url}'
+        if method == 'NEXT':
+            # 1ページ目のJSONから2ページ目（キーセットのシーク）をたどる
+            response = client.get(url)
+            if response.status_code < 500 and response.get_json().get('next_url'):
+                response = client.get(response.get_json()['next_url'])
+        elif method == 'SYNC':
+            # 全件のあと、返ったカーソルで差分（ここまでの更新・削除）を取る
+            response = client.get(url)
+            if response.status_code < 500:
+                response = client.get(url, query_string={'since': response.get_json()['cursor']})
+        elif method == 'JSON':
+            response = client.post(url, json=data)
+        elif method == 'PATCH':
+            response = client.patch(url, json=data)
+        elif method == 'POST':
+            response = client.post(url, data=data)
+        else:
+            response = client.get(url, headers={'X-Admin-Token': 'explain-check'})
+        response.get_data()
+        if response.status_code >= 500:
+            errors.append(f'{method} {url} -> {response.status_code}')
+    return errors
+
+
+# =============================================
+# EXPLAIN と判定
+# =============================================
+
+def _postgres_issues(plan):
+    """実行計画のノードをたどって (種類, テーブル) の一覧を返す"""
+    issues = []
+    node_type = plan['Node Type']
+    if node_type == 'Seq Scan':
+        issues.append(('full_scan', plan.get('Relation Name')))
+    elif node_type in ('Index Scan', 'Index Only Scan', 'Bitmap Index Scan') and 'Index Cond' not in plan:
+        # 条件なしでインデックス全体を読んでいる（Seq Scanを禁止した代わりに選ばれることがある）
+        issues.append(('full_scan', plan.get('Relation Name') or plan.get('Index Name')))
+    elif node_type in ('Sort', 'Incremental Sort'):
+        issues.append(('sort', None))
+    for child in plan.get('Plans', []):
+        issues.extend(_postgres_issues(child))
+    return issues
+
+
+def explain(conn, sql, params):
+    """(問題の一覧, 実行計画の要約) を返す"""
+    if USE_PRODUCTION:
+        cursor = conn.cursor()
+        cursor.execute("SET LOCAL enable_seqscan = off")
+        cursor.execute("SET LOCAL enable_sort = off")
+        cursor.execute('EXPLAIN (FORMAT JSON) ' + sql, params)
+        plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        cursor.close()
+        conn.rollback()
+        root = plan[0]['Plan']
+        return _postgres_issues(root), root['Node Type']
+
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute('EXPLAIN ' + sql, params)
+    rows = cursor.fetchall()
+    cursor.close()
+    conn.rollback()
+    issues = []
+    for row in rows:
+        extra = row.get('Extra') or ''
+        if row.get('type') == 'ALL':
+            issues.append(('full_scan', row.get('table')))
+        if 'Using filesort' in extra:
+            issues.append(('sort', row.get('table')))
+    summary = ', '.join(f"{row.get('table')}:{row.get('type')}" for row in rows)
+    return issues, summary
+
+
+def check(conn, recorder):
+    """集めたクエリを全てEXPLAINし、問題のあった件数を返す"""
+    failures = 0
+    for key, (sql, params, label) in recorder.queries.items():
+        if any(re.search(pattern, key) for pattern in SKIP_PATTERNS):
+            continue
+        try:
+            issues, summary = explain(conn, sql, params)
+        except Exception as e:
+            conn.rollback()
+            failures += 1
+            print(f'NG   {label}\n     {key[:120]}\n     EXPLAINに失敗: {e}')
+            continue
+
+        allowed = set()
+        for pattern, kinds, _ in ALLOWED_PLANS:
+            if re.search(pattern, key):
+                allowed |= kinds
+        problems = [(kind, table) for kind, table in issues if kind not in allowed]
+        if problems:
+            failures += 1
+            detail = ', '.join(f'{kind}' + (f' on {table}' if table else '') for kind, table in problems)
+            print(f'NG   {label}\n     {key[:120]}\n     {detail}  [{summary}]')
+        else:
+            print(f'ok   {key[:100]}  [{summary}]')
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description='app.pyの全クエリの実行計画を確認する')
+    parser.add_argument('--seed', action='store_true', help='実行前にダミーデータを入れ直す（既存データは削除）')
+    parser.add_argument('--stores', type=int, default=200)
+    parser.add_argument('--categories', type=int, default=6)
+    parser.add_argument('--items', type=int, default=300)
+    parser.add_argument('--store-id', type=int, default=1, help='シナリオで操作する店舗')
+    args = parser.parse_args()
+
+    # シナリオでデータを書き換えるので、本番DBには実行しない
+    seed_data.ensure_local_database()
+
+    pool = db.get_pool()
+    conn = pool.acquire()
+    try:
+        if args.seed:
+            result = seed_data.seed(conn, args.stores, args.categories, args.items)
+            print(f"ダミーデータ: 店舗 {result['stores']} / 在庫 {result['items']} / 発注 {result['orders']}")
+        ids = fetch_ids(conn, args.store_id)
+    finally:
+        pool.release(conn)
+    if len(ids[0]) < 2 or len(ids[1]) < 3 or len(ids[2]) < 3:
+        sys.exit(f'店舗{args.store_id}のデータが足りません。--seed を付けて実行してください')
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        import app as app_module
+    app_module.app.config['TESTING'] = True
+    app_module.ADMIN_EXPORT_TOKEN = 'explain-check'
+
+    recorder = QueryRecorder()
+    db.add_query_listener(recorder)
+    try:
+        errors = run_scenario(app_module.app.test_client(), recorder, args.store_id, *ids)
+    finally:
+        db.remove_query_listener(recorder)
+
+    conn = pool.acquire()
+    try:
+        failures = check(conn, recorder)
+    finally:
+        pool.release(conn)
+
+    for error in errors:
+        print(f'NG   {error}')
+    print(f'\nクエリ {len(recorder.queries)} 種類 / 問題 {failures + len(errors)} 件')
+    sys.exit(1 if failures or errors else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,46 @@
+"""差分同期の削除記録（sync_tombstones）の掃除（定期実行用）
+
+保持期間（SYNC_TOMBSTONE_RETENTION_DAYS）を過ぎた削除記録を消す。
+それより前から同期していない端末は、次の同期で全件を受け取り直す（sync.parse_cursor）ので、
+消しても写しに削除済みの行が残ることはない。
+
+  # 毎日4時（JST）に実行する例（crontab）
+  0 4 * * * cd /path/to/app && PRODUCTION=true DATABASE_URL=... python scripts/prune_sync_tombstones.py
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db
+from config import SYNC_TOMBSTONE_RETENTION_DAYS
+from sync import prune_tombstones
+
+
+def main():
+    parser = argparse.ArgumentParser(description='保持期間を過ぎた差分同期の削除記録を消す')
+    parser.add_argument('--days', type=int, default=SYNC_TOMBSTONE_RETENTION_DAYS,
+                        help=f'保持する日数（省略時は{SYNC_TOMBSTONE_RETENTION_DAYS}日）')
+    args = parser.parse_args()
+    if args.days < SYNC_TOMBSTONE_RETENTION_DAYS:
+        # それより短くすると、まだ差分で同期する端末に削除が届かなくなる
+        parser.error(f'--days は {SYNC_TOMBSTONE_RETENTION_DAYS} 以上にしてください')
+
+    started = time.perf_counter()
+    conn = db.connect()
+    try:
+        deleted = prune_tombstones(conn, args.days)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+    print(f'{args.days}日より前の削除記録を{deleted}件消しました（{time.perf_counter() - started:.2f}秒）')
+
+
+if __name__ == '__main__':
+    main()
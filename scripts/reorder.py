@@ -0,0 +1,44 @@
+"""自動発注（定期実行用）
+
+残量が少ない・賞味期限切れの在庫を、まだ入っていなければ発注リストに追加する。
+画面の「不足分を追加」と同じ処理で、全店舗分を1文のINSERT ... SELECTで追加する。
+何度実行しても同じ在庫が二重に入ることはない（発注リストの一意制約 (fridge_id, item_id)）。
+
+  # 毎朝6時（JST）に全店舗分を追加する例（crontab）
+  0 6 * * * cd /path/to/app && PRODUCTION=true DATABASE_URL=... python scripts/reorder.py
+  # 1店舗だけ
+  python scripts/reorder.py --store-id 3
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db
+from reorder import add_low_stock_to_orders
+
+
+def main():
+    parser = argparse.ArgumentParser(description='残量が少ない・期限切れの在庫を発注リストに追加する')
+    parser.add_argument('--store-id', type=int, help='対象の店舗（省略時は全店舗）')
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    conn = db.connect()
+    try:
+        added = add_low_stock_to_orders(conn, args.store_id)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+    target = f'店舗{args.store_id}' if args.store_id is not None else '全店舗'
+    print(f'{target}: {added}件を発注リストに追加しました（{time.perf_counter() - started:.2f}秒）')
+
+
+if __name__ == '__main__':
+    main()
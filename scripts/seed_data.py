@@ -0,0 +1,208 @@
+"""ベンチマーク・実行計画確認用のダミーデータを投入する
+
+既存のデータをすべて削除してから入れ直すので、ローカルのDBにしか実行できない。
+
+  # PostgreSQL
+  PRODUCTION=true DATABASE_URL=postgresql://localhost/fridge_test python scripts/seed_data.py
+  # MySQL（config.DB_CONFIG_LOCAL）
+  python scripts/seed_data.py --stores 100 --categories 6 --items 300
+"""
+import argparse
+import csv
+import io
+import os
+import random
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import bcrypt
+
+from config import get_db_config, USE_PRODUCTION
+
+CATEGORY_NAMES = ['食材', 'パック・容器', '調味料', '飲料', '冷凍食品', '乾物', '消耗品', '清掃用品',
+                  '酒類', '製菓材料', '包材', '備品']
+ITEM_NAMES = ['牛乳', '卵', '豚バラ肉', '鶏もも肉', 'キャベツ', '玉ねぎ', '醤油', '味噌', 'みりん', 'サラダ油',
+              '小麦粉', '片栗粉', '生クリーム', 'バター', 'チーズ', 'トマト缶', 'パスタ', '米', '割り箸',
+              'テイクアウト容器', 'ラップ', 'ゴミ袋', 'コーヒー豆', '紅茶', 'オレンジジュース', '冷凍ポテト']
+MEMOS = ['業務スーパー', '〇〇商店に発注', 'ロット A-12', '冷蔵庫上段', '店長確認済み']
+
+# 残量レベル 1〜4 の出現比率（満タンが多く、在庫切れは少ない）
+QUANTITY_WEIGHTS = [45, 25, 18, 12]
+
+SEED_PASSWORD = '1234'
+
+BATCH_SIZE = 5000
+
+
+def ensure_local_database():
+    """接続先がローカルでなければ中断する（本番DBを消さないため）"""
+    if not USE_PRODUCTION:
+        host = get_db_config().get('host')
+    else:
+        import psycopg2.extensions
+        host = psycopg2.extensions.parse_dsn(get_db_config()).get('host')
+    if host and host not in ('localhost', '127.0.0.1', '::1') and not host.startswith('/'):
+        sys.exit(f'ローカル以外のDB（{host}）には実行できません。DATABASE_URLを確認してください')
+
+
+def random_expiry(rng, today):
+    """賞味期限: 未設定1割、期限切れ・期限間近が2割、残りは1年以内"""
+    r = rng.random()
+    if r < 0.10:
+        return None
+    if r < 0.18:
+        return today - timedelta(days=rng.randint(1, 30))
+    if r < 0.30:
+        return today + timedelta(days=rng.randint(0, 7))
+    return today + timedelta(days=rng.randint(8, 365))
+
+
+def _write_rows(conn, table, columns, rows):
+    """PostgreSQLはCOPY、MySQLは複数行INSERTで書き込む"""
+    cursor = conn.cursor()
+    if USE_PRODUCTION:
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        for row in rows:
+            writer.writerow(['' if v is None else v for v in row])
+        buf.seek(0)
+        cursor.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buf)
+    else:
+        placeholders = '(' + ', '.join(['%s'] * len(columns)) + ')'
+        for start in range(0, len(rows), BATCH_SIZE):
+            batch = rows[start:start + BATCH_SIZE]
+            query = (f"INSERT INTO {table} ({', '.join(columns)}) VALUES "
+                     + ', '.join([placeholders] * len(batch)))
+            cursor.execute(query, [value for row in batch for value in row])
+    cursor.close()
+
+
+def reset(conn):
+    cursor = conn.cursor()
+    if USE_PRODUCTION:
+        cursor.execute("TRUNCATE shopping_list, items, categories, fridges RESTART IDENTITY CASCADE")
+    else:
+        cursor.execute("SET FOREIGN_KEY_CHECKS = 0")
+        for table in ('sync_tombstones', 'store_expiry_counts', 'store_summary', 'shopping_list', 'items', 'categories', 'fridges'):
+            cursor.execute(f"TRUNCATE TABLE {table}")
+        cursor.execute("SET FOREIGN_KEY_CHECKS = 1")
+    cursor.close()
+    conn.commit()
+
+
+def analyze(conn):
+    cursor = conn.cursor()
+    if USE_PRODUCTION:
+        for table in ('fridges', 'categories', 'items', 'shopping_list'):
+            cursor.execute(f"ANALYZE {table}")
+    else:
+        cursor.execute("ANALYZE TABLE fridges, categories, items, shopping_list")
+        cursor.fetchall()
+    cursor.close()
+    conn.commit()
+
+
+def seed(conn, stores, categories, items, random_seed=0):
+    """stores店舗 × categoriesカテゴリ × 平均items件の在庫と発注リストを投入する
+
+    店舗ごとの在庫数・カテゴリごとの偏りは乱数で揺らす。同じrandom_seedなら同じデータになる。
+    """
+    rng = random.Random(random_seed)
+    today = date.today()
+    now = datetime.now().replace(microsecond=0)
+    started = time.perf_counter()
+
+    reset(conn)
+
+    # パスワードは全店舗共通。確認を速くするためコストは最小にする
+    password_hash = bcrypt.hashpw(SEED_PASSWORD.encode('utf-8'), bcrypt.gensalt(rounds=4)).decode('utf-8')
+    _write_rows(conn, 'fridges', ('fridge_name', 'fridge_icon', 'password_hash', 'created_at'), [
+        (f'店舗{n:04d}', '🏪', password_hash, now - timedelta(days=stores - n))
+        for n in range(1, stores + 1)
+    ])
+
+    _write_rows(conn, 'categories', ('fridge_id', 'name'), [
+        (store_id, CATEGORY_NAMES[n % len(CATEGORY_NAMES)] + ('' if n < len(CATEGORY_NAMES) else str(n)))
+        for store_id in range(1, stores + 1)
+        for n in range(categories)
+    ])
+    cursor = conn.cursor()
+    cursor.execute("SELECT id, fridge_id FROM categories ORDER BY id")
+    category_ids = {}
+    for category_id, store_id in cursor.fetchall():
+        category_ids.setdefault(store_id, []).append(category_id)
+    cursor.close()
+
+    item_columns = ('fridge_id', 'category_id', 'name', 'container_type',
+                    'quantity_level', 'opened_date', 'expiry_date', 'memo')
+    item_count = 0
+    low_stock = []  # (store_id, 在庫の通し番号, 商品名)
+    rows = []
+    for store_id in range(1, stores + 1):
+        # 店舗の規模は平均の0.2〜1.8倍、カテゴリごとにも偏りを持たせる
+        store_items = max(1, int(items * rng.uniform(0.2, 1.8)))
+        weights = [rng.random() + 0.2 for _ in category_ids[store_id]]
+        for category_id in rng.choices(category_ids[store_id], weights, k=store_items):
+            quantity_level = rng.choices([1, 2, 3, 4], QUANTITY_WEIGHTS)[0]
+            name = f'{rng.choice(ITEM_NAMES)}{rng.randint(1, 999)}'
+            opened_date = today - timedelta(days=rng.randint(0, 120)) if rng.random() < 0.4 else None
+            memo = rng.choice(MEMOS) if rng.random() < 0.3 else None
+            rows.append((store_id, category_id, name, rng.randint(1, 3), quantity_level,
+                         opened_date, random_expiry(rng, today), memo))
+            item_count += 1
+            if quantity_level >= 3 and rng.random() < 0.5:
+                low_stock.append((store_id, item_count, name))
+        if len(rows) >= BATCH_SIZE:
+            _write_rows(conn, 'items', item_columns, rows)
+            rows = []
+    if rows:
+        _write_rows(conn, 'items', item_columns, rows)
+
+    # 在庫は空のテーブルに入れたので、idは投入順の通し番号になっている
+    orders = [(store_id, item_id, name, None) for store_id, item_id, name in low_stock]
+    for store_id in range(1, stores + 1):
+        for n in range(3):
+            orders.append((store_id, None, f'{rng.choice(ITEM_NAMES)}（手動）', rng.choice(MEMOS)))
+    rng.shuffle(orders)
+    _write_rows(conn, 'shopping_list', ('fridge_id', 'item_id', 'item_name', 'memo', 'is_checked', 'created_at'), [
+        (store_id, item_id, name, memo, rng.random() < 0.3,
+         now - timedelta(minutes=rng.randint(0, 14 * 24 * 60)))
+        for store_id, item_id, name, memo in orders
+    ])
+
+    conn.commit()
+    analyze(conn)
+    return {
+        'stores': stores,
+        'categories': stores * categories,
+        'items': item_count,
+        'orders': len(orders),
+        'elapsed': time.perf_counter() - started,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='ダミーデータを投入する（既存データは削除）')
+    parser.add_argument('--stores', type=int, default=200)
+    parser.add_argument('--categories', type=int, default=6, help='1店舗あたりのカテゴリ数')
+    parser.add_argument('--items', type=int, default=300, help='1店舗あたりの平均在庫数')
+    parser.add_argument('--random-seed', type=int, default=0)
+    args = parser.parse_args()
+
+    ensure_local_database()
+
+    import db
+    conn = db.get_pool().acquire()
+    try:
+        result = seed(conn, args.stores, args.categories, args.items, args.random_seed)
+    finally:
+        db.get_pool().release(conn)
+    print(f"店舗 {result['stores']} / カテゴリ {result['categories']} / 在庫 {result['items']} / "
+          f"発注 {result['orders']} を {result['elapsed']:.1f}秒で投入しました")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""ワーカー起動時間の計測
+
+新しいPythonプロセスで「import app → create_app()」にかかる時間を複数回測り、
+中央値が目標（--target-ms）を超えたら終了コード1で終わる。
+あわせて、起動時に使わない方のDBドライバを読み込んでいないこと、DBに接続していないことも確認する。
+
+  PRODUCTION=true python scripts/startup_time.py
+  python scripts/startup_time.py --runs 10 --target-ms 300
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 子プロセスで実行するコード（結果をJSONで標準出力に書く）
+MEASURE = """
+import json, sys, time
+started = time.perf_counter()
+import app
+app.create_app()
+elapsed = time.perf_counter() - started
+import db
+print(json.dumps({
+    'ms': elapsed * 1000,
+    'psycopg2': 'psycopg2' in sys.modules,
+    'mysql': 'mysql.connector' in sys.modules,
+    'connected': db._pool is not None,
+}))
+"""
+
+
+def measure_once():
+    result = subprocess.run([sys.executable, '-c', MEASURE], cwd=ROOT, capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='import app → create_app() の時間を測る')
+    parser.add_argument('--runs', type=int, default=7)
+    parser.add_argument('--target-ms', type=float, default=300)
+    args = parser.parse_args()
+
+    results = [measure_once() for _ in range(args.runs)]
+    times = sorted(r['ms'] for r in results)
+    median = statistics.median(times)
+    print(f"起動時間: 中央値 {median:.0f}ms / 最小 {times[0]:.0f}ms / 最大 {times[-1]:.0f}ms（{args.runs}回）")
+
+    problems = []
+    if median > args.target_ms:
+        problems.append(f'中央値が目標 {args.target_ms:.0f}ms を超えています')
+    first = results[0]
+    if first['psycopg2'] or first['mysql']:
+        problems.append('起動時にDBドライバを読み込んでいます（最初の接続まで遅らせる）')
+    if first['connected']:
+        problems.append('起動時にDBへ接続しています')
+    for problem in problems:
+        print(f'NG   {problem}')
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == '__main__':
+    main()
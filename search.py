@@ -0,0 +1,72 @@
+from config import USE_PRODUCTION, SEARCH_MAX_RESULTS
+
+# MySQLのngramパーサーのトークン長（ngram_token_size、既定値2）。これより短い語はFULLTEXTで引けない
+_NGRAM_TOKEN_SIZE = 2
+
+
+_LIKE = 'ILIKE' if USE_PRODUCTION else 'LIKE'
+
+
+def _escape_like(text):
+    """LIKEのワイルドカード（% _ \\）を文字として扱う"""
+    return text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def _like_pattern(text):
+    """部分一致のLIKEパターン"""
+    return f'%{_escape_like(text)}%'
+
+
+# 在庫・発注リストの検索条件と、その条件に渡すパラメータ
+# PostgreSQL: ILIKE（pg_trgm のGINインデックスで部分一致を引く）
+# MySQL: ngramパーサーのFULLTEXTインデックスでフレーズ検索（トークン長より短い語はLIKE）
+def _match_clause(columns, text):
+    if USE_PRODUCTION or len(text) < _NGRAM_TOKEN_SIZE:
+        pattern = _like_pattern(text)
+        return '(' + ' OR '.join(f'{column} {_LIKE} %s' for column in columns) + ')', [pattern] * len(columns)
+    # 二重引用符で囲んでフレーズ検索にする（ngramが連続して並ぶ行＝部分一致）
+    phrase = '"' + text.replace('"', ' ') + '"'
+    return f"MATCH({', '.join(columns)}) AGAINST (%s IN BOOLEAN MODE)", [phrase]
+
+
+def search_store(conn, store_id, text):
+    """店舗の在庫（商品名・メモ）と発注リスト（商品名）を部分一致で検索する
+
+    カテゴリをまたいで検索し、商品名の前方一致 → 商品名の部分一致 → メモのみ一致の順に
+    それぞれ最大 SEARCH_MAX_RESULTS 件を返す。
+    """
+    prefix = f'{_escape_like(text)}%'
+    contains = _like_pattern(text)
+
+    cursor = conn.cursor()
+    item_match, item_params = _match_clause(('i.name', 'i.memo'), text)
+    cursor.execute(f"""
+        SELECT i.id, i.name, i.memo, i.category_id, c.name AS category_name,
+               i.quantity_level, i.expiry_date
+        FROM items i
+        JOIN categories c ON c.id = i.category_id AND c.fridge_id = i.fridge_id
+        WHERE i.fridge_id = %s AND {item_match}
+        ORDER BY CASE WHEN i.name {_LIKE} %s THEN 0 WHEN i.name {_LIKE} %s THEN 1 ELSE 2 END,
+                 i.name, i.id
+        LIMIT %s
+    """, [store_id] + item_params + [prefix, contains, SEARCH_MAX_RESULTS])
+    items = [
+        {'id': row[0], 'name': row[1], 'memo': row[2], 'category_id': row[3], 'category_name': row[4],
+         'quantity_level': row[5], 'expiry_date': row[6].isoformat() if row[6] else None}
+        for row in cursor.fetchall()
+    ]
+
+    order_match, order_params = _match_clause(('s.item_name',), text)
+    cursor.execute(f"""
+        SELECT s.id, s.item_name, s.memo, s.is_checked
+        FROM shopping_list s
+        WHERE s.fridge_id = %s AND {order_match}
+        ORDER BY CASE WHEN s.item_name {_LIKE} %s THEN 0 ELSE 1 END, s.item_name, s.id
+        LIMIT %s
+    """, [store_id] + order_params + [prefix, SEARCH_MAX_RESULTS])
+    orders = [
+        {'id': row[0], 'item_name': row[1], 'memo': row[2], 'is_checked': bool(row[3])}
+        for row in cursor.fetchall()
+    ]
+    cursor.close()
+    return items, orders
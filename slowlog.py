@@ -0,0 +1,214 @@
+import hashlib
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
+import threading
+import time
+from datetime import datetime
+
+from flask import has_request_context, request
+
+import db
+from config import (
+    USE_PRODUCTION,
+    SLOW_QUERY_THRESHOLD_MS,
+    SLOW_QUERY_LOG_PATH,
+    SLOW_QUERY_LOG_MAX_BYTES,
+    SLOW_QUERY_LOG_BACKUP_COUNT,
+    SLOW_QUERY_EXPLAIN_SAMPLE_RATE,
+    SLOW_QUERY_EXPLAIN_MIN_INTERVAL,
+    SLOW_QUERY_EXPLAIN_TIMEOUT_MS,
+)
+
+logger = logging.getLogger('fridge.slow_query')
+
+# EXPLAINできない文
+_NOT_EXPLAINABLE_RE = re.compile(r'^\s*(SET|COPY|CREATE|DROP|ALTER|BEGIN|COMMIT|ROLLBACK)\b', re.IGNORECASE)
+
+
+def normalize(sql):
+    return re.sub(r'\s+', ' ', sql).strip()
+
+
+def fingerprint(sql):
+    """同じクエリを同一視するためのID（IN (%s, %s, ...) の個数の違いは無視）"""
+    text = re.sub(r'%s(\s*,\s*%s)+', '%s, ...', normalize(sql))
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()[:12]
+
+
+def _type_name(value):
+    if isinstance(value, (list, tuple)):
+        return f'{type(value).__name__}[{len(value)}]'
+    return type(value).__name__
+
+
+def params_shape(params):
+    """パラメータの型だけを返す（パスワードなどの値はログに残さない）"""
+    if params is None:
+        return None
+    if isinstance(params, dict):
+        return {key: _type_name(value) for key, value in params.items()}
+    return [_type_name(value) for value in params]
+
+
+def _write(record):
+    logger.warning(json.dumps(record, ensure_ascii=False, default=str))
+
+
+# =============================================
+# 実行計画の取得（バックグラウンドスレッド）
+# =============================================
+
+class ExplainWorker:
+    """専用の接続でEXPLAINを1件ずつ実行するスレッド
+
+    リクエストの接続やプールの枠は使わない。キューが埋まっていれば捨てるので、
+    スロークエリが続いてもEXPLAINが溜まって負荷になることはない。
+    """
+
+    def __init__(self, max_queue=4):
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._conn = None
+        self._thread = threading.Thread(target=self._run, name='slow-query-explain', daemon=True)
+        self._thread.start()
+
+    def submit(self, fp, sql, params):
+        try:
+            self._queue.put_nowait((fp, sql, params))
+            return True
+        except queue.Full:
+            return False
+
+    def _connection(self):
+        if self._conn is None:
+            self._conn = db.connect()
+            cursor = self._conn.cursor()
+            if USE_PRODUCTION:
+                cursor.execute("SET statement_timeout = %s", (SLOW_QUERY_EXPLAIN_TIMEOUT_MS,))
+            else:
+                cursor.execute("SET SESSION max_execution_time = %s", (SLOW_QUERY_EXPLAIN_TIMEOUT_MS,))
+            cursor.close()
+            self._conn.commit()
+        return self._conn
+
+    def explain(self, sql, params):
+        """実行計画を返す。SELECTだけはANALYZEで実際に実行した結果を含める"""
+        analyze = USE_PRODUCTION and normalize(sql).upper().startswith('SELECT')
+        conn = self._connection()
+        cursor = conn.cursor()
+        try:
+            if USE_PRODUCTION:
+                options = 'ANALYZE, BUFFERS, FORMAT JSON' if analyze else 'FORMAT JSON'
+                cursor.execute(f'EXPLAIN ({options}) ' + sql, params)
+                plan = cursor.fetchone()[0]
+            else:
+                cursor.execute('EXPLAIN FORMAT=JSON ' + sql, params)
+                plan = cursor.fetchone()[0]
+            if isinstance(plan, (str, bytes)):
+                plan = json.loads(plan)
+            return plan, analyze
+        finally:
+            cursor.close()
+            # 更新系のEXPLAINも含め、何も残さない
+            conn.rollback()
+
+    def _run(self):
+        while True:
+            fp, sql, params = self._queue.get()
+            record = {'type': 'explain', 'time': datetime.now().isoformat(timespec='seconds'), 'fingerprint': fp}
+            try:
+                plan, analyzed = self.explain(sql, params)
+                record.update(analyzed=analyzed, plan=plan)
+            except Exception as e:
+                record['error'] = str(e)
+                try:
+                    self._conn.close()
+                except Exception:
+                    pass
+                self._conn = None
+            _write(record)
+
+
+# gunicornのfork後はスレッドが引き継がれないので、PIDごとに作り直す
+_worker = None
+_worker_pid = None
+_worker_lock = threading.Lock()
+_last_explained = {}  # fingerprint -> 最後にEXPLAINを依頼した時刻
+
+
+def _get_worker():
+    global _worker, _worker_pid
+    pid = os.getpid()
+    if _worker is None or _worker_pid != pid:
+        with _worker_lock:
+            if _worker is None or _worker_pid != pid:
+                _worker = ExplainWorker()
+                _worker_pid = pid
+                _last_explained.clear()
+    return _worker
+
+
+def _should_explain(fp, sql):
+    if _NOT_EXPLAINABLE_RE.match(sql) or random.random() >= SLOW_QUERY_EXPLAIN_SAMPLE_RATE:
+        return False
+    now = time.monotonic()
+    with _worker_lock:
+        last = _last_explained.get(fp)
+        if last is not None and now - last < SLOW_QUERY_EXPLAIN_MIN_INTERVAL:
+            return False
+        _last_explained[fp] = now
+    return True
+
+
+# =============================================
+# フック
+# =============================================
+
+def _on_query(sql, params, seconds):
+    if seconds * 1000 < SLOW_QUERY_THRESHOLD_MS:
+        return
+
+    fp = fingerprint(sql)
+    record = {
+        'type': 'slow_query',
+        'time': datetime.now().isoformat(timespec='seconds'),
+        'duration_ms': round(seconds * 1000, 1),
+        'fingerprint': fp,
+        'sql': normalize(sql),
+        'params': params_shape(params),
+        'endpoint': None,
+        'store_id': None,
+    }
+    if has_request_context():
+        record['endpoint'] = request.endpoint
+        record['method'] = request.method
+        record['store_id'] = (request.view_args or {}).get('store_id')
+
+    if _should_explain(fp, sql):
+        record['explain'] = 'queued' if _get_worker().submit(fp, sql, params) else 'dropped'
+    _write(record)
+
+
+def init_app(app):
+    """スロークエリの記録を有効にする（SLOW_QUERY_THRESHOLD_MSが0以下なら何もしない）"""
+    if SLOW_QUERY_THRESHOLD_MS <= 0:
+        return
+    if not logger.handlers:
+        directory = os.path.dirname(SLOW_QUERY_LOG_PATH)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        handler = logging.handlers.RotatingFileHandler(
+            SLOW_QUERY_LOG_PATH,
+            maxBytes=SLOW_QUERY_LOG_MAX_BYTES,
+            backupCount=SLOW_QUERY_LOG_BACKUP_COUNT,
+            encoding='utf-8',
+        )
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        logger.addHandler(handler)
+        logger.setLevel(logging.WARNING)
+        logger.propagate = False
+    db.add_query_listener(_on_query)
@@ -148,7 +148,10 @@ function changeCategory(categoryId) {
     const select      = document.getElementById('categorySelect');
     const baseUrl     = select.dataset.baseUrl;
     const currentSort = select.dataset.currentSort;
-    window.location.href = baseUrl + '?category=' + categoryId + '&sort=' + currentSort;
+    const currentExpiry = select.dataset.currentExpiry;
+    let url = baseUrl + '?category=' + categoryId + '&sort=' + currentSort;
+    if (currentExpiry) url += '&expiry=' + currentExpiry;
+    window.location.href = url;
 }
 
 
@@ -212,14 +215,18 @@ function toggleDetail() {
 // =============================================
 // 在庫一覧: 詳細表示状態の復元・スクロール位置管理
 // =============================================
-document.addEventListener('DOMContentLoaded', () => {
-    // 詳細表示の状態を復元
+function restoreDetailVisibility() {
     const btn = document.getElementById('toggleDetailBtn');
     if (btn && localStorage.getItem('hideDetails') === 'true') {
         document.querySelectorAll('.item-details').forEach(el => el.style.display = 'none');
         btn.textContent = '詳細を表示';
         btn.classList.add('active');
     }
+}
+
+document.addEventListener('DOMContentLoaded', () => {
+    // 詳細表示の状態を復元
+    restoreDetailVisibility();
 
     // スクロール位置を復元
     const scrollPos = sessionStorage.getItem('scrollPos');
@@ -227,11 +234,736 @@ document.addEventListener('DOMContentLoaded', () => {
         window.scrollTo(0, parseInt(scrollPos));
         sessionStorage.removeItem('scrollPos');
     }
+});
+
+
+// =============================================
+// トースト通知をJSから表示
+// =============================================
+function showToast(message, category = 'success') {
+    let container = document.querySelector('.toast-container');
+    if (!container) {
+        container = document.createElement('div');
+        container.className = 'toast-container';
+        document.body.prepend(container);
+    }
+
+    const toast = document.createElement('div');
+    toast.className = 'toast toast-' + category;
+    const text = document.createElement('span');
+    text.className = 'toast-message';
+    text.textContent = message;
+    const close = document.createElement('button');
+    close.className = 'toast-close';
+    close.textContent = '×';
+    close.addEventListener('click', () => toast.remove());
+    toast.append(text, close);
+    container.append(toast);
+
+    setTimeout(() => toast.classList.add('show'), 10);
+    setTimeout(() => {
+        toast.classList.add('hide');
+        setTimeout(() => toast.remove(), 300);
+    }, 3000);
+}
+
+
+// =============================================
+// 在庫一覧: 残量ワンタップ更新（ページ再読み込みなし）
+// =============================================
+const QTY_CLASSES = {1: 'qty-full', 2: 'qty-half', 3: 'qty-low', 4: 'qty-empty'};
+
+// カードの残量表示（色・ボタン）を切り替え
+function showQuantityLevel(card, level) {
+    Object.values(QTY_CLASSES).forEach(cls => card.classList.remove(cls));
+    card.classList.add(QTY_CLASSES[level]);
+
+    card.querySelectorAll('.qty-form').forEach(form => {
+        const btn = form.querySelector('.qty-btn');
+        btn.classList.remove('active', 'level-1', 'level-2', 'level-3', 'level-4');
+        if (Number(form.dataset.level) === level) {
+            btn.classList.add('active', 'level-' + level);
+        }
+    });
+}
+
+// APIが返した在庫状態をカードに反映
+function applyItemState(card, item) {
+    card.dataset.quantityLevel = item.quantity_level;
+    if (item.updated_at) card.dataset.updatedAt = item.updated_at;
+    showQuantityLevel(card, item.quantity_level);
+
+    const slot = card.querySelector('.add-to-list-slot');
+    if (slot) slot.hidden = !item.show_add_to_list;
+}
+
+// 無限スクロールで後から追加されるカードにも効くよう、documentで受ける
+document.addEventListener('submit', async (e) => {
+    const form = e.target;
+    if (!form.classList.contains('qty-form')) return;
+    const card = form.closest('.item-card');
+    if (!card || !card.dataset.quantityUrl) return;
+    e.preventDefault();
+
+    if (stockTakeMode) {
+        markStockTake(card, Number(form.dataset.level));
+        return;
+    }
+
+    try {
+        const res = await sendOrQueue(quantityOp(card, Number(form.dataset.level)));
+        if (res === null) return;
+        if (!res.ok) throw new Error('HTTP ' + res.status);
+        applyItemState(card, await res.json());
+        showToast('残量を更新しました');
+    } catch (err) {
+        // 失敗時は従来のフォーム送信にフォールバック（スクロール位置を保存）
+        sessionStorage.setItem('scrollPos', window.scrollY);
+        form.submit();
+    }
+});
+
+
+// =============================================
+// 在庫一覧: 棚卸しモード（残量の変更をまとめて1回で保存）
+// =============================================
+let stockTakeMode = false;
+const stockTakeChanges = new Map();  // item_id -> 新しい残量
+
+function updateStockTakeBar() {
+    document.getElementById('stockTakeCount').textContent = stockTakeChanges.size;
+    document.getElementById('stockTakeBar').hidden = !stockTakeMode;
+}
+
+function toggleStockTake() {
+    if (stockTakeMode && stockTakeChanges.size > 0 &&
+        !confirm('保存していない変更は破棄されます。よろしいですか?')) {
+        return;
+    }
+    cancelStockTake();
+    stockTakeMode = !stockTakeMode;
+    document.getElementById('stockTakeBtn').classList.toggle('active', stockTakeMode);
+    updateStockTakeBar();
+}
+
+// 変更を記録して見た目だけ先に切り替える
+function markStockTake(card, level) {
+    const itemId = Number(card.dataset.itemId);
+    if (level === Number(card.dataset.quantityLevel)) {
+        stockTakeChanges.delete(itemId);
+        card.classList.remove('stocktake-changed');
+    } else {
+        stockTakeChanges.set(itemId, level);
+        card.classList.add('stocktake-changed');
+    }
+    showQuantityLevel(card, level);
+    updateStockTakeBar();
+}
+
+function cancelStockTake() {
+    stockTakeChanges.forEach((level, itemId) => {
+        const card = document.getElementById('item-' + itemId);
+        card.classList.remove('stocktake-changed');
+        showQuantityLevel(card, Number(card.dataset.quantityLevel));
+    });
+    stockTakeChanges.clear();
+    if (document.getElementById('stockTakeBar')) updateStockTakeBar();
+}
+
+async function queueStockTake() {
+    try {
+        for (const [itemId, level] of stockTakeChanges) {
+            const card = document.getElementById('item-' + itemId);
+            await queueOp(quantityOp(card, level));
+            card.classList.remove('stocktake-changed');
+        }
+    } catch (err) {
+        return false;
+    }
+    stockTakeChanges.clear();
+    updateStockTakeBar();
+    showToast(OFFLINE_MESSAGE);
+    return true;
+}
+
+async function saveStockTake() {
+    if (stockTakeChanges.size === 0) return;
+    const list    = document.getElementById('itemsList');
+    const saveBtn = document.getElementById('stockTakeSaveBtn');
+    const updates = Array.from(stockTakeChanges, ([item_id, quantity_level]) => ({item_id, quantity_level}));
+
+    saveBtn.disabled = true;
+    try {
+        const res = await fetch(list.dataset.batchUrl, {
+            method: 'PATCH',
+            headers: {'Content-Type': 'application/json', 'Accept': 'application/json'},
+            body: JSON.stringify({updates}),
+        });
+        if (!res.ok) throw new Error('HTTP ' + res.status);
+        const data = await res.json();
+
+        let failed = 0;
+        data.results.forEach(result => {
+            const card = document.getElementById('item-' + result.item_id);
+            if (!card) return;
+            if (result.ok) {
+                applyItemState(card, result);
+                card.classList.remove('stocktake-changed');
+                stockTakeChanges.delete(result.item_id);
+            } else {
+                failed++;
+            }
+        });
+        updateStockTakeBar();
+        showToast(data.updated + '件の残量を更新しました');
+        if (failed > 0) showToast(failed + '件は更新できませんでした', 'error');
+    } catch (err) {
+        // 通信できなければ1件ずつオフラインの送信待ちに回す
+        if (err instanceof TypeError && await queueStockTake()) return;
+        showToast('保存に失敗しました。通信状況を確認してください', 'error');
+    } finally {
+        saveBtn.disabled = false;
+    }
+}
+
+
+// =============================================
+// 在庫一覧: 無限スクロール（キーセットページングで続きを読み込む）
+// =============================================
+document.addEventListener('DOMContentLoaded', () => {
+    const sentinel = document.getElementById('loadMore');
+    if (!sentinel || !('IntersectionObserver' in window)) return;
+
+    let loading = false;
+    const observer = new IntersectionObserver(async (entries) => {
+        if (!entries[0].isIntersecting || loading) return;
+        loading = true;
+        try {
+            const res = await fetch(sentinel.dataset.nextUrl, {headers: {'Accept': 'application/json'}});
+            if (!res.ok) throw new Error('HTTP ' + res.status);
+            const data = await res.json();
+
+            sentinel.insertAdjacentHTML('beforebegin', data.html);
+            restoreDetailVisibility();
+
+            if (data.next_url) {
+                sentinel.dataset.nextUrl = data.next_url;
+            } else {
+                observer.disconnect();
+                sentinel.remove();
+            }
+        } catch (err) {
+            // 読み込めなければ自動読み込みをやめ、「続きを表示」リンクを残す
+            observer.disconnect();
+        } finally {
+            loading = false;
+        }
+    }, {rootMargin: '400px'});
+
+    observer.observe(sentinel);
+});
+
+
+// =============================================
+// 在庫一覧: 検索（入力中に候補を表示）
+// =============================================
+const QTY_LABELS = {1: '満タン', 2: '半分', 3: '少ない', 4: 'なし'};
+
+function searchResultLink(url, title, detail) {
+    const link = document.createElement('a');
+    link.className = 'search-result';
+    link.href = url;
+    const name = document.createElement('span');
+    name.className = 'search-result-name';
+    name.textContent = title;
+    const info = document.createElement('span');
+    info.className = 'search-result-detail';
+    info.textContent = detail;
+    link.append(name, info);
+    return link;
+}
+
+function renderSearchResults(container, data) {
+    container.replaceChildren();
+    const addSection = (label, links) => {
+        if (links.length === 0) return;
+        const heading = document.createElement('div');
+        heading.className = 'search-section';
+        heading.textContent = label;
+        container.append(heading, ...links);
+    };
+    addSection('在庫', data.items.map(item => searchResultLink(
+        item.url, item.name,
+        [item.category_name, QTY_LABELS[item.quantity_level], item.expiry_date && '期限 ' + item.expiry_date, item.memo]
+            .filter(Boolean).join(' / '))));
+    addSection('発注リスト', data.orders.map(order => searchResultLink(
+        order.url, order.item_name,
+        [order.is_checked ? '発注済み' : '未発注', order.memo].filter(Boolean).join(' / '))));
+    if (container.childElementCount === 0) {
+        const empty = document.createElement('div');
+        empty.className = 'search-empty';
+        empty.textContent = '見つかりませんでした';
+        container.append(empty);
+    }
+    container.hidden = false;
+}
+
+document.addEventListener('DOMContentLoaded', () => {
+    const box = document.getElementById('searchBox');
+    if (!box) return;
+    const input = document.getElementById('searchInput');
+    const results = document.getElementById('searchResults');
+    let timer = null;
+    let controller = null;
+
+    const search = async () => {
+        const q = input.value.trim();
+        if (controller) controller.abort();
+        if (!q) {
+            results.hidden = true;
+            return;
+        }
+        // 前の検索は打ち切り、最後に入力した語の結果だけを表示する
+        controller = new AbortController();
+        try {
+            const res = await fetch(box.dataset.searchUrl + '?q=' + encodeURIComponent(q),
+                                    {headers: {'Accept': 'application/json'}, signal: controller.signal});
+            if (!res.ok) throw new Error('HTTP ' + res.status);
+            renderSearchResults(results, await res.json());
+        } catch (err) {
+            if (err.name !== 'AbortError') results.hidden = true;
+        }
+    };
+
+    input.addEventListener('input', () => {
+        clearTimeout(timer);
+        timer = setTimeout(search, 200);
+    });
+    input.addEventListener('keydown', (e) => {
+        if (e.key === 'Escape') {
+            input.value = '';
+            results.hidden = true;
+        }
+    });
+    input.addEventListener('focus', () => {
+        if (input.value.trim() && results.childElementCount > 0) results.hidden = false;
+    });
+    document.addEventListener('click', (e) => {
+        if (!box.contains(e.target)) results.hidden = true;
+    });
+});
+
+
+// =============================================
+// 在庫一覧・発注リスト: 他の端末での変更を反映（Server-Sent Events）
+// =============================================
+
+// 差分で反映できない変更（追加など）は、再読み込みを促すお知らせを出す
+function showUpdateNotice() {
+    if (document.querySelector('.update-notice')) return;
+    const notice = document.createElement('div');
+    notice.className = 'update-notice';
+    const text = document.createElement('span');
+    text.textContent = '他の端末で更新がありました';
+    const reload = document.createElement('button');
+    reload.className = 'btn btn-small btn-primary';
+    reload.textContent = '再読み込み';
+    reload.addEventListener('click', () => {
+        sessionStorage.setItem('scrollPos', window.scrollY);
+        location.reload();
+    });
+    notice.append(text, reload);
+    document.body.append(notice);
+}
+
+// 発注カードのチェック表示を切り替え
+function applyOrderState(card, order) {
+    card.classList.toggle('checked', order.is_checked);
+    const btn = card.querySelector('.check-btn');
+    if (btn) btn.textContent = order.is_checked ? '✓' : '○';
+}
+
+document.addEventListener('DOMContentLoaded', () => {
+    const root = document.querySelector('[data-events-url]');
+    if (!root || !('EventSource' in window)) return;
+    const scope = root.dataset.eventsScope;
+    const source = new EventSource(root.dataset.eventsUrl);
+    const on = (event, handler) => source.addEventListener(event, (e) => handler(JSON.parse(e.data)));
+
+    // 時間切れ（bye）以外で切れたあとに再接続した場合は、取りこぼしがありうる
+    let connected = false;
+    let closedNormally = false;
+    on('ready', () => {
+        if (connected && !closedNormally) showUpdateNotice();
+        connected = true;
+        closedNormally = false;
+    });
+    on('bye', () => { closedNormally = true; });
+    on('resync', () => showUpdateNotice());
+    on('changed', (data) => { if (data.scope === scope) showUpdateNotice(); });
+
+    if (scope === 'inventory') {
+        on('item', (item) => {
+            const card = document.getElementById('item-' + item.id);
+            // 棚卸し中に自分が変更しているカードは上書きしない
+            if (!card || stockTakeChanges.has(item.id)) return;
+            applyItemState(card, item);
+        });
+        on('item_removed', (data) => {
+            const card = document.getElementById('item-' + data.id);
+            if (card) card.remove();
+        });
+    } else if (scope === 'orders') {
+        on('order', (order) => {
+            const card = document.getElementById('order-' + order.id);
+            if (card) applyOrderState(card, order);
+        });
+        on('orders_removed', (data) => {
+            data.ids.forEach(id => {
+                const card = document.getElementById('order-' + id);
+                if (card) card.remove();
+            });
+        });
+    }
+});
+
 
-    // 残量ボタンクリック時にスクロール位置を保存
-    document.querySelectorAll('.qty-btn').forEach(qtyBtn => {
-        qtyBtn.addEventListener('click', () => {
-            sessionStorage.setItem('scrollPos', window.scrollY);
+// =============================================
+// オフライン対応（service worker・送信待ちの操作・差分同期）
+// =============================================
+// 画面と静的ファイルは service worker（/sw.js）がキャッシュする。
+// 通信できないときの操作（残量・発注チェック・在庫登録）は IndexedDB の queue に貯め、
+// 通信が戻ったら順に送る（同じ在庫・発注への操作は最後のものだけ送る）。
+// mirror には店舗ごとの在庫・発注の写しを持ち、/api/store/<id>/sync の差分で更新する。
+const OFFLINE_DB_NAME = 'fridge-offline';
+const OFFLINE_MESSAGE = 'オフラインのため、通信が戻ったら送信します';
+
+if ('serviceWorker' in navigator) {
+    window.addEventListener('load', () => {
+        navigator.serviceWorker.register('/sw.js').catch(() => {});
+    });
+}
+
+let offlineDb = null;
+
+function openOfflineDb() {
+    if (!offlineDb) {
+        offlineDb = new Promise((resolve, reject) => {
+            const req = indexedDB.open(OFFLINE_DB_NAME, 1);
+            req.onupgradeneeded = () => {
+                req.result.createObjectStore('queue', {keyPath: 'seq', autoIncrement: true});
+                req.result.createObjectStore('mirror', {keyPath: 'storeId'});
+            };
+            req.onsuccess = () => resolve(req.result);
+            req.onerror = () => reject(req.error);
         });
+    }
+    return offlineDb;
+}
+
+// 1トランザクションで処理し、fnが返したリクエストの結果を返す
+async function withStore(name, mode, fn) {
+    const database = await openOfflineDb();
+    return new Promise((resolve, reject) => {
+        const tx = database.transaction(name, mode);
+        const req = fn(tx.objectStore(name));
+        tx.oncomplete = () => resolve(req instanceof IDBRequest ? req.result : undefined);
+        tx.onerror = () => reject(tx.error);
+    });
+}
+
+function quantityOp(card, level) {
+    return {kind: 'quantity', key: card.id, url: card.dataset.quantityUrl, method: 'PATCH',
+            body: {quantity_level: level}};
+}
+
+function orderOp(card, isChecked) {
+    return {kind: 'order', key: card.id, url: card.dataset.orderUrl, method: 'PATCH',
+            body: {is_checked: isChecked}};
+}
+
+function sendOp(op) {
+    return fetch(op.url, {
+        method: op.method,
+        headers: {'Content-Type': 'application/json', 'Accept': 'application/json'},
+        body: JSON.stringify(op.body),
+    });
+}
+
+// 送信待ちに入れ、画面には先に反映しておく（同じカードへの古い操作は置き換える）
+async function queueOp(op) {
+    await withStore('queue', 'readwrite', (store) => {
+        if (!op.key) return store.add(op);
+        store.openCursor().onsuccess = (e) => {
+            const cursor = e.target.result;
+            if (!cursor) {
+                store.add(op);
+                return;
+            }
+            if (cursor.value.key === op.key) cursor.delete();
+            cursor.continue();
+        };
+    });
+    applyPendingOp(op);
+    updateOfflineBanner();
+}
+
+// 送信し、通信できなければ送信待ちに入れる（戻り値: レスポンス、送信待ちに入れたときはnull）
+async function sendOrQueue(op) {
+    try {
+        return await sendOp(op);
+    } catch (err) {
+        // fetchは通信できないときだけTypeErrorで失敗する
+        if (!(err instanceof TypeError)) throw err;
+        await queueOp(op);
+        showToast(OFFLINE_MESSAGE);
+        return null;
+    }
+}
+
+// 送信待ちの操作をカードに反映
+function applyPendingOp(op) {
+    const card = op.key && document.getElementById(op.key);
+    if (!card) return;
+    if (op.kind === 'quantity') {
+        card.dataset.quantityLevel = op.body.quantity_level;
+        showQuantityLevel(card, op.body.quantity_level);
+    } else if (op.kind === 'order') {
+        applyOrderState(card, op.body);
+    }
+    card.classList.add('sync-pending');
+}
+
+async function pendingOps() {
+    try {
+        return await withStore('queue', 'readonly', store => store.getAll());
+    } catch (err) {
+        return [];
+    }
+}
+
+async function updateOfflineBanner() {
+    const count = (await pendingOps()).length;
+    let banner = document.querySelector('.offline-banner');
+    if (navigator.onLine && count === 0) {
+        if (banner) banner.remove();
+        return;
+    }
+    if (!banner) {
+        banner = document.createElement('div');
+        banner.className = 'offline-banner';
+        document.body.prepend(banner);
+    }
+    const pending = count > 0 ? '（未送信 ' + count + '件）' : '';
+    banner.textContent = navigator.onLine
+        ? '未送信の変更が' + count + '件あります'
+        : 'オフラインです。変更は通信が戻ったときに送信します' + pending;
+}
+
+// 送信待ちの操作を古い順に送る（同時に2回は走らせない）
+let flushing = null;
+
+function flushQueue() {
+    if (!flushing) flushing = sendQueuedOps().finally(() => { flushing = null; });
+    return flushing;
+}
+
+async function sendQueuedOps() {
+    let sent = 0;
+    let rejected = 0;
+    for (const op of await pendingOps()) {
+        let res;
+        try {
+            res = await sendOp(op);
+        } catch (err) {
+            break;  // まだ通信できない
+        }
+        // サーバーの障害なら後で送り直す。削除済みの在庫などで受け付けられなければ捨てる
+        if (res.status >= 500) break;
+        if (res.ok) sent++; else rejected++;
+        await withStore('queue', 'readwrite', store => store.delete(op.seq));
+    }
+
+    document.querySelectorAll('.sync-pending').forEach(card => card.classList.remove('sync-pending'));
+    (await pendingOps()).forEach(applyPendingOp);
+    updateOfflineBanner();
+    if (sent > 0) showToast('オフライン中の変更を' + sent + '件送信しました');
+    if (rejected > 0) showToast(rejected + '件の変更は反映できませんでした（削除済みなど）', 'error');
+}
+
+// 写しの方が新しければカードに反映（キャッシュから開いた古い画面を写しで補う）
+function isNewer(value, than) {
+    return Boolean(value) && (!than || value > than);
+}
+
+function applySyncedRows(root, mirror, deleted) {
+    if (root.dataset.eventsScope === 'inventory') {
+        root.querySelectorAll('.item-card').forEach(card => {
+            const item = mirror.items[card.dataset.itemId];
+            if (!item || !isNewer(item.updated_at, card.dataset.updatedAt) || stockTakeChanges.has(item.id)) return;
+            card.dataset.updatedAt = item.updated_at;
+            card.dataset.quantityLevel = item.quantity_level;
+            showQuantityLevel(card, item.quantity_level);
+        });
+        deleted.items.forEach(id => {
+            const card = document.getElementById('item-' + id);
+            if (card) card.remove();
+        });
+    } else {
+        root.querySelectorAll('.shopping-card').forEach(card => {
+            const order = mirror.orders[card.id.replace('order-', '')];
+            if (!order || !isNewer(order.updated_at, card.dataset.updatedAt)) return;
+            card.dataset.updatedAt = order.updated_at;
+            applyOrderState(card, order);
+        });
+        deleted.orders.forEach(id => {
+            const card = document.getElementById('order-' + id);
+            if (card) card.remove();
+        });
+    }
+}
+
+async function loadMirror(storeId) {
+    const mirror = await withStore('mirror', 'readonly', store => store.get(storeId));
+    return mirror || {storeId, cursor: null, items: {}, orders: {}};
+}
+
+// 前回の同期以降の差分を取得して写しを更新し、画面に反映する
+async function syncStore(root) {
+    const mirror = await loadMirror(Number(root.dataset.storeId));
+    let url = root.dataset.syncUrl;
+    if (mirror.cursor) url += '?since=' + encodeURIComponent(mirror.cursor);
+    const res = await fetch(url, {headers: {'Accept': 'application/json'}});
+    if (!res.ok) throw new Error('HTTP ' + res.status);
+    const data = await res.json();
+
+    if (data.reset) {
+        mirror.items = {};
+        mirror.orders = {};
+    }
+    // 写しになかった行（他の端末での追加）はカードを作れないので、再読み込みを促す
+    const categoryId = Number(root.dataset.categoryId);
+    const added = root.dataset.eventsScope === 'inventory'
+        ? data.items.some(item => !(item.id in mirror.items) && item.category_id === categoryId)
+        : data.orders.some(order => !(order.id in mirror.orders));
+    data.items.forEach(item => { mirror.items[item.id] = item; });
+    data.orders.forEach(order => { mirror.orders[order.id] = order; });
+    data.deleted_items.forEach(id => { delete mirror.items[id]; });
+    data.deleted_orders.forEach(id => { delete mirror.orders[id]; });
+    mirror.cursor = data.cursor;
+    await withStore('mirror', 'readwrite', store => store.put(mirror));
+
+    applySyncedRows(root, mirror, {items: data.deleted_items, orders: data.deleted_orders});
+    if (added && !data.reset) showUpdateNotice();
+}
+
+async function flushAndSync(root) {
+    await flushQueue();
+    if (!root || !navigator.onLine) return;
+    try {
+        await syncStore(root);
+    } catch (err) {
+        // 同期できなくても画面はそのまま使える
+    }
+}
+
+document.addEventListener('DOMContentLoaded', async () => {
+    if (!('indexedDB' in window)) return;
+    const root = document.querySelector('[data-sync-url]');
+
+    // キャッシュから開いた画面でも、写しと送信待ちの操作で最新に近づける
+    try {
+        if (root) applySyncedRows(root, await loadMirror(Number(root.dataset.storeId)), {items: [], orders: []});
+        (await pendingOps()).forEach(applyPendingOp);
+    } catch (err) {
+        return;  // IndexedDBが使えない（プライベートモードなど）
+    }
+    updateOfflineBanner();
+
+    window.addEventListener('online', () => flushAndSync(root));
+    window.addEventListener('offline', updateOfflineBanner);
+    if (navigator.onLine) flushAndSync(root);
+});
+
+
+// =============================================
+// 発注リスト: チェックの切り替え（ページ再読み込みなし）
+// =============================================
+document.addEventListener('submit', async (e) => {
+    const form = e.target;
+    if (!form.classList.contains('order-check-form')) return;
+    const card = form.closest('.shopping-card');
+    if (!card || !card.dataset.orderUrl) return;
+    e.preventDefault();
+
+    try {
+        // 切り替えではなく新しい状態を送るので、後から再送しても結果は同じ
+        const res = await sendOrQueue(orderOp(card, !card.classList.contains('checked')));
+        if (res === null) return;
+        if (!res.ok) throw new Error('HTTP ' + res.status);
+        const order = await res.json();
+        card.dataset.updatedAt = order.updated_at;
+        applyOrderState(card, order);
+    } catch (err) {
+        form.submit();
+    }
+});
+
+
+// =============================================
+// 在庫登録: オフラインでも登録できるようにする
+// =============================================
+// 端末で採番したclient_idを付けてAPIで登録する（通信できなければ送信待ちにし、再送しても二重に登録されない）
+function newClientId() {
+    if (crypto.randomUUID) return crypto.randomUUID();
+    const bytes = crypto.getRandomValues(new Uint8Array(16));
+    return Array.from(bytes, b => b.toString(16).padStart(2, '0')).join('');
+}
+
+document.addEventListener('DOMContentLoaded', () => {
+    // 画面を移ったあとに出すトースト
+    const message = sessionStorage.getItem('pendingToast');
+    if (message) {
+        sessionStorage.removeItem('pendingToast');
+        showToast(message);
+    }
+
+    const form = document.getElementById('registerForm');
+    if (!form || !form.dataset.offlineUrl || !('indexedDB' in window)) return;
+
+    form.addEventListener('submit', async (e) => {
+        e.preventDefault();
+        const data = new FormData(form);
+        const categoryId = Number(data.get('category_id'));
+        const op = {kind: 'add_item', key: null, url: form.dataset.offlineUrl, method: 'POST', body: {
+            client_id: newClientId(),
+            name: data.get('name'),
+            category_id: categoryId,
+            quantity_level: Number(data.get('quantity_level')),
+            opened_date: data.get('opened_date') || null,
+            expiry_date: data.get('expiry_date') || null,
+            memo: data.get('memo') || null,
+        }};
+
+        let message = '在庫を登録しました';
+        try {
+            const res = await sendOp(op);
+            // 入力エラーなどは従来のフォーム送信で画面に表示させる
+            if (!res.ok) throw new Error('HTTP ' + res.status);
+        } catch (err) {
+            if (!(err instanceof TypeError)) {
+                form.submit();
+                return;
+            }
+            try {
+                await queueOp(op);
+            } catch (queueErr) {
+                form.submit();
+                return;
+            }
+            message = OFFLINE_MESSAGE;
+        }
+        sessionStorage.setItem('pendingToast', message);
+        location.href = form.dataset.inventoryUrl + '?category=' + categoryId;
     });
 });
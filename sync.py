@@ -0,0 +1,171 @@
+"""オフライン同期（差分取得）
+
+端末（service worker とページのJS）は店舗の在庫・発注リストの写しを IndexedDB に持ち、
+前回の同期時刻（カーソル）以降に変わった行と、削除した行のID（sync_tombstones）だけを受け取って更新する。
+初回・長く同期していなかった端末には全件を返し、写しを作り直させる（reset）。
+"""
+from datetime import datetime, timedelta
+
+import pytz
+
+import db
+from config import USE_PRODUCTION, SYNC_OVERLAP_SECONDS, SYNC_TOMBSTONE_RETENTION_DAYS
+
+# 端末に渡す列（itemsの別名はi、shopping_listの別名はs）
+SQL_SYNC_ITEM_COLUMNS = """
+    i.id, i.category_id, i.name, i.quantity_level, i.opened_date, i.expiry_date, i.memo,
+    i.client_id, i.updated_at
+"""
+SQL_SYNC_ORDER_COLUMNS = "s.id, s.item_id, s.item_name, s.memo, s.is_checked, s.updated_at"
+
+# オフライン中に追加した在庫の再送は、同じ client_id の行があれば何もしない
+_SQL_ON_CLIENT_CONFLICT = ("ON CONFLICT (fridge_id, client_id) WHERE client_id IS NOT NULL DO NOTHING" if USE_PRODUCTION
+                           else "ON DUPLICATE KEY UPDATE client_id = items.client_id")
+
+
+def _now():
+    """日本時間の現在時刻（updated_atと同じタイムゾーンなしの値）"""
+    return datetime.now(pytz.timezone('Asia/Tokyo')).replace(tzinfo=None)
+
+
+def parse_cursor(value):
+    """カーソル（前回の同期時刻、ISO形式）を読む
+
+    ない・読めない・削除記録の保持期間より古い・未来の時刻のときはNone（全件を返し直す）。
+    サーバーが返すカーソルはタイムゾーンなしなので、タイムゾーン付きの値も読めないものとして扱う。
+    """
+    if not value:
+        return None
+    try:
+        since = datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    if since.tzinfo is not None:
+        return None
+    now = _now()
+    if since < now - timedelta(days=SYNC_TOMBSTONE_RETENTION_DAYS):
+        return None
+    # DBとアプリの時計のずれは重なりの秒数まで許す。それより先の時刻で差分を取ると変更を取りこぼす
+    if since > now + timedelta(seconds=SYNC_OVERLAP_SECONDS):
+        return None
+    return since
+
+
+def _iso(value):
+    return value.isoformat() if value else None
+
+
+def item_json(row):
+    return {
+        'id': row['id'],
+        'category_id': row['category_id'],
+        'name': row['name'],
+        'quantity_level': row['quantity_level'],
+        'opened_date': _iso(row['opened_date']),
+        'expiry_date': _iso(row['expiry_date']),
+        'memo': row['memo'],
+        'client_id': row['client_id'],
+        'updated_at': _iso(row['updated_at']),
+    }
+
+
+def order_json(row):
+    return {
+        'id': row['id'],
+        'item_id': row['item_id'],
+        'item_name': row['item_name'],
+        'memo': row['memo'],
+        'is_checked': bool(row['is_checked']),
+        'updated_at': _iso(row['updated_at']),
+    }
+
+
+def fetch_changes(conn, store_id, cursor_value):
+    """カーソル以降に変わった在庫・発注と、削除したID、次回のカーソルを返す
+
+    カーソルから SYNC_OVERLAP_SECONDS さかのぼって読むので、同じ行が重ねて届くことがある
+    （端末はIDで上書きするだけ）。カーソルがなければ全件を返す（reset=True）。
+    """
+    since = parse_cursor(cursor_value)
+    if since is not None:
+        since -= timedelta(seconds=SYNC_OVERLAP_SECONDS)
+    cursor = db.dict_cursor(conn)
+
+    # 次回のカーソルは行を読む前の時刻にする（読んでいる間の更新は次回に届く）
+    # 削除記録は同じ文で読む（全件のときは読まない）
+    # 端末はIDで写しを更新するだけなので、どの結果も並べ替えない
+    cursor.execute("""
+        SELECT n.synced_at, t.kind, t.row_id
+        FROM (SELECT LOCALTIMESTAMP AS synced_at) n
+        LEFT JOIN sync_tombstones t ON t.fridge_id = %s AND t.deleted_at >= %s
+    """, (store_id, since))
+    rows = cursor.fetchall()
+    synced_at = rows[0]['synced_at']
+    deleted = {'item': [], 'order': []}
+    for row in rows:
+        if row['kind'] in deleted:
+            deleted[row['kind']].append(row['row_id'])
+
+    # 全件のときは更新日時で絞らない（aliasはテーブルの別名）
+    def changed_since(alias):
+        return f"AND {alias}.updated_at >= %s" if since is not None else ""
+    params = (store_id, since) if since is not None else (store_id,)
+    cursor.execute(f"""
+        SELECT {SQL_SYNC_ITEM_COLUMNS}
+        FROM items i
+        WHERE i.fridge_id = %s {changed_since('i')}
+    """, params)
+    items = [item_json(row) for row in cursor.fetchall()]
+
+    cursor.execute(f"""
+        SELECT {SQL_SYNC_ORDER_COLUMNS}
+        FROM shopping_list s
+        WHERE s.fridge_id = %s {changed_since('s')}
+    """, params)
+    orders = [order_json(row) for row in cursor.fetchall()]
+    cursor.close()
+
+    return {
+        'reset': since is None,
+        'cursor': synced_at.isoformat(),
+        'items': items,
+        'orders': orders,
+        'deleted_items': deleted['item'],
+        'deleted_orders': deleted['order'],
+    }
+
+
+def insert_client_item(conn, store_id, client_id, values):
+    """オフライン中に端末で追加した在庫を登録し、(在庫, 新規登録したか) を返す
+
+    同じ client_id の在庫がすでにあれば（再送）登録せずにその在庫を返す。commitは呼び出し側で行う。
+    """
+    cursor = db.dict_cursor(conn)
+    cursor.execute(f"""
+        INSERT INTO items (fridge_id, category_id, name, container_type, quantity_level,
+                           opened_date, expiry_date, memo, client_id)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+        {_SQL_ON_CLIENT_CONFLICT}
+    """, (store_id, values['category_id'], values['name'], 1, values['quantity_level'],
+          values['opened_date'], values['expiry_date'], values['memo'], client_id))
+    # MySQLのON DUPLICATE KEY UPDATEは値が変わらなければ0件と数える
+    created = cursor.rowcount == 1
+    cursor.execute(f"""
+        SELECT {SQL_SYNC_ITEM_COLUMNS}
+        FROM items i
+        WHERE i.fridge_id = %s AND i.client_id = %s
+    """, (store_id, client_id))
+    item = cursor.fetchone()
+    cursor.close()
+    return item_json(item), created
+
+
+def prune_tombstones(conn, days=SYNC_TOMBSTONE_RETENTION_DAYS):
+    """保持期間を過ぎた削除記録を消し、消した件数を返す（commitは呼び出し側で行う）"""
+    # 記録時刻（deleted_at）と同じDBの時計で比べる
+    cutoff = "LOCALTIMESTAMP - make_interval(days => %s)" if USE_PRODUCTION else "DATE_SUB(NOW(), INTERVAL %s DAY)"
+    cursor = conn.cursor()
+    cursor.execute(f"DELETE FROM sync_tombstones WHERE deleted_at < {cutoff}", (days,))
+    deleted = cursor.rowcount
+    cursor.close()
+    return deleted
@@ -0,0 +1,73 @@
+// =============================================
+// service worker（app.py の service_worker がキャッシュ名と先読みするURLを埋めて配信）
+// =============================================
+// 静的ファイル（/assets/）はキャッシュ優先、画面はネットワーク優先でオフライン時だけキャッシュを返す。
+// APIと変更通知はキャッシュしない（オフライン中の操作はページのJSがIndexedDBに貯めて後で送る）。
+
+// デプロイでテンプレート・静的ファイルが変わると名前が変わり、古いキャッシュは activate で消す
+const CACHE_NAME = 'fridge-{{ cache_version }}';
+const PRECACHE_URLS = {{ precache_urls|tojson }};
+
+// オフラインでも開けるようにする画面（店舗選択・在庫一覧・発注リスト・在庫登録）
+const PAGE_PATTERN = /^\/(store\/\d+\/(inventory|orders|add_item))?$/;
+
+self.addEventListener('install', (event) => {
+    event.waitUntil(
+        caches.open(CACHE_NAME)
+            .then(cache => cache.addAll(PRECACHE_URLS))
+            .then(() => self.skipWaiting())
+    );
+});
+
+self.addEventListener('activate', (event) => {
+    event.waitUntil(
+        caches.keys()
+            .then(names => Promise.all(names
+                .filter(name => name.startsWith('fridge-') && name !== CACHE_NAME)
+                .map(name => caches.delete(name))))
+            .then(() => self.clients.claim())
+    );
+});
+
+self.addEventListener('fetch', (event) => {
+    const request = event.request;
+    if (request.method !== 'GET') return;
+    const url = new URL(request.url);
+    if (url.origin !== self.location.origin) return;
+
+    if (url.pathname.startsWith('/assets/')) {
+        event.respondWith(cacheFirst(request));
+    } else if (request.mode === 'navigate' && PAGE_PATTERN.test(url.pathname)) {
+        event.respondWith(networkFirst(request));
+    }
+});
+
+// ファイル名に内容のハッシュが入っているので、キャッシュにあればそのまま使う
+async function cacheFirst(request) {
+    const cached = await caches.match(request);
+    if (cached) return cached;
+    const response = await fetch(request);
+    if (response.ok) {
+        const cache = await caches.open(CACHE_NAME);
+        await cache.put(request, response.clone());
+    }
+    return response;
+}
+
+async function networkFirst(request) {
+    try {
+        const response = await fetch(request);
+        // 更新後のリダイレクト先はフラッシュメッセージ付きのその回限りの内容なので残さない
+        if (response.ok && !response.redirected) {
+            const cache = await caches.open(CACHE_NAME);
+            await cache.put(request, response.clone());
+        }
+        return response;
+    } catch (err) {
+        // 同じURL、なければクエリ（カテゴリ・並び順）だけ違う同じ画面
+        const cache = await caches.open(CACHE_NAME);
+        const cached = await cache.match(request) || await cache.match(request, {ignoreSearch: true});
+        if (cached) return cached;
+        throw err;
+    }
+}